@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_atom
+~~~~~~~~~~~~~~~~~~~~
+
+Compares the ElementTree and direct batch feed serializers.
+
+    python -m benchmarks.bench_atom [num_contacts] [repeat]
+
+"""
+import sys
+
+from timeit import repeat
+from xml.etree.ElementTree import tostring
+
+import gcontact
+
+from gcontact import atom
+
+BASE_URL = 'http://www.google.com/m8/feeds/contacts/me/base'
+
+
+def make_contacts(num):
+    for i in range(num):
+        entry = {
+            'id': {'$t': '%s/%x' % (BASE_URL, i)},
+            'updated': {'$t': '2017-01-01T00:00:00.000Z'},
+            'title': {'$t': 'Contact %i' % i},
+            'gd$etag': '"etag%i."' % i,
+            'gd$name': {
+                'gd$givenName': {'$t': 'Contact'},
+                'gd$familyName': {'$t': str(i)}},
+            'gd$organization': [{
+                'rel': atom.goog_ns('work'), 'primary': 'true',
+                'gd$orgName': {'$t': 'Org %i' % (i % 100)},
+                'gd$orgTitle': {'$t': 'Engineer'}}],
+            'gd$email': [
+                {'address': 'contact%i@example.com' % i, 'primary': 'true'},
+                {'address': 'c%i@work.example.com' % i}],
+            'gd$phoneNumber': [
+                {'$t': '+1 555 %07i' % i, 'rel': atom.goog_ns('mobile')}],
+            'gd$structuredPostalAddress': [{
+                'rel': atom.goog_ns('work'),
+                'gd$city': {'$t': 'Town'},
+                'gd$street': {'$t': '%i Main St' % i}}]}
+
+        yield gcontact.Contact(None, None, **entry)
+
+
+def etree_feed(operations):
+    entries = (contact.batchxml(op) for op, contact in operations)
+    return tostring(gcontact.batch_feed(entries))
+
+
+def run(num=10000, times=3):
+    operations = [('update', contact) for contact in make_contacts(num)]
+    assert etree_feed(operations) == atom.batch_feed(operations)
+    results = {}
+
+    for name, func in [('etree', etree_feed), ('atom', atom.batch_feed)]:
+        timings = repeat(lambda: func(operations), number=1, repeat=times)
+        results[name] = min(timings)
+        print('%s: %i entries in %.3fs' % (name, num, results[name]))
+
+    print('speedup: %.1fx' % (results['etree'] / results['atom']))
+    return results
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:]))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_cache
+~~~~~~~~~~~~~~~~~~~~~
+
+Compares the size and load time of the contact cache formats, and the time
+to open the raw JSON and memory mapped caches and get a few contacts.
+
+    python -m benchmarks.bench_cache [num_contacts] [repeat]
+
+"""
+import shutil
+import sys
+import tempfile
+
+from json import dumps, loads
+from os import path as p
+from timeit import repeat
+
+from gcontact import atom, cache
+from benchmarks.bench_atom import make_contacts
+
+
+def make_entries(num):
+    """Makes entries with the boilerplate fields of an API response."""
+    for contact in make_contacts(num):
+        url = contact._id.replace('/base/', '/full/')
+        links = [
+            {'rel': atom.goog_ns('photo'), 'type': 'image/*', 'href': url},
+            {'rel': 'self', 'type': 'application/atom+xml', 'href': url},
+            {'rel': 'edit', 'type': 'application/atom+xml', 'href': url}]
+
+        yield dict(
+            contact.entry, link=links, category=[atom.CATEGORY],
+            **{'app$edited': {'xmlns$app': 'http://www.w3.org/2007/app'}})
+
+
+def load_raw(path):
+    with open(path) as f:
+        return loads(f.read())['feed']['entry']
+
+
+def run(num=100000, times=3):
+    entries = list(make_entries(num))
+    keys = [cache.get_short_id(entry) for entry in entries[::num // 100 or 1]]
+    tmpdir = tempfile.mkdtemp()
+    paths = {
+        'raw': p.join(tmpdir, 'cache.json'),
+        'mmap': p.join(tmpdir, 'cache.mmap')}
+
+    with open(paths['raw'], 'w') as f:
+        f.write(dumps({'feed': {'entry': entries}}))
+
+    cache.write(paths['mmap'], entries)
+    loaders = {
+        'raw': lambda: load_raw(paths['raw']),
+        'mmap': lambda: list(cache.ContactCache(paths['mmap']))}
+
+    for codec, ext in sorted(cache.CODECS.items()):
+        if codec == 'zstd' and not cache.zstandard:
+            print('zstd: skipped (`zstandard` is not installed)')
+            continue
+
+        path = paths[codec] = p.join(tmpdir, 'cache.jsonl%s' % ext)
+        cache.write_compressed(path, entries)
+        loaders[codec] = lambda path=path: list(cache.read_compressed(path))
+
+    def get_raw():
+        by_key = {cache.get_short_id(e): e for e in load_raw(paths['raw'])}
+        return [by_key[key] for key in keys]
+
+    def get_mapped():
+        with cache.ContactCache(paths['mmap']) as contacts:
+            return [contacts.get(key) for key in keys]
+
+    assert [cache.strip_entry(e) for e in get_raw()] == get_mapped()
+    results = {}
+
+    try:
+        for name, func in sorted(loaders.items()):
+            results[name] = min(repeat(func, number=1, repeat=times))
+            size = p.getsize(paths[name]) / 2 ** 20
+            args = (name, size, num, results[name])
+            print('%s: %.1f MiB, load %i entries in %.3fs' % args)
+
+        for name, func in [('raw', get_raw), ('mmap', get_mapped)]:
+            key = '%s_get' % name
+            results[key] = min(repeat(func, number=1, repeat=times))
+            args = (name, len(keys), results[key])
+            print('%s: open and get %i entries in %.4fs' % args)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return results
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:]))
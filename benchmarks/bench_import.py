@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_import
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Compares the cold start time of a script that only reads the contact cache
+with one that imports all of gcontact's dependencies up front. Each script
+runs in a new interpreter, so nothing is cached in `sys.modules`.
+
+    python -m benchmarks.bench_import [repeat]
+
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from os import path as p
+
+from gcontact import cache
+from benchmarks.generate import BookGenerator
+
+HEAVY = ['httplib2', 'oauth2client', 'changanya', 'meza', 'requests', 'numpy']
+EAGER = [
+    'httplib2', 'oauth2client.client', 'oauth2client.file',
+    'oauth2client.service_account', 'oauth2client.tools',
+    'changanya.simhash', 'meza.io', 'meza.process', 'requests', 'numpy']
+
+SCRIPT = '''
+import sys
+from time import perf_counter
+start = perf_counter()
+%s
+seconds = perf_counter() - start
+# a package counts once its submodules load, since lazy imports of them
+# import the package itself
+loaded = {
+    name.split('.')[0] for name, module in sys.modules.items()
+    if name.split('.')[0] in %r and '.' in name and
+    type(module).__name__ != '_LazyModule'}
+print(repr((seconds, sorted(loaded))))
+'''
+
+READ_CACHE = '''
+import gcontact
+contacts = list(gcontact.cache.ContactCache(%r))
+'''
+
+
+def run_script(code):
+    args = [sys.executable, '-c', SCRIPT % (code, HEAVY)]
+    output = subprocess.check_output(args)
+    return eval(output)
+
+
+def run(times=10):
+    tmpdir = tempfile.mkdtemp()
+    path = p.join(tmpdir, 'cache.mmap')
+    cache.write(path, BookGenerator().entries(1000))
+    eager = '\n'.join('import %s' % name for name in EAGER)
+    scripts = [
+        ('import', 'import gcontact'),
+        ('read_cache', READ_CACHE % path),
+        ('eager', '%s\n%s' % (eager, READ_CACHE % path))]
+
+    results = {}
+
+    try:
+        for name, code in scripts:
+            timings = [run_script(code) for _ in range(times)]
+            seconds = min(timing[0] for timing in timings)
+            loaded = timings[0][1]
+            results[name] = seconds
+            args = (name, seconds * 1000, ', '.join(loaded) or 'none')
+            print('%s: %.1fms (loaded: %s)' % args)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print('speedup: %.1fx' % (results['eager'] / results['read_cache']))
+    return results
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:]))
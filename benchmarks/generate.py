@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.generate
+~~~~~~~~~~~~~~~~~~~
+
+Generates synthetic contact books for scale testing.
+
+A book is generated from a seed, so the same seed always gives the same
+book. A fraction of the contacts are duplicates of an earlier contact
+whose name differs by at most `max_edits` character edits, and which share
+one of its emails or phones (in a different format). Books are streamed,
+so they can be written at any size without holding them in memory.
+
+    python -m benchmarks.generate 1000000 book.json --seed 1
+    python -m benchmarks.generate 1000 book.csv --format csv --truth dupes.csv
+
+The formats are a Contacts API JSON feed (`json`), JSON lines of its
+entries (`jsonl`), and a LinkedIn connections CSV (`csv`) as read by
+:meth:`gcontact.Book.from_csv`. The truth file lists each duplicate's
+position, the position of the contact it duplicates, and the number of
+name edits, for measuring dedupe quality.
+
+"""
+import argparse
+import csv
+import random
+import string
+import sys
+
+from collections import deque
+from json import dumps
+
+from gcontact import atom
+
+BASE_URL = 'http://www.google.com/m8/feeds/contacts/default/base'
+FIRST_NAMES = [
+    'Aaliyah', 'Aarav', 'Abigail', 'Adrian', 'Aisha', 'Alejandro', 'Amara',
+    'Andrei', 'Ava', 'Camila', 'Chen', 'Chloe', 'Daniel', 'Diego', 'Elena',
+    'Emeka', 'Emma', 'Farah', 'Fatima', 'Gabriel', 'Hana', 'Hiroshi', 'Ian',
+    'Isabella', 'Ivan', 'Jamal', 'Jane', 'Javier', 'John', 'Kofi', 'Layla',
+    'Leila', 'Liam', 'Lucas', 'Maria', 'Mateo', 'Mei', 'Mohammed', 'Nadia',
+    'Noah', 'Olivia', 'Omar', 'Priya', 'Rahul', 'Reuben', 'Sakura', 'Sofia',
+    'Tariq', 'Wei', 'Yusuf', 'Zara', 'Zoe']
+
+LAST_NAMES = [
+    'Adeyemi', 'Ahmed', 'Anderson', 'Bauer', 'Chen', 'Cohen', 'Cummings',
+    'Da Silva', 'Dubois', 'Garcia', 'Gonzalez', 'Haddad', 'Hernandez',
+    'Ivanov', 'Jensen', 'Johnson', 'Kim', 'Kowalski', 'Kumar', 'Lee',
+    'Lopez', 'Martin', 'Mensah', 'Miller', 'Moreau', "O'Brien", 'Okafor',
+    'Patel', 'Rossi', 'Sato', 'Schmidt', 'Singh', 'Smith', 'Suzuki',
+    'Tanaka', 'Nguyen', 'Wang', 'Williams', 'Yilmaz', 'Zhang']
+
+COMPANIES = [
+    'Acme', 'Globex', 'Initech', 'Umbrella', 'Stark Industries', 'Hooli',
+    'Wayne Enterprises', 'Soylent', 'Tyrell', 'Cyberdyne', 'Vandelay',
+    'Wonka', 'Massive Dynamic', 'Aperture', 'Nakatomi']
+
+TITLES = [
+    'Engineer', 'Senior Engineer', 'Product Manager', 'Designer', 'CEO',
+    'CTO', 'Analyst', 'Consultant', 'Director', 'Sales Manager', 'Founder']
+
+CITIES = [
+    ('Nairobi', 'Kenya'), ('Lagos', 'Nigeria'), ('Berlin', 'Germany'),
+    ('Austin', 'United States'), ('Tokyo', 'Japan'), ('Lima', 'Peru'),
+    ('Mumbai', 'India'), ('Paris', 'France'), ('Toronto', 'Canada')]
+
+STREETS = ['Main St', 'High St', 'Park Ave', 'Oak Rd', 'Market St']
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'example.com']
+IM_PROTOCOLS = ['GOOGLE_TALK', 'SKYPE', 'JABBER']
+CSV_FIELDS = [
+    'Title', 'First Name', 'Middle Name', 'Last Name', 'Suffix', 'E-mail',
+    'Company', 'Job Title']
+
+FORMATS = ('json', 'jsonl', 'csv')
+DEF_DUPE_RATE = 0.1
+DEF_MAX_EDITS = 2
+DEF_WINDOW = 1000
+
+
+def edit(rand, text, edits):
+    """Applies up to `edits` random character edits to a text.
+
+    The result is within an edit distance of `edits` from the text.
+
+    >>> edit(random.Random(0), 'Cummings', 1)
+    'Cummins'
+    """
+    chars = list(text)
+
+    for _ in range(edits):
+        pos = rand.randrange(len(chars) + 1)
+        kind = rand.choice(['insert', 'delete', 'replace'] if chars else [
+            'insert'])
+
+        if kind == 'insert':
+            chars.insert(pos, rand.choice(string.ascii_lowercase))
+        elif kind == 'delete':
+            del chars[min(pos, len(chars) - 1)]
+        else:
+            chars[min(pos, len(chars) - 1)] = rand.choice(
+                string.ascii_lowercase)
+
+    return ''.join(chars)
+
+
+def format_phone(rand, digits):
+    """Formats a 10 digit phone number in one of several styles."""
+    styles = ['%s-%s-%s', '(%s) %s-%s', '+1 %s %s %s', '%s.%s.%s']
+    return rand.choice(styles) % (digits[:3], digits[3:6], digits[6:])
+
+
+class BookGenerator(object):
+    """Generates a reproducible book of people and their duplicates.
+
+    :param seed: (optional) The random seed (default: 0).
+    :param dupe_rate: (optional) The fraction of contacts that duplicate
+        an earlier one (default: 0.1).
+    :param max_edits: (optional) The maximum number of character edits
+        between a duplicate's name and the original's (default: 2).
+    :param window: (optional) The number of recent contacts duplicates are
+        drawn from (default: 1000).
+
+    >>> people = BookGenerator(seed=1).people(3)
+    >>> [person['pos'] for person in people]
+    [0, 1, 2]
+    """
+    def __init__(self, **kwargs):
+        self.seed = kwargs.get('seed', 0)
+        self.dupe_rate = kwargs.get('dupe_rate', DEF_DUPE_RATE)
+        self.max_edits = kwargs.get('max_edits', DEF_MAX_EDITS)
+        self.window = kwargs.get('window', DEF_WINDOW)
+
+    def make_person(self, rand, pos):
+        first, last = rand.choice(FIRST_NAMES), rand.choice(LAST_NAMES)
+        middle = rand.choice(string.ascii_uppercase) * (rand.random() < .2)
+        surname = ''.join(c for c in last.lower() if c.isalpha())
+        handle = '%s.%s%i' % (first.lower(), surname, pos)
+        emails = ['%s@%s' % (handle, rand.choice(DOMAINS))]
+        emails += ['%s@work.example.com' % handle] * (rand.random() < .4)
+        phones = [
+            ''.join(rand.choice(string.digits) for _ in range(10))
+            for _ in range(rand.choice([0, 1, 1, 2]))]
+
+        ims = [handle] * (rand.random() < .2)
+        city, country = rand.choice(CITIES)
+
+        return {
+            'pos': pos, 'dupe_of': None, 'edits': 0, 'first': first,
+            'middle': middle, 'last': last, 'emails': emails,
+            'phones': [format_phone(rand, digits) for digits in phones],
+            'ims': ims, 'im_protocol': rand.choice(IM_PROTOCOLS),
+            'company': rand.choice(COMPANIES),
+            'job_title': rand.choice(TITLES),
+            'street': '%i %s' % (rand.randint(1, 999), rand.choice(STREETS)),
+            'city': city, 'country': country}
+
+    def make_dupe(self, rand, pos, original):
+        edits = rand.randint(0, self.max_edits)
+        first_edits = rand.randint(0, edits)
+        dupe = dict(
+            original, pos=pos, dupe_of=original['pos'], edits=edits,
+            first=edit(rand, original['first'], first_edits),
+            last=edit(rand, original['last'], edits - first_edits))
+
+        # share an email or phone in a different format
+        if original['phones'] and rand.random() < .5:
+            digits = ''.join(c for c in original['phones'][0] if c.isdigit())
+            dupe['phones'] = [format_phone(rand, digits[-10:])]
+            dupe['emails'] = []
+        else:
+            dupe['emails'] = [original['emails'][0].upper()]
+            dupe['phones'] = []
+
+        if rand.random() < .5:
+            dupe['company'] = rand.choice(COMPANIES)
+
+        return dupe
+
+    def people(self, num):
+        """Yields `num` people, some of which are duplicates.
+
+        :returns: an iterator of dicts. The `dupe_of` key is the position of
+            the duplicated person, or None.
+        """
+        rand = random.Random(self.seed)
+        recent = deque(maxlen=self.window)
+
+        for pos in range(num):
+            if recent and rand.random() < self.dupe_rate:
+                person = self.make_dupe(rand, pos, rand.choice(recent))
+            else:
+                person = self.make_person(rand, pos)
+                recent.append(person)
+
+            yield person
+
+    def entries(self, num):
+        """Yields `num` Contacts API JSON feed entries."""
+        for person in self.people(num):
+            yield to_entry(person)
+
+    def records(self, num):
+        """Yields `num` LinkedIn CSV records."""
+        for person in self.people(num):
+            yield to_record(person)
+
+
+def to_entry(person):
+    names = [person['first'], person['middle'], person['last']]
+    full_name = ' '.join(name for name in names if name)
+    name = {
+        'gd$fullName': {'$t': full_name},
+        'gd$givenName': {'$t': person['first']},
+        'gd$familyName': {'$t': person['last']}}
+
+    if person['middle']:
+        name['gd$additionalName'] = {'$t': person['middle']}
+
+    return {
+        'id': {'$t': '%s/%x' % (BASE_URL, person['pos'])},
+        'updated': {'$t': '2017-01-01T00:00:00.000Z'},
+        'title': {'$t': full_name},
+        'gd$etag': '"etag%i"' % person['pos'],
+        'gd$name': name,
+        'gd$email': [
+            dict(address=email, rel=atom.goog_ns('home' if i else 'other'),
+                 **({'primary': 'true'} if not i else {}))
+            for i, email in enumerate(person['emails'])],
+        'gd$phoneNumber': [
+            {'$t': phone, 'rel': atom.goog_ns('mobile')}
+            for phone in person['phones']],
+        'gd$im': [
+            {'address': im, 'protocol': atom.goog_ns(person['im_protocol']),
+             'rel': atom.goog_ns('other')}
+            for im in person['ims']],
+        'gd$organization': [{
+            'rel': atom.goog_ns('work'), 'primary': 'true',
+            'gd$orgName': {'$t': person['company']},
+            'gd$orgTitle': {'$t': person['job_title']}}],
+        'gd$structuredPostalAddress': [{
+            'rel': atom.goog_ns('home'),
+            'gd$street': {'$t': person['street']},
+            'gd$city': {'$t': person['city']},
+            'gd$country': {'$t': person['country']}}]}
+
+
+def to_record(person):
+    values = [
+        '', person['first'], person['middle'], person['last'], '',
+        person['emails'][0] if person['emails'] else '', person['company'],
+        person['job_title']]
+
+    return dict(zip(CSV_FIELDS, values))
+
+
+def write(path, num, fmt='json', truth=None, **kwargs):
+    """Streams a generated book to disk.
+
+    :param path: The output file path.
+    :param num: The number of contacts.
+    :param fmt: (optional) One of 'json', 'jsonl' or 'csv' (default: json).
+    :param truth: (optional) A file path to write the duplicates to.
+    :param kwargs: Keyword arguments passed to :class:`BookGenerator`.
+
+    :returns: the number of duplicates.
+    """
+    generator = BookGenerator(**kwargs)
+    dupes = 0
+
+    with open(path, 'w', newline='') as f:
+        truth_file = open(truth, 'w', newline='') if truth else None
+        truth_writer = truth_file and csv.writer(truth_file)
+
+        if truth_writer:
+            truth_writer.writerow(['pos', 'dupe_of', 'edits'])
+
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, CSV_FIELDS)
+            writer.writeheader()
+        elif fmt == 'json':
+            f.write('{"feed": {"entry": [')
+
+        for person in generator.people(num):
+            if fmt == 'csv':
+                writer.writerow(to_record(person))
+            elif fmt == 'json':
+                f.write('%s%s' % (',\n' if person['pos'] else '\n', dumps(
+                    to_entry(person))))
+            else:
+                f.write('%s\n' % dumps(to_entry(person)))
+
+            if person['dupe_of'] is not None:
+                dupes += 1
+
+                if truth_writer:
+                    row = [person['pos'], person['dupe_of'], person['edits']]
+                    truth_writer.writerow(row)
+
+        if fmt == 'json':
+            f.write('\n]}}\n')
+
+        if truth_file:
+            truth_file.close()
+
+    return dupes
+
+
+def parse_args(args=None):
+    description = __doc__.split('\n\n')[1]
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('num', type=int, help='the number of contacts')
+    parser.add_argument('path', help='the output file')
+    parser.add_argument('--format', choices=FORMATS, default='json')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dupe-rate', type=float, default=DEF_DUPE_RATE)
+    parser.add_argument('--max-edits', type=int, default=DEF_MAX_EDITS)
+    parser.add_argument('--truth', help='a CSV file to list duplicates in')
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    kwargs = {
+        'seed': args.seed, 'dupe_rate': args.dupe_rate,
+        'max_edits': args.max_edits, 'truth': args.truth}
+
+    dupes = write(args.path, args.num, args.format, **kwargs)
+    print('%i contacts (%i duplicates)' % (args.num, dupes), file=sys.stderr)
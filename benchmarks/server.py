@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.server
+~~~~~~~~~~~~~~~~~
+
+A local stand-in for the Google Contacts v3 API.
+
+It serves a generated book of contacts for any account as paged JSON or
+Atom feeds, single contacts, and batch requests, with etags, `updated-min`
+queries (deleted contacts are kept as tombstones for `showdeleted`), and
+with configurable latency and throttling. Point a book at it with `api_url`:
+
+    >>> with serve(entries, latency=0.01) as server:
+    ...     book = Book(None, api_url=server.url, use_cache=False)
+    ...     len(book.contacts)
+
+Or run it standalone:
+
+    python -m benchmarks.server [num_contacts] [port]
+
+"""
+import random
+import re
+import sys
+import threading
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from time import gmtime, sleep, strftime
+from urllib.parse import urlparse, parse_qs, quote
+from xml.etree.ElementTree import fromstring
+
+from gcontact import Contact, atom
+
+PATH_RE = re.compile(
+    r'^/m8/feeds/contacts/(?P<user>[^/]+)/full/?(?P<rest>[^?]*?)/?$')
+
+DEF_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 8192
+ATOM = '{%s}' % atom.ATOM_NS
+GD = '{%s}' % atom.GOOGLE_NS
+BATCH = '{%s}' % atom.BATCH_NS
+CONTACT = '{%s}' % atom.CONTACT_NS
+STATUS_REASONS = {
+    200: 'Success', 201: 'Created', 404: 'Not Found',
+    409: 'Conflict', 412: 'Precondition Failed'}
+
+
+def get_short_id(entry):
+    return entry['id']['$t'].split('/')[-1]
+
+
+def get_time():
+    return strftime('%Y-%m-%dT%H:%M:%S.000Z', gmtime())
+
+
+def read_item(elem):
+    """Reads a field element's attributes, text and `gd` child elements.
+
+    >>> read_item(fromstring('<a rel="home">text</a>'))
+    {'rel': 'home', '$t': 'text'}
+    """
+    item = dict(elem.attrib)
+
+    if elem.text and elem.text.strip():
+        item['$t'] = elem.text
+
+    for child in elem:
+        if child.tag.startswith(GD):
+            item['gd$%s' % child.tag[len(GD):]] = {'$t': child.text or ''}
+
+    return item
+
+
+def entry_from_xml(elem, _id):
+    """Reads every field of a batch entry into a JSON feed entry, and sets
+    its `updated` time the way the API does.
+    """
+    def items(ns, tag):
+        return [read_item(e) for e in elem.findall(ns + tag)]
+
+    name = elem.find(GD + 'name')
+    name = read_item(name) if name is not None else {}
+    full_name = name.get('gd$fullName', {}).get('$t', '')
+    groups = items(CONTACT, 'groupMembershipInfo')
+    entry = {
+        'id': {'$t': _id},
+        'updated': {'$t': get_time()},
+        'title': {'$t': full_name},
+        'gd$name': name,
+        'gd$email': items(GD, 'email'),
+        'gd$im': items(GD, 'im'),
+        'gd$phoneNumber': items(GD, 'phoneNumber'),
+        'gd$organization': items(GD, 'organization'),
+        'gd$postalAddress': items(GD, 'postalAddress'),
+        'gd$structuredPostalAddress': items(GD, 'structuredPostalAddress'),
+        'gd$extendedProperty': items(GD, 'extendedProperty'),
+        'gContact$groupMembershipInfo': [
+            dict(group, deleted='false') for group in groups]}
+
+    content = elem.findtext(ATOM + 'content')
+
+    if content:
+        entry['content'] = {'$t': content}
+
+    return entry
+
+
+class ContactsServer(ThreadingHTTPServer):
+    """An HTTP server holding one book of contacts.
+
+    :param entries: An iterable of JSON feed entries.
+    :param latency: (optional) The number of seconds to wait before
+        answering each request (default: 0).
+    :param throttle: (optional) The fraction of requests to answer with a
+        `503 Service Unavailable` (default: 0).
+    :param seed: (optional) The seed of the throttling (default: 0).
+    """
+    daemon_threads = True
+
+    def __init__(self, entries, **kwargs):
+        address = (kwargs.get('host', '127.0.0.1'), kwargs.get('port', 0))
+        super(ContactsServer, self).__init__(address, ContactsHandler)
+        self.latency = kwargs.get('latency', 0)
+        self.throttle = kwargs.get('throttle', 0)
+        self.random = random.Random(kwargs.get('seed', 0))
+        self.lock = threading.Lock()
+        self.version = 0
+        self.counter = 0
+        self.stats = dict.fromkeys(
+            ['requests', 'throttled', 'bytes_in', 'bytes_out'], 0)
+
+        self.entries = OrderedDict(
+            (get_short_id(entry), entry) for entry in entries)
+
+        # the deleted contacts' tombstones
+        self.deleted = OrderedDict()
+
+    @property
+    def url(self):
+        return 'http://%s:%i/m8/feeds' % self.server_address[:2]
+
+    @property
+    def etag(self):
+        return '"feed-%i"' % self.version
+
+    def next_etag(self):
+        self.counter += 1
+        return '"e%i-%i"' % (self.version, self.counter)
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.stats[key] += value
+
+    def is_throttled(self):
+        with self.lock:
+            throttled = self.random.random() < self.throttle
+
+        self.count('throttled', throttled)
+        return throttled
+
+    def get_feed(self, user, params):
+        start = int(params.get('start-index', ['1'])[0])
+        size = int(params.get('max-results', [DEF_PAGE_SIZE])[0])
+        size = min(size, MAX_PAGE_SIZE)
+        updated_min = params.get('updated-min', [None])[0]
+        show_deleted = params.get('showdeleted', ['false'])[0] == 'true'
+        updated = get_time()
+
+        with self.lock:
+            entries = list(self.entries.values())
+
+            if show_deleted:
+                entries.extend(self.deleted.values())
+
+        if updated_min:
+            entries = [
+                entry for entry in entries
+                if entry.get('updated', {}).get('$t', '') >= updated_min]
+
+        page = entries[start - 1:start - 1 + size]
+        feed = {
+            'gd$etag': self.etag,
+            'updated': {'$t': updated},
+            'openSearch$totalResults': {'$t': str(len(entries))},
+            'openSearch$startIndex': {'$t': str(start)},
+            'openSearch$itemsPerPage': {'$t': str(size)},
+            'link': [],
+            'entry': page}
+
+        if size and start - 1 + size < len(entries):
+            url = '%s/contacts/%s/full/?alt=%s&max-results=%i&start-index=%i'
+            alt = params.get('alt', ['json'])[0]
+            href = url % (self.url, user, alt, size, start + size)
+
+            if updated_min:
+                href += '&updated-min=%s&showdeleted=%s' % (
+                    quote(updated_min), str(show_deleted).lower())
+
+            feed['link'].append({'rel': 'next', 'href': href})
+
+        return feed
+
+    def batch(self, body):
+        """Applies a batch feed and returns the batch response feed."""
+        results = []
+
+        with self.lock:
+            for elem in fromstring(body).iter(ATOM + 'entry'):
+                batch_id = elem.findtext(BATCH + 'id')
+                op = elem.find(BATCH + 'operation').get('type')
+                etag = elem.get(GD + 'etag')
+                _id = elem.findtext(ATOM + 'id')
+                key = _id.split('/')[-1] if _id else None
+                entry = self.entries.get(key)
+
+                if op == 'insert':
+                    key = 'new%i' % self.version
+                    _id = '%s/contacts/default/base/%s' % (self.url, key)
+                    entry, code = entry_from_xml(elem, _id), 201
+                elif entry is None:
+                    code = 404
+                elif etag and etag != entry.get('gd$etag'):
+                    code = 412
+                elif op == 'update':
+                    entry, code = entry_from_xml(elem, _id), 200
+                else:
+                    code = 200
+
+                if code in {200, 201}:
+                    self.version += 1
+
+                    if op == 'delete':
+                        del self.entries[key]
+                        self.deleted[key] = {
+                            'id': entry['id'], 'updated': {'$t': get_time()},
+                            'gd$deleted': {}}
+                    else:
+                        entry['gd$etag'] = self.next_etag()
+                        self.entries[key] = entry
+
+                results.append((batch_id, op, code, _id, entry))
+
+        parts = [atom.start_tag('feed', atom.BATCH_NAMESPACES)]
+
+        for batch_id, op, code, _id, entry in results:
+            etag = (entry or {}).get('gd$etag') if code < 300 else None
+            attrs = {'gd:etag': etag} if etag else {}
+            parts.append('<entry%s>' % atom.write_attrs(attrs))
+            parts.append(atom.element('id', '', _id))
+            parts.append(atom.element('batch:id', '', batch_id))
+            parts.append(atom.BATCH_OPERATIONS[op])
+            status = {'code': code, 'reason': STATUS_REASONS[code]}
+            parts.append(atom.start_tag('batch:status', status, close=True))
+            parts.append('</entry>')
+
+        parts.append('</feed>')
+        return atom.to_bytes(''.join(parts))
+
+
+class ContactsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, code, body=b'', content_type='application/json'):
+        self.server.count('bytes_out', len(body))
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+
+        if code == 503:
+            self.send_header('Retry-After', '1')
+
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            chunks = []
+
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+
+                if not size:
+                    break
+
+            body = b''.join(chunks)
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        self.server.count('bytes_in', len(body))
+        return body
+
+    def route(self):
+        server = self.server
+        server.count('requests')
+        url = urlparse(self.path)
+        match = PATH_RE.match(url.path)
+        body = self.read_body() if self.command == 'POST' else None
+        sleep(server.latency)
+
+        if server.is_throttled():
+            return self.send(503)
+        elif not match:
+            return self.send(404)
+
+        user, rest = match.group('user'), match.group('rest')
+        params = parse_qs(url.query)
+        alt = params.get('alt', ['json'])[0]
+
+        if self.command == 'POST' and rest == 'batch':
+            content_type = 'application/atom+xml'
+            return self.send(200, server.batch(body), content_type)
+        elif self.command == 'POST':
+            return self.send(405)
+        elif rest:
+            with server.lock:
+                entry = server.entries.get(rest)
+
+            if entry is None:
+                return self.send(404)
+            elif self.headers.get('If-None-Match') == entry.get('gd$etag'):
+                return self.send(304)
+            else:
+                body = dumps({'entry': entry}).encode('utf-8')
+                return self.send(200, body)
+
+        if self.headers.get('If-None-Match') == server.etag:
+            return self.send(304)
+
+        feed = server.get_feed(user, params)
+
+        if alt == 'json':
+            body = dumps({'version': '1.0', 'feed': feed}).encode('utf-8')
+            return self.send(200, body)
+        else:
+            entries = [
+                atom.update_entry(Contact(None, None, **e))
+                for e in feed['entry']]
+
+            start = atom.start_tag('feed', atom.NAMESPACES)
+            body = atom.to_bytes('%s%s</feed>' % (start, ''.join(entries)))
+            return self.send(200, body, 'application/atom+xml')
+
+    do_GET = do_POST = route
+
+
+@contextmanager
+def serve(entries, **kwargs):
+    """Runs a :class:`ContactsServer` in a background thread.
+
+    :param entries: An iterable of JSON feed entries.
+    :param kwargs: Keyword arguments passed to :class:`ContactsServer`.
+    """
+    server = ContactsServer(entries, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    from benchmarks.generate import BookGenerator
+
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+
+    with serve(BookGenerator().entries(num), port=port) as server:
+        print('Serving %i contacts at %s' % (num, server.url))
+
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
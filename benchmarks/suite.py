@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.suite
+~~~~~~~~~~~~~~~~
+
+Times the stages of a sync against the local Contacts API stand-in (see
+:mod:`benchmarks.server`) for generated books (see
+:mod:`benchmarks.generate`) of different sizes, and writes the results as
+JSON so that runs can be compared.
+
+    python -m benchmarks.suite --sizes 1000,10000 --output results.json
+
+Stages:
+
+    fetch       download all feed pages
+    parse       build the contacts from the feed entries
+    index       compute the simhash fingerprints and blocking index
+    dedupe      find the duplicate clusters and plan their merges
+    serialize   write a batch feed updating every contact
+    upload      submit the updates in concurrent batch requests
+
+"""
+import argparse
+import json
+import platform
+import sys
+
+from datetime import datetime as dt
+from time import perf_counter
+
+import gcontact
+
+from gcontact import atom
+from gcontact.metrics import Metrics
+from benchmarks.generate import BookGenerator
+from benchmarks.server import serve
+from tests.helpers import make_book
+
+DEF_SIZES = [1000, 10000]
+
+
+def run_size(size, **kwargs):
+    """Times each stage for a book of `size` contacts.
+
+    :returns: a list of result dicts.
+    """
+    timings = []
+
+    def timed(stage, func, *args, **fkwargs):
+        start = perf_counter()
+        value = func(*args, **fkwargs)
+        seconds = perf_counter() - start
+        timings.append((stage, seconds))
+        return value
+
+    server_kwargs = {
+        k: kwargs[k] for k in ('latency', 'throttle', 'seed') if k in kwargs}
+
+    generator = BookGenerator(seed=kwargs.get('seed', 0))
+
+    with serve(generator.entries(size), **server_kwargs) as server:
+        # resend throttled requests, as a real sync would
+        session = gcontact.HTTPSession(
+            retries=gcontact.DEF_RETRIES, backoff=kwargs.get('backoff', 0.1))
+
+        book = make_book(
+            api_url=server.url, use_cache=False, cache_resp=False,
+            session=session, page_size=kwargs.get('page_size', 1000),
+            batch_size=kwargs.get('batch_size', gcontact.MAX_BATCH))
+
+        metrics = Metrics()
+        metrics.attach(book.session)
+
+        def fetch():
+            url = book._url(format='json')
+            entries = []
+
+            while url:
+                feed = book.session.get(url).json()['feed']
+                entries.extend(feed.get('entry', []))
+                url = gcontact.get_next_url(feed)
+
+            return entries
+
+        entries = timed('fetch', fetch)
+        book._contacts = timed(
+            'parse', lambda: [book._make_contact(e) for e in entries])
+
+        def index():
+            return book.fingerprints, book.blocking_index
+
+        timed('index', index)
+        timed('dedupe', book.dedupe, blocking=True)
+        operations = [('update', contact) for contact in book.contacts]
+        timed('serialize', atom.batch_feed, operations)
+
+        submitted = timed(
+            'upload', book.submit, operations,
+            workers=kwargs.get('workers'), backoff=kwargs.get('backoff', 0.1))
+
+        codes = [result.code for _, _, result in submitted]
+        failed = sum(code not in gcontact.SUCCESS_CODES for code in codes)
+        stats = dict(server.stats)
+
+    return [
+        {
+            'size': size, 'stage': stage, 'seconds': round(seconds, 6),
+            'us_per_contact': round(seconds * 1e6 / size, 3)}
+        for stage, seconds in timings] + [
+        {'size': size, 'stage': 'server', 'failed': failed, **stats}] + [
+        {'size': size, 'stage': 'requests', 'kind': kind, **summary}
+        for kind, summary in sorted(metrics.summary().items())]
+
+
+def run(sizes=None, **kwargs):
+    """Runs the suite.
+
+    :param sizes: (optional) A list of book sizes (default: [1000, 10000]).
+    :param kwargs: Keyword arguments passed to :func:`run_size`.
+
+    :returns: a dict of the run's metadata and results.
+    """
+    results = []
+
+    for size in sizes or DEF_SIZES:
+        for result in run_size(size, **kwargs):
+            results.append(result)
+
+            if 'seconds' in result:
+                args = (size, result['stage'], result['seconds'])
+                print('%8i %-10s %.4fs' % args, file=sys.stderr)
+
+    return {
+        'meta': {
+            'timestamp': dt.utcnow().isoformat(),
+            'version': gcontact.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'options': kwargs},
+        'results': results}
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument(
+        '--sizes', default=','.join(map(str, DEF_SIZES)),
+        type=lambda sizes: [int(size) for size in sizes.split(',')],
+        help='comma separated book sizes (default: %(default)s)')
+
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--throttle', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=gcontact.MAX_BATCH)
+    parser.add_argument('--workers', type=int, default=gcontact.DEF_WORKERS)
+    parser.add_argument('--output', help='a JSON file (default: stdout)')
+    return parser.parse_args(args)
+
+
+if __name__ == '__main__':
+    args = vars(parse_args())
+    output = args.pop('output')
+    report = run(**args)
+    content = json.dumps(report, indent=2)
+
+    if output:
+        with open(output, 'w') as f:
+            f.write(content)
+    else:
+        print(content)
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.__main__
+~~~~~~~~~~~~~~~~~
+
+Runs the command line tool with `python -m gcontact`.
+
+"""
+from .cli import main
+
+main()
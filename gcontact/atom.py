@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.atom
+~~~~~~~~~~~~
+
+This module contains a fast serializer of contacts to Atom entry XML.
+
+The output is byte for byte identical to serializing the
+:class:`~gcontact.Contact` ElementTree entries with `tostring`, but the
+markup is written directly instead of building a tree first.
+
+"""
+import re
+
+from collections import namedtuple
+from xml.etree.ElementTree import fromstring
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+CONTACT_NS = 'http://schemas.google.com/contact/2008'
+GOOGLE_NS = 'http://schemas.google.com/g/2005'
+BATCH_NS = 'http://schemas.google.com/gdata/batch'
+NAMESPACES = {
+    'xmlns': ATOM_NS, 'xmlns:atom': ATOM_NS, 'xmlns:gd': GOOGLE_NS,
+    'xmlns:gContact': CONTACT_NS}
+
+BATCH_NAMESPACES = dict(NAMESPACES, **{'xmlns:batch': BATCH_NS})
+
+# https://developers.google.com/gdata/docs/2.0/elements#schema_48
+NAME_PROPS = [
+    'givenName', 'additionalName', 'familyName', 'namePrefix', 'nameSuffix']
+
+# https://developers.google.com/gdata/docs/2.0/elements#schema_50
+ORG_PROPS = [
+    'orgName', 'orgTitle', 'orgDepartment', 'orgJobDescription', 'orgSymbol',
+    'where']
+
+# https://developers.google.com/gdata/docs/2.0/elements#schema_65
+ADDRESS_PROPS = [
+    'city', 'street', 'region', 'postcode', 'country', 'formattedAddress']
+
+DEF_CHUNK_SIZE = 2 ** 16
+
+# The batch result codes of successful operations
+SUCCESS_CODES = {200, 201}
+
+BatchResult = namedtuple(
+    'BatchResult', ['batch_id', 'code', 'reason', 'id', 'etag'])
+TEXT_RE = re.compile('[&<>]')
+ATTR_RE = re.compile('[&<>"\r\n\t]')
+TEXT_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+ATTR_TABLE = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', '\r': '&#13;',
+    '\n': '&#10;', '\t': '&#09;'})
+
+
+def cont_ns(name):
+    return '%s#%s' % (CONTACT_NS, name)
+
+
+def goog_ns(name):
+    return '%s#%s' % (GOOGLE_NS, name)
+
+
+CATEGORY = {'scheme': goog_ns('kind'), 'term': cont_ns('contact')}
+
+
+def attributes(item):
+    """Selects the XML attributes of an API entry, e.g., an email."""
+    return {
+        k: v for k, v in item.items()
+        if k != '$t' and not k.startswith('gd$')}
+
+
+def escape_text(text):
+    """Escapes element text the same way ElementTree does.
+
+    >>> escape_text('Tom & Jerry <tj@example.com>')
+    'Tom &amp; Jerry &lt;tj@example.com&gt;'
+    """
+    text = str(text)
+    return text.translate(TEXT_TABLE) if TEXT_RE.search(text) else text
+
+
+def escape_attr(value):
+    """Escapes an attribute value the same way ElementTree does.
+
+    >>> escape_attr('"home"\\n')
+    '&quot;home&quot;&#10;'
+    """
+    value = str(value)
+    return value.translate(ATTR_TABLE) if ATTR_RE.search(value) else value
+
+
+def write_attrs(item, raw=False):
+    """Writes the XML attributes of an API entry, see :func:`attributes`.
+
+    :param raw: Write all of the item's keys (default: False).
+
+    >>> write_attrs({'address': 'a@b.c', '$t': 'text'})
+    ' address="a@b.c"'
+    """
+    return ''.join([
+        ' %s="%s"' % (k, escape_attr(v))
+        for k, v in item.items()
+        if raw or (k != '$t' and not k.startswith('gd$'))])
+
+
+def start_tag(tag, attrs=None, close=False):
+    """Writes the start tag of an element.
+
+    >>> start_tag('gd:email', {'address': 'a@b.c'}, close=True)
+    '<gd:email address="a@b.c" />'
+    """
+    attrs = write_attrs(attrs, raw=True) if attrs else ''
+    return '<%s%s%s' % (tag, attrs, ' />' if close else '>')
+
+
+def element(tag, attrs='', text=None):
+    """Writes an element with optional text and no children.
+
+    :param attrs: The element's attributes as written by :func:`write_attrs`.
+
+    >>> element('gd:fullName', text='Jane Doe')
+    '<gd:fullName>Jane Doe</gd:fullName>'
+    """
+    if text is None or text == '':
+        return '<%s%s />' % (tag, attrs)
+    else:
+        return '<%s%s>%s</%s>' % (tag, attrs, escape_text(text), tag)
+
+
+def _get_text(item, key):
+    return (item.get(key) or {}).get('$t')
+
+
+def _write_children(parts, tag, item, props):
+    texts = [(prop, _get_text(item, 'gd$%s' % prop)) for prop in props]
+    texts = [(prop, text) for prop, text in texts if text]
+    attrs = write_attrs(item)
+
+    if texts:
+        parts.append('<%s%s>' % (tag, attrs))
+        parts.extend(element('gd:%s' % prop, '', text) for prop, text in texts)
+        parts.append('</%s>' % tag)
+    else:
+        parts.append('<%s%s />' % (tag, attrs))
+
+
+def write_fields(parts, contact):
+    """Appends the markup of a contact's fields to a list.
+
+    The markup matches `Contact._populate_entry`.
+    """
+    parts.append('<gd:name>')
+    parts.append(element('gd:fullName', '', contact.title))
+
+    for prop in NAME_PROPS if contact.name else []:
+        text = _get_text(contact.name, 'gd$%s' % prop)
+
+        if text:
+            parts.append(element('gd:%s' % prop, '', text))
+
+    parts.append('</gd:name>')
+    parts.extend(
+        '<gd:email%s />' % write_attrs(email) for email in contact._email
+        if email.get('address'))
+
+    parts.extend('<gd:im%s />' % write_attrs(im) for im in contact.im)
+    parts.extend(
+        '<gd:extendedProperty%s />' % write_attrs(prop, raw=True)
+        for prop in contact.props)
+
+    for org in contact._organization:
+        _write_children(parts, 'gd:organization', org, ORG_PROPS)
+
+    parts.extend(
+        element('gd:phoneNumber', write_attrs(phone), phone['$t'])
+        for phone in contact.phone)
+
+    for address in contact.address:
+        if any(k[3:] in ADDRESS_PROPS for k in address):
+            tag = 'gd:structuredPostalAddress'
+            _write_children(parts, tag, address, ADDRESS_PROPS)
+        else:
+            attrs = write_attrs(address)
+            parts.append(element('gd:postalAddress', attrs, address['$t']))
+
+    parts.extend(
+        '<gContact:groupMembershipInfo href="%s" />' % escape_attr(href)
+        for href in contact.groups)
+
+    if contact.note:
+        parts.append(element('atom:content', TEXT_TYPE, contact.note))
+
+    return parts
+
+
+def new_entry(contact):
+    """Writes the same entry as :attr:`~gcontact.Contact.newxml`."""
+    # https://developers.google.com/google-apps/contacts/v3/#creating_contacts
+    parts = [NEW_ENTRY_START]
+    write_fields(parts, contact)
+    parts.append('</atom:entry>')
+    return ''.join(parts)
+
+
+def update_entry(contact):
+    """Writes the same entry as :attr:`~gcontact.Contact.upxml`."""
+    # https://developers.google.com/google-apps/contacts/v3/#updating_contacts
+    attrs = write_attrs(dict(NAMESPACES, **{'gd:etag': contact.etag}))
+    parts = [
+        '<entry%s>' % attrs,
+        element('id', '', contact._id),
+        element('updated', '', contact.updated),
+        CATEGORY_ELEMENT]
+
+    write_fields(parts, contact)
+    parts.append('</entry>')
+    return ''.join(parts)
+
+
+def batch_entry(contact, operation, batch_id=None):
+    """Writes the same entry as :meth:`~gcontact.Contact.batchxml`."""
+    # https://developers.google.com/google-apps/contacts/v3/#batch_operations
+    if contact.etag and operation in {'update', 'delete'}:
+        start = '<entry gd:etag="%s">' % escape_attr(contact.etag)
+    else:
+        start = '<entry>'
+
+    parts = [
+        start,
+        element('batch:id', '', batch_id or contact.short_id),
+        BATCH_OPERATIONS[operation]]
+
+    if operation != 'insert':
+        parts.append(element('id', '', contact._id))
+
+    if operation in {'insert', 'update'}:
+        parts.append(CATEGORY_ELEMENT)
+        write_fields(parts, contact)
+
+    parts.append('</entry>')
+    return ''.join(parts)
+
+
+def to_bytes(text):
+    """Encodes markup the same way ElementTree's `tostring` does."""
+    return text.encode('ascii', 'xmlcharrefreplace')
+
+
+def iter_batch_feed(operations, chunk_size=DEF_CHUNK_SIZE):
+    """Writes a batch feed body of contact operations in chunks.
+
+    Only about `chunk_size` bytes of markup are held at a time, so the
+    memory used doesn't depend on the number of operations.
+
+    :param operations: An iterable of (operation, contact) or (operation,
+        contact, batch_id) tuples, where operation is one of 'insert',
+        'update', or 'delete'.
+    :param chunk_size: The approximate size of each chunk in bytes.
+
+    :returns: an iterator of bytes.
+
+    >>> b''.join(iter_batch_feed([])).startswith(b'<feed')
+    True
+    """
+    parts = [start_tag('feed', BATCH_NAMESPACES)]
+    size = len(parts[0])
+
+    for item in operations:
+        entry = batch_entry(item[1], item[0], *item[2:])
+        parts.append(entry)
+        size += len(entry)
+
+        if size >= chunk_size:
+            yield to_bytes(''.join(parts))
+            parts, size = [], 0
+
+    parts.append('</feed>')
+    yield to_bytes(''.join(parts))
+
+
+def batch_feed(operations):
+    """Writes a batch feed body of contact operations.
+
+    :param operations: An iterable of (operation, contact) tuples, where
+        operation is one of 'insert', 'update', or 'delete'.
+
+    :returns: the feed as bytes.
+    """
+    return b''.join(iter_batch_feed(operations))
+
+
+def parse_batch_response(content):
+    """Reads the result of each operation from a batch response feed.
+
+    :param content: The response body.
+
+    :returns: an iterator of :class:`BatchResult`.
+    """
+    for entry in fromstring(content).iter('{%s}entry' % ATOM_NS):
+        status = entry.find('{%s}status' % BATCH_NS)
+
+        if status is None:
+            code, reason = None, None
+        else:
+            code, reason = int(status.get('code')), status.get('reason')
+
+        yield BatchResult(
+            entry.findtext('{%s}id' % BATCH_NS), code, reason,
+            entry.findtext('{%s}id' % ATOM_NS),
+            entry.get('{%s}etag' % GOOGLE_NS))
+
+
+# Markup that is the same for every entry
+TEXT_TYPE = write_attrs({'type': 'text'})
+CATEGORY_ELEMENT = start_tag('category', CATEGORY, close=True)
+NEW_ENTRY_START = '%s%s' % (
+    start_tag('atom:entry', NAMESPACES),
+    start_tag('atom:category', CATEGORY, close=True))
+
+BATCH_OPERATIONS = {
+    op: start_tag('batch:operation', {'type': op}, close=True)
+    for op in ('insert', 'update', 'delete', 'query')}
@@ -0,0 +1,1278 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.book
+~~~~~~~~~~~~~
+
+This module contains the book class, which syncs an account's contacts
+with the Google Contacts API.
+
+"""
+from collections import defaultdict, deque
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from heapq import heappop, heappush
+from time import monotonic, sleep
+from os import path as p, makedirs, getenv, remove
+from contextlib import nullcontext
+from json import dumps, loads, JSONDecodeError
+from urllib.parse import quote
+from xml.etree.ElementTree import Element
+
+from . import (
+    atom, cache, csvimport, export, progress, tracing, dedupe as dd)
+from .contact import Contact
+from .store import ContactStore
+from .exceptions import (
+    ContactNotFound, UnsupportedFormatError, RequestError, CacheError)
+from .httpsession import HTTPSession, RETRY_CODES
+from .utils import chunk
+
+SCOPE_FILE = 'gcontact.json'
+HOME_DIR = p.expanduser('~')
+CREDENTIAL_DIR = p.join(HOME_DIR, '.credentials')
+DEF_USER = getenv('USER', getenv('USERNAME', 'default'))
+APPLICATION_NAME = 'gContact'
+SCOPE = CONTACTS_API_URL = 'https://www.google.com/m8/feeds'
+MAX_BATCH = 100
+DEF_WORKERS = 4
+DEF_RETRIES = 3
+SUCCESS_CODES = atom.SUCCESS_CODES
+
+# https://developers.google.com/google-apps/contacts/v3/reference#Parameters
+DEF_PARAMS = (
+    'alt={format}&max-results={max_results}&start-index={start_index}')
+
+UPDATED_PARAMS = 'updated-min={updated_min}&showdeleted=true'
+
+DEFAULTS = {
+    'max_results': 8192, 'start_index': 1, 'user_email': 'default',
+    'format': 'json', 'api_url': CONTACTS_API_URL}
+
+
+def construct_url(**kwargs):
+    """Constructs URL to be used for API request.
+
+    :param updated_min: (optional) Only get the contacts updated since this
+        time, including the deleted ones.
+
+    >>> url = construct_url(api_url='http://localhost/m8/feeds', batch=True)
+    >>> url.split('?')[0]
+    'http://localhost/m8/feeds/contacts/default/full/batch/'
+    """
+    urlpattern = 'contacts/{user_email}/full'
+
+    if kwargs.get('batch'):
+        urlpattern += '/batch/?%s' % DEF_PARAMS
+    elif kwargs.get('contact_id'):
+        urlpattern += '/{contact_id}/?%s' % DEF_PARAMS
+    else:
+        urlpattern += '/?%s' % DEF_PARAMS
+
+    if kwargs.get('updated_min'):
+        urlpattern += '&%s' % UPDATED_PARAMS
+        kwargs['updated_min'] = quote(kwargs['updated_min'])
+
+    params = {**DEFAULTS, **kwargs}
+    return '%s/%s' % (params['api_url'], urlpattern.format(**params))
+
+
+def get_next_url(feed):
+    """Gets the URL of the next page of a JSON feed, or None."""
+    links = feed.get('link', [])
+    return next((l['href'] for l in links if l.get('rel') == 'next'), None)
+
+
+def get_credentials(keyfile=None, **kwargs):
+    from httplib2 import Http, ServerNotFoundError
+    from oauth2client.file import Storage
+
+    if not p.exists(CREDENTIAL_DIR):
+        makedirs(CREDENTIAL_DIR)
+
+    credential_path = p.join(CREDENTIAL_DIR, SCOPE_FILE)
+    store = Storage(credential_path)
+    store._create_file_if_needed()
+    credentials = None if kwargs.get('refresh') else store.get()
+    invalid = not credentials or credentials.invalid
+    has_expired = hasattr(credentials, 'access_token_expired')
+    expired = has_expired and credentials.access_token_expired
+
+    if invalid and keyfile:
+        if kwargs.get('service_account'):
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            credentials = ServiceAccountCredentials.from_json_keyfile_name(
+                keyfile, SCOPE)
+
+            if kwargs.get('account'):
+                credentials = credentials.create_delegated(kwargs['account'])
+
+            credentials.authorize(Http())
+        else:
+            from oauth2client.client import flow_from_clientsecrets
+            from oauth2client.tools import run_flow
+
+            flow = flow_from_clientsecrets(keyfile, SCOPE)
+            flow.user_agent = APPLICATION_NAME
+            credentials = run_flow(flow, store)
+
+        store.put(credentials)
+    elif credentials and (expired or not credentials.access_token):
+        try:
+            credentials.refresh(Http())
+        except ServerNotFoundError:
+            pass
+
+    return credentials
+
+
+def batch_feed(entries):
+    """Wraps batch entries in a feed.
+
+    :param entries: An iterable of elements, e.g., from
+        :meth:`~gcontact.Contact.batchxml`.
+    """
+    feed = Element('feed', dict(atom.BATCH_NAMESPACES))
+
+    feed.extend(entries)
+    return feed
+
+
+class Book(object):
+    """An instance of this class communicates with Google Data API.
+
+    :param keyfile: A Service Account Key file path
+        https://developers.google.com/api-client-library/python/auth/service-accounts#creatinganaccount
+
+    :param http_session: (optional) A session object capable of making HTTP
+        requests while persisting headers. Defaults to
+        :class:`~gcontact.httpsession.HTTPSession`.
+
+    :param mmap_cache: (optional) Cache the contacts in a memory mapped file
+        (see :mod:`gcontact.cache`) instead of the raw response. Contacts are
+        then only decoded when they are accessed (default: False).
+
+    :param compress: (optional) Cache the contacts in a compressed file
+        instead of the raw response. One of 'gzip' or 'zstd' (default: None).
+
+    :param cache_dir: (optional) The directory to keep a cache directory per
+        account in. Jobs can share it: cache files are replaced atomically
+        and fetching is serialized with a file lock (default: the current
+        directory, without per account directories).
+
+    :param store: (optional) A :class:`~gcontact.store.ContactStore`, or
+        its path, to cache the contacts in instead of a file. Processes can
+        share it and query it directly (default: None).
+
+    :param lru: (optional) A :class:`~gcontact.cache.LRUCache` of contacts
+        fetched with :meth:`~gcontact.Book.fetch`. Books can share one since
+        it is keyed by account (default: a new cache of `lru_size` contacts
+        that are fresh for `lru_ttl` seconds).
+
+    :param tracer: (optional) A :class:`~gcontact.tracing.Tracer` to time
+        the book's phases with (default: the `GCONTACT_PROFILE` profiler,
+        see :func:`~gcontact.tracing.from_env`, or None).
+
+    :param progress: (optional) A function called with a
+        :class:`~gcontact.progress.Progress` as bulk operations (fetching,
+        deduping and submitting) advance (default: None).
+
+    :param progress_interval: (optional) The least number of seconds between
+        progress reports of a task (default: 0).
+
+    >>> book = Book('path/to/keyfile.json')
+
+    """
+    def __init__(self, keyfile, **kwargs):
+        self.tracer = kwargs.get('tracer') or tracing.from_env()
+        self.progress = kwargs.get('progress')
+        self.progress_interval = kwargs.get('progress_interval', 0)
+        user = kwargs.get('user', DEF_USER)
+        self.hash_keys = kwargs.get('hash_keys')
+        self.hashbits = kwargs.get('hashbits', dd.DEF_HASHBITS)
+        self.account = '%s@gmail.com' % user
+        self.session = kwargs.get('session', HTTPSession())
+        self.format = kwargs.get('format', 'json')
+        self.cache_resp = kwargs.get('cache_resp', True)
+        self.use_cache = kwargs.get('use_cache', True)
+        self.bits = kwargs.get('bits', 3)
+        self.max_block = kwargs.get('max_block')
+        self.batch_size = kwargs.get('batch_size', MAX_BATCH)
+        self.mmap_cache = kwargs.get('mmap_cache', False)
+        self.compress = kwargs.get('compress')
+        self.cache_dir = kwargs.get('cache_dir')
+        self.store = kwargs.get('store')
+        self.api_url = kwargs.get('api_url', CONTACTS_API_URL)
+        self.page_size = kwargs.get('page_size', DEFAULTS['max_results'])
+        self._cache = None
+        self.lru = kwargs.get('lru')
+
+        if self.lru is None:
+            self.lru = cache.LRUCache(
+                kwargs.get('lru_size', cache.DEF_MAXSIZE),
+                kwargs.get('lru_ttl', cache.DEF_TTL))
+        self.contact_kwargs = {
+            'hash_keys': self.hash_keys, 'hashbits': self.hashbits}
+
+        if self.format not in {'json', 'atom', 'rss'}:
+            raise UnsupportedFormatError(self.format)
+
+        if self.compress and self.compress not in cache.CODECS:
+            raise UnsupportedFormatError(self.compress)
+
+        if isinstance(self.store, str):
+            self.store = ContactStore(self.store, hashbits=self.hashbits)
+
+        if self.cache_type in cache.CODECS:
+            # fail before fetching anything if the codec isn't installed
+            cache.get_codec(self.cache_path, self.cache_type)
+
+        if self.cache_root and (self.use_cache or self.cache_resp):
+            makedirs(self.cache_root, exist_ok=True)
+
+        feed = {}
+
+        if self.use_cache:
+            try:
+                with open(self.etag_path) as f:
+                    feed = loads(f.read())['feed']
+            except (FileNotFoundError, KeyError, JSONDecodeError):
+                pass
+
+        if self.use_cache and self.cache_type == 'store':
+            self._etag = self.store.etag(self.account)
+        else:
+            self._etag = feed.get('gd$etag')
+
+        # the server's time of the last sync
+        self._updated = feed.get('updated', {}).get('$t')
+
+        self._contacts = self._load_cache() if self.use_cache else None
+
+        self.credentials = get_credentials(keyfile, **kwargs)
+
+        if self.credentials:
+            token = 'Bearer %s' % self.credentials.access_token
+            self.session.add_header('Authorization', token)
+
+        self.session.add_header('GData-Version', '3.0')
+
+    @classmethod
+    def from_csv(cls, csv_path, **kwargs):
+        """Creates a book of the contacts in a LinkedIn, Outlook, Google or
+        vCard-like CSV file (see :func:`~gcontact.csvimport.read_contacts`).
+        """
+        book = cls(None, use_cache=False)
+        book._contacts = csvimport.read_contacts(csv_path, **kwargs)
+        return book
+
+    @property
+    def etag(self):
+        """The feed's etag when the contacts were fetched, or None if it
+        isn't known (see :meth:`sync`)."""
+        return self._etag
+
+    @etag.setter
+    def etag(self, value):
+        self._etag = value
+
+    def _fetch_etag(self):
+        return self.session.get(self._url(format='json', max_results=0))
+
+    def _write_etag(self, content):
+        with cache.atomic_write(self.etag_path) as f:
+            f.write(content)
+
+    def sync(self):
+        """Updates the contacts if the account's feed has changed since
+        they were cached.
+
+        The cached etag is compared with the feed's, which only costs a
+        request for an empty page. If they differ, only the contacts that
+        were updated or deleted since the last sync are fetched, and merged
+        into the cached ones. All the contacts are fetched if none are
+        loaded, or if the time of the last sync isn't known. The new etag
+        is cached once the contacts are.
+
+        :returns: True if the contacts were updated.
+
+        >>> book = Book('path/to/keyfile.json', cache_dir='.cache')
+        >>> book.sync()
+        """
+        r = self._fetch_etag()
+        feed = r.json()['feed']
+        etag = feed['gd$etag']
+        loaded = self._contacts is not None or self._cache is not None
+        stale = etag != self._etag or not loaded
+
+        if stale and loaded and self._updated and self.format == 'json':
+            self._merge_changes(self._updated, etag)
+        elif stale:
+            cached = self.use_cache or self.cache_resp
+            locked = cache.lock(self.cache_path) if cached else nullcontext()
+
+            with locked:
+                if self._cache is not None:
+                    self._cache.close()
+
+                self._cache = None
+                self._contacts = self._fetch_contacts(etag)
+
+        if self.cache_resp:
+            self._write_etag(r.content)
+
+        self._etag = etag
+        self._updated = feed.get('updated', {}).get('$t')
+        return stale
+
+    def _merge_changes(self, updated_min, etag):
+        """Fetches the contacts updated or deleted since a time, and merges
+        them into the book's contacts and cache.
+        """
+        pages = self._iter_pages(updated_min=updated_min)
+        changes = {
+            cache.get_short_id(entry): entry for page in pages
+            for entry in page}
+
+        for short_id in changes:
+            self.lru.pop((self.account, short_id))
+
+        contacts = []
+
+        for contact in self.contacts:
+            entry = changes.pop(contact.short_id, None)
+
+            if entry is None:
+                contacts.append(contact)
+            elif 'gd$deleted' not in entry:
+                contacts.append(self._make_contact(entry))
+
+        contacts.extend(
+            self._make_contact(entry) for entry in changes.values()
+            if 'gd$deleted' not in entry)
+
+        self._contacts = contacts
+        self._update_cache(contacts, etag)
+
+    @property
+    def cache_type(self):
+        if self.format != 'json':
+            cache_type = 'raw'
+        elif self.store is not None:
+            cache_type = 'store'
+        elif self.mmap_cache:
+            cache_type = 'mmap'
+        else:
+            cache_type = self.compress or 'raw'
+
+        return cache_type
+
+    @property
+    def cache_root(self):
+        return p.join(self.cache_dir, self.account) if self.cache_dir else ''
+
+    @property
+    def etag_path(self):
+        return p.join(self.cache_root, 'etag.json')
+
+    @property
+    def cache_path(self):
+        if self.cache_type == 'store':
+            path = self.store.path
+        elif self.cache_type == 'raw':
+            path = p.join(self.cache_root, 'cache.%s' % self.format)
+        elif self.cache_type == 'mmap':
+            path = p.join(self.cache_root, 'cache.mmap')
+        else:
+            ext = cache.CODECS[self.cache_type]
+            path = p.join(self.cache_root, 'cache.jsonl%s' % ext)
+
+        return path
+
+    def _load_cache(self):
+        """Loads the cached contacts.
+
+        :returns: a list of contacts, or None if they need to be fetched.
+        """
+        contacts = None
+
+        if self.cache_type == 'store':
+            if self.store.has(self.account):
+                entries = self.store.entries(self.account)
+                contacts = self._make_contacts(entries)
+        elif self.cache_type == 'mmap':
+            try:
+                self._cache = cache.ContactCache(self.cache_path)
+            except (FileNotFoundError, CacheError):
+                pass
+        elif self.cache_type == 'raw':
+            try:
+                with open(self.cache_path) as f, self.span('decode'):
+                    entries = loads(f.read())['feed']['entry']
+            except (FileNotFoundError, KeyError, JSONDecodeError):
+                pass
+            else:
+                contacts = self._make_contacts(entries)
+        else:
+            entries = cache.read_compressed(self.cache_path, self.cache_type)
+
+            try:
+                contacts = self._make_contacts(entries)
+            except (FileNotFoundError, CacheError):
+                pass
+
+        return contacts
+
+    def _write_cache(self, content, entries, contacts, etag=None):
+        if self.cache_type == 'store':
+            self.store.save(self.account, contacts, etag=etag)
+        elif self.cache_type == 'raw':
+            with cache.atomic_write(self.cache_path) as f:
+                f.write(content)
+        elif self.cache_type == 'mmap':
+            cache.write(self.cache_path, entries)
+        else:
+            cache.write_compressed(self.cache_path, entries, self.cache_type)
+
+    def span(self, name):
+        """Times a phase with the book's tracer, if it has one.
+
+        >>> with book.span('export'):
+        ...     export(book.contacts)
+        """
+        return self.tracer.span(name) if self.tracer else tracing.NULL_SPAN
+
+    def reporter(self, task, total=None):
+        """Gets a :class:`~gcontact.progress.ProgressReporter` for a task
+        that calls the book's `progress` function, if it has one."""
+        if self.progress:
+            interval = self.progress_interval
+            args = (task, self.progress, total)
+            reporter = progress.ProgressReporter(*args, interval=interval)
+        else:
+            reporter = progress.NULL_REPORTER
+
+        return reporter
+
+    def _make_contact(self, entry):
+        kwargs = {**self.contact_kwargs, **entry}
+        return Contact(self.account, self.session, **kwargs)
+
+    def _make_contacts(self, entries):
+        with self.span('build'):
+            return [self._make_contact(entry) for entry in entries]
+
+    def _url(self, **kwargs):
+        kwargs.setdefault('max_results', self.page_size)
+        return construct_url(
+            user_email=self.account, api_url=self.api_url, **kwargs)
+
+    def _fetch_contacts(self, etag=None):
+        """Fetches all contacts, following the feed's pages if it has any.
+
+        :param etag: (optional) The feed's etag, saved with the contacts in
+            a store.
+        """
+        with self.span('fetch'):
+            r = self.session.get(self._url(format=self.format))
+
+        content = r.content
+
+        if self.format == 'json':
+            with self.span('decode'):
+                feed = r.json()['feed']
+
+            entries = feed.get('entry', [])
+            next_url = get_next_url(feed)
+            total = feed.get('openSearch$totalResults', {}).get('$t')
+            reporter = self.reporter('fetch', total and int(total))
+            reporter.update(len(entries), nbytes=len(content))
+
+            if next_url:
+                while next_url:
+                    with self.span('fetch'):
+                        r = self.session.get(next_url)
+
+                    with self.span('decode'):
+                        page = r.json()['feed']
+
+                    page_entries = page.get('entry', [])
+                    entries.extend(page_entries)
+                    reporter.update(len(page_entries), nbytes=len(r.content))
+                    next_url = get_next_url(page)
+
+                if self.cache_resp and self.cache_type == 'raw':
+                    # the raw cache is the whole feed, not the first page
+                    feed = dict(feed, entry=entries, link=[])
+                    content = dumps({'feed': feed}).encode('utf-8')
+
+            reporter.finish()
+
+            contacts = self._make_contacts(entries)
+        else:
+            entries, contacts = None, []
+
+        if self.cache_resp:
+            with self.span('cache.write'):
+                self._write_cache(content, entries, contacts, etag)
+
+        return contacts
+
+    def _iter_pages(self, **kwargs):
+        """Fetches the feed's pages one at a time.
+
+        :param kwargs: Keyword arguments passed to :func:`construct_url`.
+
+        :returns: an iterator of lists of JSON feed entries.
+        """
+        url = self._url(format='json', **kwargs)
+        reporter = None
+
+        while url:
+            with self.span('fetch'):
+                r = self.session.get(url)
+
+            with self.span('decode'):
+                page = r.json()['feed']
+
+            if reporter is None:
+                total = page.get('openSearch$totalResults', {}).get('$t')
+                reporter = self.reporter('fetch', total and int(total))
+
+            entries = page.get('entry', [])
+            reporter.update(len(entries), nbytes=len(r.content))
+            yield entries
+            url = get_next_url(page)
+
+        reporter.finish()
+
+    def iter_entries(self):
+        """Iterates over the contacts as JSON feed entries.
+
+        The entries come from the loaded contacts, the memory mapped cache,
+        or else from a live fetch that only holds one page at a time (and
+        isn't cached). So unlike :attr:`contacts`, a book that isn't loaded
+        yet is never read into memory all at once.
+
+        >>> for entry in book.iter_entries():
+        ...     print(entry['title']['$t'])
+        """
+        if self._contacts is not None:
+            entries = (contact.entry for contact in self._contacts)
+        elif self._cache is not None:
+            entries = iter(self._cache)
+        else:
+            pages = self._iter_pages()
+            entries = (entry for page in pages for entry in page)
+
+        return entries
+
+    def export(self, path, **kwargs):
+        """Exports the contacts to a CSV, JSON lines or Parquet file as
+        they are read (see :meth:`iter_entries`).
+
+        :param path: The file path.
+        :param kwargs: Keyword arguments passed to
+            :func:`~gcontact.export.write`.
+
+        :returns: the number of contacts exported.
+
+        >>> book.export('contacts.parquet', chunk_size=4096)
+        """
+        with self.span('export'):
+            return export.write(path, self.iter_entries(), **kwargs)
+
+    @property
+    def contacts(self):
+        if self._contacts is None and self._cache is None:
+            cached = self.use_cache or self.cache_resp
+            locked = cache.lock(self.cache_path) if cached else nullcontext()
+
+            with locked:
+                # another job may have cached the contacts while we waited
+                if self.use_cache:
+                    with self.span('cache.load'):
+                        self._contacts = self._load_cache()
+
+                if self._contacts is None and self._cache is None:
+                    self._contacts = self._fetch_contacts()
+
+        if self._contacts is None:
+            self._contacts = self._make_contacts(self._cache)
+
+        return self._contacts
+
+    @property
+    def hashes(self):
+        contacts = self.contacts
+
+        with self.span('simhash'):
+            return [contact.simhash for contact in contacts]
+
+    @property
+    def fingerprints(self):
+        hashes = self.hashes
+
+        with self.span('fingerprints'):
+            return dd.fingerprints(hashes)
+
+    @property
+    def contacts_by_name(self):
+        contacts = defaultdict(list)
+
+        for contact in self.contacts:
+            contacts[contact.title].append(contact)
+
+        return contacts
+
+    @property
+    def contacts_by_key(self):
+        return {contact.short_id: contact for contact in self.contacts}
+
+    @property
+    def hash_index(self):
+        from changanya.simhash import SimhashIndex
+
+        return SimhashIndex(self.hashes, bits=self.bits)
+
+    @property
+    def features(self):
+        contacts = self.contacts
+
+        with self.span('features'):
+            return [contact.features for contact in contacts]
+
+    @property
+    def blocking_index(self):
+        features = self.features
+
+        with self.span('index'):
+            return dd.BlockingIndex(features, self.max_block)
+
+    def __getitem__(self, name):
+        """Gets a contact.
+
+        :param name: The contact's name.
+
+        :returns: a :class:`~gcontact.Contact` instance.
+
+        If there's more than one contact with same name, returns the first one.
+
+        :raises gcontact.ContactNotFound: if no contact with
+                                             specified `name` is found.
+
+        >>> book = Book('path/to/keyfile.json')
+        >>> book['Reuben Cummings']
+        >>> book[:2]
+        >>> book[0]
+        """
+        try:
+            contacts = self.contacts_by_name[name]
+        except KeyError as e:
+            raise ContactNotFound(e)
+        except TypeError:  # it's a slice
+            return self.contacts[name]
+        else:
+            return contacts[0] if contacts else self.contacts[name]
+
+    def __getattr__(self, key):
+        """Gets a contact specified by `key`.
+
+        :param key: A key of a contact as it appears in a URL in a browser.
+
+        :returns: a :class:`~gcontact.Contact` instance.
+
+        :raises gcontact.ContactNotFound: if no contact with
+                                             specified `key` is found.
+
+        >>> book = Book('path/to/keyfile.json')
+        >>> book.0BmgG6nO_6dprdS1MN3d3MkdPa142WFRrdnRRUWl1UFE
+
+        If the contacts haven't been loaded yet, only the requested contact
+        is decoded from a memory mapped cache or else fetched.
+        """
+        mapped = self.__dict__.get('_cache')
+        cold = '_contacts' in self.__dict__ and self._contacts is None
+
+        if cold and mapped is not None:
+            entry = mapped.get(key)
+
+            if entry is None:
+                raise ContactNotFound(key)
+
+            return self._make_contact(entry)
+        elif cold:
+            try:
+                return self.fetch(key)
+            except RequestError as e:
+                raise ContactNotFound(e)
+
+        try:
+            contact = self.contacts_by_key[key]
+        except KeyError as e:
+            raise ContactNotFound(e)
+        else:
+            return contact
+
+    def fetch(self, key, refresh=False):
+        """Fetches a single contact.
+
+        Recently fetched contacts are served from :attr:`lru` until they
+        expire, and are then revalidated with their etag, so an unchanged
+        contact costs a `304 Not Modified` response without a body.
+
+        :param key: A key of a contact as it appears in a URL in a browser.
+        :param refresh: (optional) Revalidate the contact even if it hasn't
+            expired (default: False).
+
+        :returns: a :class:`~gcontact.Contact` instance.
+
+        >>> book = Book('path/to/keyfile.json')
+        >>> book.fetch('0BmgG6nO_6dprdS1MN3d3MkdPa142WFRrdnRRUWl1UFE')
+        """
+        lru_key = (self.account, key)
+        item = self.lru.get(lru_key)
+
+        if item is None or refresh or not self.lru.is_fresh(item):
+            url = self._url(contact_id=key)
+            etag = item and item.etag
+            headers = {'If-None-Match': etag} if etag else None
+
+            try:
+                r = self.session.get(url, headers=headers)
+            except RequestError:
+                self.lru.pop(lru_key)
+                raise
+
+            if item is None or r.status_code != 304:
+                entry = r.json()['entry']
+                item = cache.CacheItem(entry, entry.get('gd$etag'), None)
+
+            self.lru.put(lru_key, item.value, item.etag)
+
+        # contacts modify their fields in place
+        return self._make_contact(deepcopy(item.value))
+
+    def __delitem__(self, name):
+        """Deletes a contact.
+
+        :param key: a contact ID.
+
+        If there's more than one contact with same name, deletes the first one.
+
+        >>> book = Book('path/to/keyfile.json')
+        >>> del c['Reuben Cummings']
+        """
+        return self[name].delete()
+
+    def __delattr__(self, key):
+        """Deletes a contact.
+
+        :param key: a contact ID.
+        >>> book = Book('path/to/keyfile.json')
+        >>> del book.0BmgG6nO_6dprdS1MN3d3MkdPa142WFRrdnRRUWl1UFE
+        """
+        return getattr(self, key).delete()
+
+    def __iter__(self):
+        return iter(self.contacts)
+
+    def find_dupes(self, **kwargs):
+        """Finds the positions of all duplicate contacts.
+
+        Each contact's features are normalized once and candidates are scored
+        by the emails, phones, IM addresses, names and simhash they share.
+
+        :param blocking: (optional) Only score contacts sharing an email,
+            phone, IM address or name (default: False). Otherwise, score
+            contacts within `bits` simhash distance.
+        :param workers: (optional) The number of processes to search the
+            simhash blocks with (default: 1).
+
+        :returns: a list of (i, j, reasons) duplicates.
+        """
+        values = self.fingerprints
+        records = self.features
+        workers = kwargs.get('workers')
+
+        if kwargs.get('blocking'):
+            with self.span('index'):
+                index = dd.BlockingIndex(records, self.max_block)
+
+            with self.span('pairs'):
+                pairs = index.candidate_pairs()
+        elif workers and workers > 1:
+            args = (values, self.bits, self.hashbits, workers)
+
+            with self.span('pairs'):
+                pairs = dd.find_pairs_parallel(*args)
+        else:
+            with self.span('pairs'):
+                pairs = dd.find_pairs(values, self.bits, self.hashbits)
+
+        with self.span('compare'):
+            return dd.compare_pairs(records, values, pairs, self.bits)
+
+    def clusters(self, **kwargs):
+        """Groups duplicate contacts into connected clusters.
+
+        :param kwargs: Keyword arguments passed to
+            :meth:`~gcontact.Book.find_dupes`.
+
+        :returns: a list of clusters (lists of contacts).
+
+        >>> book = Book('path/to/keyfile.json')
+        >>> book.clusters(workers=4)
+        """
+        found = self.find_dupes(**kwargs)
+
+        with self.span('cluster'):
+            clusters = dd.find_clusters(found, len(self.contacts))
+
+        return [[self.contacts[pos] for pos in c] for c in clusters]
+
+    def dedupe(self, contact=None, **kwargs):
+        """Finds duplicate contacts and plans how to merge them.
+
+        :param contact: (optional) A :class:`~gcontact.Contact` to look up.
+        :param merge: (optional) Execute the merge plans (default: False).
+        :param kwargs: Keyword arguments passed to
+            :meth:`~gcontact.Book.find_dupes`.
+
+        :returns: a list of (dupe, reasons) for `contact`, or if no contact is
+            given, a list of :class:`~gcontact.dedupe.MergePlan` objects, one
+            per cluster of duplicates.
+
+        >>> book = Book('path/to/keyfile.json')
+        >>> book.dedupe(blocking=True)
+        >>> book.dedupe(workers=4, merge=True)
+        """
+        if contact:
+            values = self.fingerprints
+            records = self.features
+            record, value = contact.features, contact.simhash.hash
+
+            if kwargs.get('blocking'):
+                with self.span('index'):
+                    index = dd.BlockingIndex(records, self.max_block)
+
+                positions = sorted(index.query(record))
+            else:
+                positions = dd.find_matches(values, value, self.bits)
+
+            args = (record, value, records, values, positions)
+
+            with self.span('compare'):
+                found = dd.compare_to(*args, bits=self.bits)
+
+            return [(self.contacts[pos], reasons) for pos, reasons in found]
+        else:
+            with self.span('dedupe'):
+                clusters = self.clusters(**kwargs)
+
+            reporter = self.reporter('dedupe', len(clusters))
+
+            with self.span('plan'):
+                plans = []
+
+                for cluster in clusters:
+                    plans.append(dd.plan_merge(cluster))
+                    reporter.update()
+
+            reporter.finish()
+
+            if kwargs.get('merge'):
+                self.merge(plans, workers=kwargs.get('workers'))
+
+            return plans
+
+    def merge(self, plans, **kwargs):
+        """Executes merge plans in batch requests.
+
+        Each survivor gets the unioned fields of its plan, and the survivor
+        updates of all plans are submitted together. A plan's dupes are
+        then deleted in a second request, but only if its survivor was
+        updated, so no fields are lost when an update fails. The book's
+        contacts, and its cache, are then updated with the operations that
+        succeeded.
+
+        :param plans: An iterable of :class:`~gcontact.dedupe.MergePlan`.
+        :param kwargs: Keyword arguments passed to
+            :meth:`~gcontact.Book.submit`.
+
+        :returns: a list of (operation, contact, result) tuples.
+        """
+        plans = list(plans)
+
+        for plan in plans:
+            for field, items in plan.fields.items():
+                setattr(plan.survivor, field, items)
+
+        updates = [('update', plan.survivor) for plan in plans]
+        updated = self.submit(updates, **kwargs)
+
+        deletes = [
+            ('delete', dupe)
+            for plan, (_, _, result) in zip(plans, updated)
+            if result.code in SUCCESS_CODES for dupe in plan.deletes]
+
+        submitted = updated + self.submit(deletes, **kwargs)
+        self._apply(submitted)
+        return submitted
+
+    def batch(self, operations):
+        """Submits contact operations via the batch endpoint.
+
+        :param operations: An iterable of (operation, contact) tuples, where
+            operation is one of 'insert', 'update', or 'delete'.
+
+        :returns: a list of responses, one per batch of `batch_size`
+            operations.
+
+        Each batch body is streamed to the server in chunks as it is
+        serialized.
+        """
+        url = self._url(format='atom', batch=True)
+        headers = {'Content-Type': 'application/atom+xml'}
+        responses = []
+
+        for group in chunk(operations, self.batch_size):
+            data = atom.iter_batch_feed(group)
+            r = self.session.post(url, data=data, headers=headers)
+            responses.append(r)
+
+        return responses
+
+    def submit(self, operations, **kwargs):
+        """Submits contact operations in concurrent batch requests.
+
+        Up to `workers` batches are kept in flight at once. Each operation's
+        result is matched to its contact via the batch id, and successful
+        inserts and updates set the contact's id and etag. Operations that
+        fail with a transient error (a status in `RETRY_CODES`, or no
+        response at all) are resent in a new batch up to `retries` times;
+        the successful ones are not resent. Resends are scheduled after
+        their backoff, so the other batches' results are still collected in
+        the meantime.
+
+        :param operations: An iterable of (operation, contact) tuples, where
+            operation is one of 'insert', 'update', or 'delete'.
+        :param workers: (optional) The number of batches to keep in flight
+            (default: 4).
+        :param retries: (optional) The number of times to resend a failed
+            operation (default: 3).
+        :param backoff: (optional) The number of seconds to wait before
+            resending, multiplied by the attempt number (default: 1).
+        :param on_result: (optional) A function called with the position,
+            operation, contact and result of each operation as soon as its
+            final result is known.
+
+        :returns: a list of (operation, contact, result) tuples in the same
+            order as `operations`, where result is a
+            :class:`~gcontact.atom.BatchResult`.
+
+        >>> book = Book('path/to/keyfile.json')
+        >>> book.submit([('delete', book[0])], workers=8)
+        """
+        workers = kwargs.get('workers') or DEF_WORKERS
+        retries = kwargs.get('retries', DEF_RETRIES)
+        backoff = kwargs.get('backoff', 1)
+        on_result = kwargs.get('on_result')
+        url = self._url(format='atom', batch=True)
+        headers = {'Content-Type': 'application/atom+xml'}
+        operations = list(operations)
+        results = [None] * len(operations)
+        reporter = self.reporter('submit', len(operations))
+        attempts = defaultdict(int)
+        pending = deque(range(len(operations)))
+        in_flight = {}
+
+        # a heap of (time, position) of the operations waiting to be resent
+        delayed = []
+
+        def send(positions):
+            items = (operations[pos] + (str(pos),) for pos in positions)
+            data = atom.iter_batch_feed(items)
+            r = self.session.post(url, data=data, headers=headers)
+            found = atom.parse_batch_response(r.content)
+            return {result.batch_id: result for result in found}
+
+        with ThreadPoolExecutor(workers) as executor:
+            while pending or in_flight or delayed:
+                now = monotonic()
+
+                while delayed and delayed[0][0] <= now:
+                    pending.append(heappop(delayed)[1])
+
+                while pending and len(in_flight) < workers:
+                    size = min(self.batch_size, len(pending))
+                    positions = [pending.popleft() for _ in range(size)]
+                    in_flight[executor.submit(send, positions)] = positions
+
+                if not in_flight:
+                    # nothing to collect until the next resend is due
+                    sleep(delayed[0][0] - now)
+                    continue
+
+                timeout = delayed[0][0] - now if delayed else None
+                done, _ = wait(
+                    in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    positions = in_flight.pop(future)
+
+                    try:
+                        found, status, reason = future.result(), None, None
+                    except RequestError as e:
+                        found, status, reason = {}, e.status, str(e)
+                    except IOError as e:
+                        found, status, reason = {}, None, str(e)
+
+                    for pos in positions:
+                        batch_id = str(pos)
+                        missing = atom.BatchResult(
+                            batch_id, status, reason, None, None)
+
+                        result = found.get(batch_id, missing)
+                        code = result.code
+                        transient = code is None or code in RETRY_CODES
+
+                        if transient and attempts[pos] < retries:
+                            attempts[pos] += 1
+                            ready = monotonic() + backoff * attempts[pos]
+                            heappush(delayed, (ready, pos))
+                            continue
+
+                        results[pos] = result
+                        op, contact = operations[pos]
+                        succeeded = code in SUCCESS_CODES
+
+                        if succeeded and op in {'insert', 'update'}:
+                            if result.id:
+                                contact._id = result.id
+
+                            if result.etag:
+                                contact.etag = result.etag
+
+                        if on_result:
+                            on_result(pos, op, contact, result)
+
+                        reporter.update(errors=not succeeded)
+
+        reporter.finish()
+
+        return [
+            (op, contact, result)
+            for (op, contact), result in zip(operations, results)]
+
+    def reconcile(self, contacts):
+        """Classifies incoming contacts as new, changed or unchanged.
+
+        The book is indexed once, and each incoming contact is only scored
+        against the contacts it shares an email, phone, IM address or name
+        with. Neither the incoming nor the book's contacts are modified.
+
+        :param contacts: An iterable of :class:`~gcontact.Contact` objects,
+            e.g., a book from :meth:`~gcontact.Book.from_csv`.
+
+        :returns: a :class:`~gcontact.dedupe.ChangeSet`.
+
+        >>> book = Book('path/to/keyfile.json')
+        >>> changeset = book.reconcile(Book.from_csv('path/to/file.csv'))
+        >>> book.commit(changeset)
+        """
+        values = self.fingerprints
+        records = self.features
+        index = dd.BlockingIndex(records, self.max_block)
+        matched = defaultdict(list)
+        new, unchanged = [], []
+
+        for contact in contacts:
+            record, value = contact.features, contact.simhash.hash
+            positions = sorted(index.query(record))
+            args = (record, value, records, values, positions)
+            found = dd.compare_to(*args, bits=self.bits)
+
+            if found:
+                pos, _ = max(found, key=lambda item: len(item[1]))
+
+                if dd.union_fields(self.contacts[pos], [contact]):
+                    matched[pos].append(contact)
+                else:
+                    unchanged.append((self.contacts[pos], contact))
+            else:
+                new.append(contact)
+
+        changed = [
+            dd.Change(
+                self.contacts[pos],
+                dd.union_fields(self.contacts[pos], incoming), incoming)
+            for pos, incoming in sorted(matched.items())]
+
+        return dd.ChangeSet(new, changed, unchanged)
+
+    def commit(self, changeset, **kwargs):
+        """Applies a change set and submits it in batch requests.
+
+        The book's contacts, and its cache, are then updated with the
+        operations that succeeded.
+
+        :param changeset: A :class:`~gcontact.dedupe.ChangeSet`, e.g., from
+            :meth:`~gcontact.Book.reconcile`.
+        :param journal: (optional) A :class:`~gcontact.journal.Journal` to
+            record the operations and their results in. Operations the
+            journal has already seen succeed are skipped.
+        :param kwargs: Keyword arguments passed to
+            :meth:`~gcontact.Book.submit`.
+
+        :returns: a list of (operation, contact, result) tuples.
+        """
+        for change in changeset.changed:
+            for field, items in change.fields.items():
+                setattr(change.contact, field, items)
+
+        journal = kwargs.pop('journal', None)
+
+        if journal is None:
+            submitted = self.submit(changeset.operations, **kwargs)
+        else:
+            todo = journal.plan(changeset.operations)
+            submitted = self._submit_journaled(journal, todo, **kwargs)
+
+        self._apply(submitted)
+        return submitted
+
+    def resume(self, journal, **kwargs):
+        """Submits the operations of an interrupted job.
+
+        Only the operations the journal has no successful acknowledgment
+        for are submitted, and the contacts are restored from the journal,
+        so the incoming contacts don't need to be reconciled again.
+
+        Note that an operation the server received right before the crash,
+        but whose acknowledgment was never recorded, is submitted again.
+
+        :param journal: A :class:`~gcontact.journal.Journal`.
+        :param kwargs: Keyword arguments passed to
+            :meth:`~gcontact.Book.submit`.
+
+        :returns: a list of (operation, contact, result) tuples.
+
+        >>> book = Book('path/to/keyfile.json')
+        >>> book.resume(Journal('import.journal'))
+        """
+        todo = [
+            (key, op, self._make_contact(entry))
+            for key, op, entry in journal.pending]
+
+        submitted = self._submit_journaled(journal, todo, **kwargs)
+        self._apply(submitted)
+        return submitted
+
+    def _submit_journaled(self, journal, todo, **kwargs):
+        def on_result(pos, op, contact, result):
+            journal.ack(todo[pos][0], result)
+
+        operations = [(op, contact) for _, op, contact in todo]
+        return self.submit(operations, on_result=on_result, **kwargs)
+
+    def _apply(self, submitted):
+        """Updates the book's contacts with the successful operations."""
+        succeeded = [
+            (op, contact) for op, contact, result in submitted
+            if result.code in SUCCESS_CODES]
+
+        changed = {c.short_id: (op, c) for op, c in succeeded}
+
+        for short_id in changed:
+            self.lru.pop((self.account, short_id))
+        contacts = []
+
+        for contact in self.contacts:
+            op, contact = changed.get(contact.short_id, (None, contact))
+
+            if op != 'delete':
+                contacts.append(contact)
+
+        contacts.extend(contact for op, contact in succeeded if op == 'insert')
+        self._contacts = contacts
+
+        if succeeded:
+            self._update_cache(contacts)
+
+    def _update_cache(self, contacts, etag=None):
+        """Rewrites the cached contacts after they changed.
+
+        :param etag: (optional) The feed's etag of the contacts. If it isn't
+            known, the cached one is dropped so that the next :meth:`sync`
+            checks for changes.
+        """
+        if self.cache_type == 'store':
+            cached = self.store.has(self.account)
+        else:
+            cached = p.exists(self.cache_path)
+
+        if cached and self.cache_resp:
+            entries = [contact.entry for contact in contacts]
+            content = dumps({'feed': {'entry': entries}}).encode('utf-8')
+
+            with cache.lock(self.cache_path), self.span('cache.write'):
+                if self._cache is not None:
+                    self._cache.close()
+                    self._cache = None
+
+                if self.format == 'json':
+                    self._write_cache(content, entries, contacts, etag)
+                else:
+                    remove(self.cache_path)
+
+                if etag is None and p.exists(self.etag_path):
+                    remove(self.etag_path)
+
+        self._etag = etag
+
+    def create(self, **kwargs):
+        """Creates a new contact.
+
+        :param name: A name of a new contact.
+
+        :returns: a :class:`~gcontact.Contact` instance.
+        """
+        contact = Contact(*args, **kwargs)
+        contact.create()
+        return contact
+
+    def create_or_update(self, contact):
+        dupes = self.hash_index.find_dupes(contact.simhash)
+        reporter = self.reporter('create_or_update', 1)
+        reporter.note('contact %s' % contact.hash_content)
+        old_org = contact.organization
+        old_email = contact.email
+        same = True
+
+        try:
+            dupe_hash = next(dupes)
+        except StopIteration:
+            reporter.note('no dupes')
+            # self.create(contact)
+        else:
+            dupe = getattr(self, dupe_hash.cid)
+            contact.organization = dupe.organization
+            contact.email = dupe.email
+            new_org = contact.organization
+            new_email = contact.email
+
+            if old_email != new_email:
+                args = (old_email, new_email)
+                reporter.note('changed email: %s -> %s' % args)
+                same = False
+
+            if old_org != new_org:
+                reporter.note('changed org: %s -> %s' % (old_org, new_org))
+                same = False
+
+            if same:
+                reporter.note('no changes!')
+
+        reporter.update()
@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.cache
+~~~~~~~~~~~~~~
+
+This module contains contact caches: a memory mapped cache, a
+compressed cache, and an in-memory LRU cache of single contacts.
+
+The cache file stores one length prefixed JSON record per contact entry,
+preceded by a fixed size index of (short id, offset) pairs sorted by short
+id. Opening a cache only maps the file, a lookup is a binary search of the
+index, and only the entries that are looked up are decoded.
+
+    +--------+------------------------------+-------------------------+
+    | header | index: count * (key, offset) | records: (length, json) |
+    +--------+------------------------------+-------------------------+
+
+The compressed cache is a gzip or zstd (if `zstandard` is installed)
+compressed JSON lines file with one entry per line. It is decompressed
+line by line as the entries are read.
+
+Both caches only keep the entry fields that :class:`~gcontact.Contact`
+reads, e.g., the `link` and `category` boilerplate is dropped.
+
+Cache files are written atomically (to a temporary file that then replaces
+the cache file), so a reader never sees a partially written cache. Jobs
+that share a cache directory can coordinate fetching with :func:`lock`.
+
+"""
+import gzip
+import io
+import mmap
+import os
+import tempfile
+
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+from json import dumps, loads
+from os import path as p
+from struct import Struct
+
+from .exceptions import CacheError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAGIC = b'GCM1'
+
+# magic, number of entries, key size
+HEADER = Struct('<4sII')
+OFFSET = Struct('<Q')
+LENGTH = Struct('<I')
+
+CODECS = {'gzip': '.gz', 'zstd': '.zst'}
+DEF_MAXSIZE = 1024
+DEF_TTL = 60
+DEF_LEVELS = {'gzip': 6, 'zstd': 3}
+
+CacheItem = namedtuple('CacheItem', ['value', 'etag', 'expires'])
+
+# The fields read by `gcontact.Contact`
+ENTRY_KEYS = {
+    'id', 'updated', 'title', 'content', 'gd$etag', 'gd$name',
+    'gd$organization', 'gd$email', 'gd$im', 'gd$phoneNumber',
+    'gd$postalAddress', 'gd$structuredPostalAddress',
+    'gContact$groupMembershipInfo', 'gd$extendedProperty'}
+
+
+def get_short_id(entry):
+    """Gets the short id of a JSON feed entry.
+
+    >>> get_short_id({'id': {'$t': 'http://www.google.com/m8/feeds/a/b'}})
+    'b'
+    """
+    return entry['id']['$t'].split('/')[-1]
+
+
+def strip_entry(entry):
+    """Removes the fields of a JSON feed entry that contacts don't use.
+
+    >>> strip_entry({'id': {'$t': 'a'}, 'link': [{'rel': 'self'}]})
+    {'id': {'$t': 'a'}}
+    """
+    return {k: v for k, v in entry.items() if k in ENTRY_KEYS}
+
+
+@contextmanager
+def atomic_write(path, mode='wb'):
+    """Opens a temporary file that replaces `path` once it's written.
+
+    If an error occurs while writing, `path` is left untouched.
+
+    >>> with atomic_write('etag.json') as f:  # doctest: +SKIP
+    ...     f.write(r.content)
+    """
+    dirname, basename = p.split(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=dirname or '.', prefix='.%s.' % basename, suffix='.tmp')
+
+    try:
+        with open(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def lock(path, shared=False):
+    """Holds an advisory lock of a cache file (via `<path>.lock`).
+
+    The lock is a no-op on platforms without `fcntl`.
+
+    :param path: The cache file path.
+    :param shared: (optional) Take a shared instead of an exclusive lock
+        (default: False).
+
+    >>> with lock('cache.json'):  # doctest: +SKIP
+    ...     contacts = load_or_fetch()
+    """
+    with open('%s.lock' % path, 'a') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write(path, entries):
+    """Writes JSON feed entries to a memory mappable cache file.
+
+    :param path: The cache file path.
+    :param entries: An iterable of JSON feed entries.
+
+    :returns: the number of entries written.
+
+    >>> write('cache.mmap', r.json()['feed']['entry'])  # doctest: +SKIP
+    """
+    records = []
+
+    for entry in entries:
+        key = get_short_id(entry).encode('utf-8')
+        records.append((key, dumps(strip_entry(entry)).encode('utf-8')))
+
+    count = len(records)
+    key_size = max([len(key) for key, _ in records] or [0])
+    offset = HEADER.size + count * (key_size + OFFSET.size)
+    offsets = []
+
+    for key, record in records:
+        offsets.append((key, offset))
+        offset += LENGTH.size + len(record)
+
+    with atomic_write(path) as f:
+        f.write(HEADER.pack(MAGIC, count, key_size))
+
+        for key, offset in sorted(offsets):
+            f.write(key.ljust(key_size, b'\0'))
+            f.write(OFFSET.pack(offset))
+
+        for _, record in records:
+            f.write(LENGTH.pack(len(record)))
+            f.write(record)
+
+    return count
+
+
+class ContactCache(object):
+    """A read only, memory mapped contact cache.
+
+    :param path: The cache file path, see :func:`write`.
+
+    :raises gcontact.exceptions.CacheError: if the file isn't a cache file.
+
+    >>> with ContactCache('cache.mmap') as cache:  # doctest: +SKIP
+    ...     cache.get('0cc9cd4dd26c5137b675a0d819cb9ab0')
+    """
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            try:
+                self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise CacheError('%s is empty' % path)
+
+        try:
+            magic, self.count, self.key_size = HEADER.unpack_from(self.mm)
+        except Exception:
+            magic = None
+
+        if magic != MAGIC:
+            self.mm.close()
+            raise CacheError('%s is not a contact cache' % path)
+
+        self.width = self.key_size + OFFSET.size
+        self.start = HEADER.size + self.count * self.width
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self.find(key) is not None
+
+    def __iter__(self):
+        """Decodes all entries in the order they were written."""
+        pos, end = self.start, len(self.mm)
+
+        while pos < end:
+            length = LENGTH.unpack_from(self.mm, pos)[0]
+            pos += LENGTH.size
+            yield loads(self.mm[pos:pos + length].decode('utf-8'))
+            pos += length
+
+    def _key(self, i):
+        pos = HEADER.size + i * self.width
+        return self.mm[pos:pos + self.key_size].rstrip(b'\0')
+
+    @property
+    def keys(self):
+        """The short ids in sorted order."""
+        return [self._key(i).decode('utf-8') for i in range(self.count)]
+
+    def find(self, key):
+        """Finds the offset of an entry's record by binary search.
+
+        :param key: The contact's short id.
+
+        :returns: the offset or None if the key isn't in the cache.
+        """
+        key = key.encode('utf-8')
+        lo, hi = 0, self.count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < self.count and self._key(lo) == key:
+            pos = HEADER.size + lo * self.width + self.key_size
+            return OFFSET.unpack_from(self.mm, pos)[0]
+
+    def get(self, key, default=None):
+        """Decodes a single entry.
+
+        :param key: The contact's short id.
+
+        :returns: the JSON feed entry or `default` if it isn't in the cache.
+        """
+        offset = self.find(key)
+
+        if offset is None:
+            return default
+
+        length = LENGTH.unpack_from(self.mm, offset)[0]
+        start = offset + LENGTH.size
+        return loads(self.mm[start:start + length].decode('utf-8'))
+
+    def close(self):
+        self.mm.close()
+
+
+def get_codec(path, codec=None):
+    codec = codec or next(
+        (c for c, ext in CODECS.items() if path.endswith(ext)), None)
+
+    if codec not in CODECS:
+        raise CacheError('Unknown cache codec %s' % codec)
+    elif codec == 'zstd' and not zstandard:
+        raise CacheError('The zstd codec requires `zstandard`')
+
+    return codec
+
+
+def write_compressed(path, entries, codec=None, level=None):
+    """Writes JSON feed entries to a compressed JSON lines file.
+
+    :param path: The cache file path.
+    :param entries: An iterable of JSON feed entries.
+    :param codec: (optional) One of 'gzip' or 'zstd' (default: based on the
+        extension of `path`).
+    :param level: (optional) The compression level (default: 6 for gzip
+        and 3 for zstd).
+
+    :returns: the number of entries written.
+
+    >>> write_compressed('cache.jsonl.gz', entries)  # doctest: +SKIP
+    """
+    codec = get_codec(path, codec)
+    level = DEF_LEVELS[codec] if level is None else level
+    count = 0
+
+    with atomic_write(path) as f:
+        if codec == 'gzip':
+            compressed = gzip.GzipFile(
+                fileobj=f, mode='wb', compresslevel=level, mtime=0)
+        else:
+            cctx = zstandard.ZstdCompressor(level=level)
+            compressed = cctx.stream_writer(f, closefd=False)
+
+        with io.TextIOWrapper(compressed, encoding='utf-8') as lines:
+            for entry in entries:
+                lines.write(dumps(strip_entry(entry)))
+                lines.write('\n')
+                count += 1
+
+    return count
+
+
+def read_compressed(path, codec=None):
+    """Reads JSON feed entries from a compressed JSON lines file.
+
+    The file is decompressed as the entries are read.
+
+    :param path: The cache file path.
+    :param codec: (optional) One of 'gzip' or 'zstd' (default: based on the
+        extension of `path`).
+
+    :raises gcontact.exceptions.CacheError: if the file is corrupt.
+
+    :returns: an iterator of JSON feed entries.
+    """
+    codec = get_codec(path, codec)
+    errors = (EOFError, OSError, ValueError)
+
+    if zstandard:
+        errors += (zstandard.ZstdError,)
+
+    with open(path, 'rb') as f:
+        if codec == 'gzip':
+            compressed = gzip.GzipFile(fileobj=f, mode='rb')
+        else:
+            compressed = zstandard.ZstdDecompressor().stream_reader(f)
+
+        try:
+            for line in io.TextIOWrapper(compressed, encoding='utf-8'):
+                yield loads(line)
+        except errors as e:
+            raise CacheError('%s is corrupt: %s' % (path, e))
+
+
+class LRUCache(object):
+    """A bounded, thread safe cache of recently used items that expire.
+
+    An expired item is kept (until it is evicted) along with its etag so
+    that it can be revalidated instead of fetched again.
+
+    :param maxsize: (optional) The maximum number of items. The least
+        recently used item is evicted first (default: 1024).
+    :param ttl: (optional) The number of seconds an item is fresh for
+        (default: 60).
+    :param timer: (optional) A function returning the current time in
+        seconds (default: `time.monotonic`).
+
+    >>> cache = LRUCache(maxsize=2)
+    >>> cache.put('a', 1)
+    >>> cache.put('b', 2)
+    >>> cache.get('a').value
+    1
+    >>> cache.put('c', 3)
+    >>> cache.get('b') is None
+    True
+    """
+    def __init__(self, maxsize=DEF_MAXSIZE, ttl=DEF_TTL, timer=monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key):
+        """Gets an item and marks it as recently used.
+
+        :returns: a :class:`CacheItem`, or None if the key isn't cached.
+        """
+        with self.lock:
+            item = self.items.get(key)
+
+            if item is not None:
+                self.items.move_to_end(key)
+
+        return item
+
+    def is_fresh(self, item):
+        return item.expires > self.timer()
+
+    def put(self, key, value, etag=None):
+        """Caches an item, evicting the least recently used if it's full."""
+        item = CacheItem(value, etag, self.timer() + self.ttl)
+
+        with self.lock:
+            self.items[key] = item
+            self.items.move_to_end(key)
+
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self.items.pop(key, default)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.cli
+~~~~~~~~~~~~
+
+This module contains the `gcontact` command line tool.
+
+    gcontact fetch --keyfile key.json --cache-dir .cache
+    gcontact sync --cache-dir .cache --cache-format mmap
+    gcontact import-csv connections.csv --journal import.journal
+    gcontact dedupe --blocking --merge --workers 8
+    gcontact export contacts.csv --metrics metrics.json
+
+"""
+import argparse
+import sys
+
+from contextlib import nullcontext
+from json import dumps
+
+from . import cache, progress
+from .book import (
+    Book, CONTACTS_API_URL, DEFAULTS, DEF_WORKERS, MAX_BATCH, SUCCESS_CODES)
+from .csvimport import SCHEMAS
+from .export import FORMATS
+from .httpsession import HTTPSession
+from .journal import Journal
+from .metrics import Metrics
+from .tracing import Tracer
+
+CACHE_FORMATS = ['raw', 'mmap'] + sorted(cache.CODECS)
+EXPORT_FORMATS = sorted(FORMATS.values())
+
+
+def echo(message):
+    print(message, file=sys.stderr)
+
+
+def make_book(args, metrics=None, **kwargs):
+    """Creates a book from the command's options.
+
+    :param args: The parsed command line arguments.
+    :param metrics: (optional) A :class:`~gcontact.metrics.Metrics` to
+        attach to the book's session.
+    :param kwargs: Keyword arguments passed to :class:`~gcontact.Book`.
+    """
+    session = HTTPSession(retries=args.retries)
+    kwargs.update({
+        'session': session, 'api_url': args.api_url,
+        'page_size': args.page_size, 'batch_size': args.batch_size,
+        'cache_dir': args.cache_dir, 'store': args.store,
+        'mmap_cache': args.cache_format == 'mmap',
+        'service_account': args.service_account, 'account': args.account})
+
+    if args.user:
+        kwargs['user'] = args.user
+
+    if args.cache_format in cache.CODECS:
+        kwargs['compress'] = args.cache_format
+
+    if metrics:
+        kwargs['tracer'] = Tracer()
+        metrics.attach(session)
+
+    if args.progress:
+        kwargs['progress'] = lambda p: echo(progress.format_progress(p))
+        kwargs['progress_interval'] = args.progress
+
+    return Book(args.keyfile, **kwargs)
+
+
+def write_metrics(path, metrics, tracer):
+    """Writes request metrics and phase timings as JSON."""
+    report = {'requests': metrics.summary(), 'spans': tracer.summary()}
+
+    with open(path, 'w') as f:
+        f.write(dumps(report, indent=2, default=str))
+
+
+def fetch(args, book):
+    book.sync()
+    echo('Fetched %i contacts' % len(book.contacts))
+
+
+def sync(args, book):
+    updated = book.sync()
+    status = 'updated' if updated else 'unchanged'
+    echo('%i contacts (%s)' % (len(book.contacts), status))
+
+
+def import_csv(args, book):
+    journaled = Journal(args.journal) if args.journal else nullcontext()
+
+    with journaled as journal:
+        if journal and journal.pending:
+            # resume the interrupted import rather than reconcile it again
+            echo('%i operations to resume' % len(journal.pending))
+
+            if not args.dry_run:
+                submitted = book.resume(journal, workers=args.workers)
+                report_submitted(submitted)
+        else:
+            incoming = Book.from_csv(args.path, schema=args.schema).contacts
+            changeset = book.reconcile(incoming)
+            counts = tuple(map(len, changeset))
+            echo('%i new, %i changed, %i unchanged' % counts)
+
+            if not args.dry_run:
+                kwargs = {'workers': args.workers, 'journal': journal}
+                report_submitted(book.commit(changeset, **kwargs))
+
+
+def dedupe(args, book):
+    kwargs = {'blocking': args.blocking, 'workers': args.workers}
+    plans = book.dedupe(**kwargs)
+    dupes = sum(len(plan.deletes) for plan in plans)
+    echo('%i clusters, %i duplicates' % (len(plans), dupes))
+
+    if args.merge and plans:
+        report_submitted(book.merge(plans, workers=args.workers))
+
+
+def export(args, book):
+    count = book.export(args.path, fmt=args.format)
+    echo('Exported %i contacts to %s' % (count, args.path))
+
+
+def report_submitted(submitted):
+    failed = [
+        result for _, _, result in submitted
+        if result.code not in SUCCESS_CODES]
+
+    echo('%i operations, %i failed' % (len(submitted), len(failed)))
+
+
+def parse_args(args=None):
+    description = 'Fetches, syncs, imports, dedupes and exports contacts.'
+    parser = argparse.ArgumentParser(prog='gcontact', description=description)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--keyfile', help='an OAuth client secrets file')
+    common.add_argument('--user', default=None, help='the gmail user name')
+    common.add_argument(
+        '--service-account', action='store_true',
+        help='the keyfile is a service account key')
+
+    common.add_argument('--account', help='the account to impersonate')
+    common.add_argument('--api-url', default=CONTACTS_API_URL)
+    common.add_argument('--cache-dir', help='the cache directory')
+    common.add_argument(
+        '--cache-format', choices=CACHE_FORMATS, default='raw')
+
+    common.add_argument('--store', help='a shared SQLite contact store')
+    common.add_argument('--workers', type=int, default=DEF_WORKERS)
+    common.add_argument(
+        '--page-size', type=int, default=DEFAULTS['max_results'])
+
+    common.add_argument('--batch-size', type=int, default=MAX_BATCH)
+    common.add_argument(
+        '--retries', type=int, default=0,
+        help='the number of times to resend a failed request')
+
+    common.add_argument(
+        '--metrics', help='a JSON file to write request metrics and timings')
+
+    common.add_argument(
+        '--progress', type=float, metavar='SECONDS',
+        help='print progress at most every SECONDS')
+
+    parser.set_defaults(book_kwargs={})
+    commands = parser.add_subparsers(dest='command', required=True)
+    cmd = commands.add_parser(
+        'fetch', parents=[common], help='fetch and cache all contacts')
+
+    cmd.set_defaults(func=fetch, book_kwargs={'use_cache': False})
+    cmd = commands.add_parser(
+        'sync', parents=[common],
+        help='fetch the contacts that changed since the last sync')
+
+    cmd.set_defaults(func=sync)
+    cmd = commands.add_parser(
+        'import-csv', parents=[common],
+        help='add and update contacts from a CSV export')
+
+    cmd.add_argument('path', help='the CSV file')
+    cmd.add_argument(
+        '--schema', choices=sorted(SCHEMAS),
+        help='the CSV format (default: detected from the columns)')
+
+    cmd.add_argument(
+        '--journal',
+        help='a journal file to record the operations in, and to resume an '
+        'interrupted import from')
+
+    cmd.add_argument('--dry-run', action='store_true')
+    cmd.set_defaults(func=import_csv)
+    cmd = commands.add_parser(
+        'dedupe', parents=[common], help='find and merge duplicates')
+
+    cmd.add_argument(
+        '--blocking', action='store_true',
+        help='only compare contacts sharing an email, phone, IM or name')
+
+    cmd.add_argument('--merge', action='store_true')
+    cmd.set_defaults(func=dedupe)
+    cmd = commands.add_parser(
+        'export', parents=[common],
+        help='write the contacts to a CSV, JSON lines or Parquet file')
+
+    cmd.add_argument('path', help='the output file')
+    cmd.add_argument(
+        '--format', choices=EXPORT_FORMATS,
+        help='the output format (default: based on the file extension)')
+
+    cmd.set_defaults(func=export)
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    metrics = Metrics() if args.metrics else None
+    book = make_book(args, metrics, **args.book_kwargs)
+    args.func(args, book)
+
+    if metrics:
+        write_metrics(args.metrics, metrics, book.tracer)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.contact
+~~~~~~~~~~~~~~~~
+
+This module contains the contact class.
+
+"""
+from datetime import datetime as dt
+from xml.etree.ElementTree import Element, SubElement
+
+from . import dedupe as dd
+from .atom import (
+    NAMESPACES, NAME_PROPS, ORG_PROPS, ADDRESS_PROPS, attributes, cont_ns,
+    goog_ns)
+from .lazy import lazy_import
+
+pr = lazy_import('meza.process')
+
+DEF_PROPS = {'label': 'home', 'primary': 'true'}
+DEF_IM_PROTO = 'GOOGLE_TALK'
+HOME_DOMAINS = {'gmail.com', 'yahoo.com', 'comcast.net'}
+
+# https://developers.google.com/gdata/docs/2.0/elements#schema_37
+IM_PROTOCOLS = {
+    'aim': 'AIM',
+    'gtalk': 'GOOGLE_TALK',
+    'googletalk': 'GOOGLE_TALK',
+    'google': 'GOOGLE_TALK',
+    'icq': 'ICQ',
+    'jabber': 'JABBER',
+    'msn': 'MSN',
+    'qq': 'QQ',
+    'skype': 'SKYPE',
+    'yahoo': 'YAHOO'}
+
+
+def listlike(item):
+    if hasattr(item, 'keys'):
+        listlike = False
+    else:
+        attrs = {'append', '__next__', 'next', '__reversed__'}
+        listlike = attrs.intersection(dir(item))
+
+    return listlike
+
+
+def parse(value):
+    if hasattr(value, 'keys'):
+        value = value.get('$t', value)
+
+    return value
+
+
+def encode(value):
+    encoded = hasattr(value, 'keys') and '$t' in value
+
+    if not encoded:
+        value = {'$t': value}
+
+    return value
+
+
+class Contact(object):
+    """ A class for a contact object."""
+    def __init__(self, account, session, **kwargs):
+        self.hashbits = kwargs.get('hashbits', 64)
+        self.account = account
+        self.session = session
+        self._id = kwargs['id']
+        self.title = kwargs['title']
+        self.note = kwargs.get('content', {})
+        self.etag = kwargs.get('gd$etag')
+        self.name = kwargs.get('gd$name', {})
+        self._organization = kwargs.get('gd$organization', [])
+        self._email = kwargs.get('gd$email', [])
+        self.im = kwargs.get('gd$im', [])
+        self.phone = kwargs.get('gd$phoneNumber', [])
+        self.address = kwargs.get('gd$postalAddress', []) + kwargs.get(
+            'gd$structuredPostalAddress', [])
+
+        def_hash_keys = [('_email', 'address'), ('phone', 'uri')]
+        hash_keys = kwargs.get('hash_keys')
+        self.hash_keys = def_hash_keys if hash_keys is None else hash_keys
+
+        groups = kwargs.get('gContact$groupMembershipInfo', [])
+        self.groups = [g['href'] for g in groups if g['deleted'] == 'false']
+        self.props = kwargs.get('gd$extendedProperty', [])
+
+        # set last since setting the other fields bumps it
+        self.updated = kwargs['updated']
+
+    def __getattribute__(self, name):
+        value = object.__getattribute__(self, name)
+
+        if name in {'_id', 'updated', 'title', 'note'}:
+            value = parse(value)
+
+        return value
+
+    def __setattr__(self, name, value):
+        if name in {'_id', 'updated', 'title', 'note'}:
+            value = encode(value)
+
+        object.__setattr__(self, name, value)
+
+        if name != 'updated':
+            self.updated = dt.utcnow().isoformat()
+
+    def get_primary(self, attr, key=None, default='n/a'):
+        items = getattr(self, attr, [{key: default, 'primary': 'true'}])
+
+        for item in items:
+            if key and item.get('primary') == 'true':
+                value = item.get(key, default)
+                break
+            elif item.get('primary') == 'true':
+                value = item
+                break
+        else:
+            if key and items:
+                value = items[0].get(key, default)
+            elif items:
+                value = items[0]
+            else:
+                value = default
+
+        return parse(value)
+
+    @property
+    def short_id(self):
+        return self._id.split('/')[-1]
+
+    @property
+    def hash_content(self):
+        content = [self.get_primary(*keys) for keys in self.hash_keys]
+        return ' '.join([self.title] + content).lower()
+
+    @property
+    def simhash(self):
+        from changanya.simhash import Simhash
+
+        simhash = Simhash(self.hash_content, hashbits=self.hashbits)
+        simhash.cid = self.short_id
+        return simhash
+
+    @property
+    def features(self):
+        return dd.get_features(self)
+
+    @property
+    def organizations(self):
+        for organization in self._organization:
+            org = parse(organization.get('gd$orgName'))
+            title = parse(organization.get('gd$orgTitle'))
+            yield ' at '.join(x for x in [title, org] if x)
+
+    @property
+    def organization(self):
+        org = self.get_primary('_organization', 'gd$orgName')
+        title = self.get_primary('_organization', 'gd$orgTitle')
+        return ' at '.join(x for x in [title, org] if x)
+
+    @organization.deleter
+    def organization(self):
+        del self._organization
+
+    @organization.setter
+    def organization(self, value, rel='work', **kwargs):
+        title, org = value.split(' at ') if ' at ' in value else (None, value)
+
+        new_org = {
+          'rel': goog_ns(rel),
+          'gd$orgName': encode(org),
+          'gd$orgTitle': encode(title)}
+
+        if kwargs.get('label'):
+            new_org['label'] = kwargs['label']
+
+        extra = {
+            'gd$%s' % prop: kwargs[prop]['$t'] for prop in ORG_PROPS
+            if kwargs.get(prop)}
+
+        new_org.update(extra)
+
+        if kwargs.get('primary', True):
+            new_org.update({'primary': 'true'})
+            prim_org = self.get_primary('_organization', default={})
+            prim_org.pop('primary', None)
+
+        _organization = [new_org]
+
+        for organization in self._organization:
+            _org = parse(organization.get('gd$orgName'))
+            _title = parse(organization.get('gd$orgTitle'))
+
+            if value != ' at '.join(x for x in [_title, _org] if x):
+                _organization.append(organization)
+
+        self._organization = _organization
+
+    @property
+    def emails(self):
+        return (email['address'] for email in self._email)
+
+    @property
+    def email(self):
+        return self.get_primary('_email', 'address')
+
+    @email.deleter
+    def email(self):
+        del self._email
+
+    @email.setter
+    def email(self, value, rel=None, **kwargs):
+        domain = value.split('@')[1].lower()
+
+        if domain.split('.')[0] in self.organization.replace(' ', '').lower():
+            rel = 'work'
+        elif domain in HOME_DOMAINS:
+            rel = 'home'
+        else:
+            rel = 'other'
+
+        new_email = {'rel': goog_ns(rel), 'address': value}
+
+        if kwargs.get('label'):
+            new_email['label'] = kwargs['label']
+        elif '.edu' in domain and rel == 'other':
+            new_email['label'] = 'School'
+
+        if kwargs.get('primary', True):
+            new_email.update({'primary': 'true'})
+            prim_email = self.get_primary('_email', default={})
+            prim_email.pop('primary', None)
+
+        _email = [new_email]
+
+        for email in self._email:
+            if value != email.get('address'):
+                _email.append(email)
+
+        self._email = _email
+
+    # def update(self, contact):
+    #     self.title = contact.title
+    #     self.note = '\n'.join([self.note, contact.note, contact.name])
+    #     self.organization.extend(contact.organization)
+    #     self.email.extend(contact.email)
+    #     self.im.extend(contact.im)
+    #     self.phone.extend(contact.phoneNumber)
+    #     self.address.extend(contact.address)
+    #     self.groups.extend(contact.groups)
+    #     self.props.extend(contact.props)
+    #     self.clean()
+
+    def clean(self):
+        # add entry deduping
+        ims = []
+        unique_ims = set()
+
+        for email in self.email:
+            internet_email = email.get('label', '').lower() == 'internet email'
+
+            if internet_email and not email.get('rel'):
+                email['rel'] = cont_ns('home')
+
+        for im in self.im:
+            new_protocol = protocol = im.get('protocol', '')
+
+            if not protocol.startswith('http://schemas'):
+                stripped = protocol.lower().replace(' ', '').rstrip('chat')
+                replaced = stripped.replace('-', '').replace('_', '')
+
+                if stripped in IM_PROTOCOLS:
+                    new_protocol = cont_ns(IM_PROTOCOLS[replaced])
+
+            key = (new_protocol, im['address'])
+
+            if key not in unique_ims:
+                unique_ims.add(key)
+                ims.append(pr.merge(im, {'protocol': new_protocol}))
+
+        self.im = ims
+
+    def _populate_entry(self, entry):
+        name = SubElement(entry, 'gd:name')
+
+        SubElement(name, 'gd:fullName').text = self.title
+
+        if self.name:
+            for prop in NAME_PROPS:
+                if self.name.get('gd$%s' % prop, {}).get('$t'):
+                    text = self.name['gd$%s' % prop]['$t']
+                    SubElement(name, 'gd:%s' % prop).text = text
+
+        emails = (email for email in self._email if email.get('address'))
+        [SubElement(entry, 'gd:email', attributes(email)) for email in emails]
+        [SubElement(entry, 'gd:im', attributes(im)) for im in self.im]
+        [SubElement(entry, 'gd:extendedProperty', prop) for prop in self.props]
+
+        for org in self._organization:
+            details = attributes(org)
+            organization = SubElement(entry, 'gd:organization', details)
+
+            for prop in ORG_PROPS:
+                if org.get('gd$%s' % prop, {}).get('$t'):
+                    text = org['gd$%s' % prop]['$t']
+                    SubElement(organization, 'gd:%s' % prop).text = text
+
+        for phone in self.phone:
+            details = attributes(phone)
+            SubElement(entry, 'gd:phoneNumber', details).text = phone['$t']
+
+        for address in self.address:
+            details = attributes(address)
+
+            if set(ADDRESS_PROPS).intersection(k[3:] for k in address):
+                addr = SubElement(entry, 'gd:structuredPostalAddress', details)
+
+                for struct in ADDRESS_PROPS:
+                    if address.get('gd$%s' % struct, {}).get('$t'):
+                        text = address['gd$%s' % struct]['$t']
+                        SubElement(addr, 'gd:%s' % struct).text = text
+            else:
+                text = address['$t']
+                SubElement(entry, 'gd:postalAddress', details).text = text
+
+        for href in self.groups:
+            SubElement(entry, 'gContact:groupMembershipInfo', {'href': href})
+
+        if self.note:
+            SubElement(entry, 'atom:content', {'type': 'text'}).text = self.note
+
+        return entry
+
+    @property
+    def newxml(self, *args, **kwargs):
+        # https://developers.google.com/google-apps/contacts/v3/#creating_contacts
+        entry = Element('atom:entry', dict(NAMESPACES))
+
+        SubElement(
+            entry,
+            'atom:category',
+            {'scheme': goog_ns('kind'), 'term': cont_ns('contact')})
+
+        return self._populate_entry(entry)
+
+    @property
+    def upxml(self, *args, **kwargs):
+        # https://developers.google.com/google-apps/contacts/v3/#updating_contacts
+        attrs = pr.merge([NAMESPACES, {'gd:etag': self.etag}])
+        entry = Element('entry', attrs)
+        SubElement(entry, 'id').text = self._id
+        SubElement(entry, 'updated').text = str(self.updated)
+        SubElement(
+            entry,
+            'category',
+            {'scheme': goog_ns('kind'), 'term': cont_ns('contact')})
+
+        return self._populate_entry(entry)
+
+    def batchxml(self, operation, batch_id=None):
+        # https://developers.google.com/google-apps/contacts/v3/#batch_operations
+        entry = Element('entry')
+        SubElement(entry, 'batch:id').text = batch_id or self.short_id
+        SubElement(entry, 'batch:operation', {'type': operation})
+
+        if operation != 'insert':
+            SubElement(entry, 'id').text = self._id
+
+        if self.etag and operation in {'update', 'delete'}:
+            entry.set('gd:etag', self.etag)
+
+        if operation in {'insert', 'update'}:
+            SubElement(
+                entry,
+                'category',
+                {'scheme': goog_ns('kind'), 'term': cont_ns('contact')})
+
+            self._populate_entry(entry)
+
+        return entry
+
+    @property
+    def entry(self):
+        """The contact as a JSON feed entry, i.e., the keyword arguments it
+        was created from.
+
+        >>> contact = Contact(None, None, **entry)
+        >>> Contact(None, None, **contact.entry) == contact
+        True
+        """
+        groups = [{'href': g, 'deleted': 'false'} for g in self.groups]
+        entry = {
+            'id': {'$t': self._id},
+            'updated': {'$t': self.updated},
+            'title': {'$t': self.title},
+            'gd$name': self.name,
+            'gd$organization': self._organization,
+            'gd$email': self._email,
+            'gd$im': self.im,
+            'gd$phoneNumber': self.phone,
+            'gd$postalAddress': self.address,
+            'gContact$groupMembershipInfo': groups,
+            'gd$extendedProperty': self.props}
+
+        if self.note:
+            entry['content'] = {'$t': self.note}
+
+        if self.etag:
+            entry['gd$etag'] = self.etag
+
+        return entry
+
+    def __repr__(self):
+        return '<%s id:%s>' % (self.title, self.short_id)
+
+    # def __setattr__(self, name, value):
+    #     pass
+
+    # def __delattr__(self, name):
+    #     pass
+
+    # def create(self):
+    #     headers = {'Content-Type': 'application/atom+xml'}
+    #     url = construct_url(user_email=self.account)
+    #     r = contact.session.post(url, tostring(self.newxml), headers=headers)
+    #     return r.json()
+
+    # def update(self):
+    #     headers = {
+    #         'Content-Type': 'application/atom+xml', 'If-Match': self.etag}
+    #     url = construct_url(user_email=self.account, contact_id=self._id)
+    #     r = self.session.put(url, tostring(self.upxml), headers=headers)
+    #     return r.json()
+
+    # def delete(self):
+    #     url = construct_url(user_email=self.account, contact_id=self._id)
+    #     r = self.session.delete(url)
+    #     return r.json()
+
+    def __delete__(self):
+        return self.delete()
+
+    def __eq__(self, other):
+        reasons = dd.compare(self.features, other.features)
+        return dd.is_dupe(reasons)
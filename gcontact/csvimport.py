@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.csvimport
+~~~~~~~~~~~~~~~~~~
+
+This module contains functions to read contacts from CSV exports.
+
+Each source format is described by a :class:`Schema` of the (sanitized)
+CSV columns that contact fields are read from, e.g., the `First Name`
+column becomes `first_name`. A schema is compiled once per set of columns
+(see :func:`compile_schema`) into a function that converts a record into
+a JSON feed entry, so supporting a new format only takes a new schema.
+
+    >>> schema = Schema(given='first', family='last', emails=('mail',))
+    >>> to_entry = compile_schema(schema, ('first', 'last', 'mail'))
+    >>> to_entry({'first': 'Reuben', 'last': 'Cummings', 'mail': ''})['title']
+    'Reuben Cummings'
+
+"""
+from collections import namedtuple
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
+from os import path as p
+
+from .contact import Contact
+from .lazy import lazy_import
+
+# imported when a CSV file is read
+pr = lazy_import('meza.process')
+io = lazy_import('meza.io')
+
+SCHEMA_FIELDS = [
+    'full_name', 'prefix', 'given', 'additional', 'family', 'suffix',
+    'company', 'job_title', 'emails', 'phones', 'addresses', 'note']
+
+# The `gd$name` fields of the schema's name columns
+NAME_FIELDS = [
+    ('prefix', 'gd$namePrefix'), ('given', 'gd$givenName'),
+    ('additional', 'gd$additionalName'), ('family', 'gd$familyName'),
+    ('suffix', 'gd$nameSuffix')]
+
+# Each field is a column, except `emails`, `phones` and `addresses` which
+# are tuples of columns. The first non empty email is the primary one, and
+# the full name defaults to the non empty name parts. Columns that are None
+# or missing from a file are read as empty.
+Schema = namedtuple(
+    'Schema', SCHEMA_FIELDS, defaults=(None,) * 8 + ((), (), (), None))
+
+# https://www.linkedin.com/psettings/member-data
+LINKEDIN = Schema(
+    prefix='title', given='first_name', additional='middle_name',
+    family='last_name', suffix='suffix', company='company',
+    job_title='job_title', emails=('e_mail',))
+
+OUTLOOK = Schema(
+    prefix='title', given='first_name', additional='middle_name',
+    family='last_name', suffix='suffix', company='company',
+    job_title='job_title',
+    emails=('e_mail_address', 'e_mail_2_address', 'e_mail_3_address'),
+    phones=(
+        'mobile_phone', 'business_phone', 'home_phone', 'other_phone',
+        'primary_phone'),
+    addresses=(
+        'business_address', 'home_address', 'other_address'),
+    note='notes')
+
+# The Google Contacts "Google CSV" export
+GOOGLE = Schema(
+    full_name='name', prefix='name_prefix', given='given_name',
+    additional='additional_name', family='family_name',
+    suffix='name_suffix', company='organization_1_name',
+    job_title='organization_1_title',
+    emails=('e_mail_1_value', 'e_mail_2_value', 'e_mail_3_value'),
+    phones=('phone_1_value', 'phone_2_value', 'phone_3_value'),
+    addresses=('address_1_formatted', 'address_2_formatted'),
+    note='notes')
+
+# Columns named after vCard properties, e.g., `FN`, `EMAIL` and `TEL`
+VCARD = Schema(
+    full_name='fn', prefix='prefix', given='given', additional='additional',
+    family='family', suffix='suffix', company='org', job_title='title',
+    emails=('email', 'email_2', 'email_3'), phones=('tel', 'tel_2', 'tel_3'),
+    addresses=('adr', 'adr_2'), note='note')
+
+SCHEMAS = {
+    'linkedin': LINKEDIN, 'outlook': OUTLOOK, 'google': GOOGLE,
+    'vcard': VCARD}
+
+
+def get_columns(schema):
+    """Gets all the columns of a schema.
+
+    >>> sorted(get_columns(Schema(given='first', emails=('mail',))))
+    ['first', 'mail']
+    """
+    singles = [getattr(schema, f) for f in SCHEMA_FIELDS[:8] + ['note']]
+    multiples = schema.emails + schema.phones + schema.addresses
+    return {column for column in singles + list(multiples) if column}
+
+
+def detect_schema(columns):
+    """Gets the name of the schema with the most of a file's columns.
+
+    >>> detect_schema(['given_name', 'family_name', 'e_mail_1_value'])
+    'google'
+    """
+    columns = set(columns)
+
+    def score(name):
+        return len(columns.intersection(get_columns(SCHEMAS[name])))
+
+    # LinkedIn wins ties since it used to be the only format
+    return max(SCHEMAS, key=lambda name: (score(name), name == 'linkedin'))
+
+
+def compile_schema(schema, columns):
+    """Compiles a schema into a function that converts a CSV record into a
+    JSON feed entry.
+
+    All the columns of a record are read with a single
+    :func:`operator.itemgetter` call, and the positions of the values of
+    each field are resolved here rather than per record. The function is
+    cached for each schema and set of columns.
+
+    :param schema: A :class:`Schema`. Its `emails`, `phones` and
+        `addresses` may be lists or tuples.
+    :param columns: An iterable of the records' columns.
+
+    :returns: a function of a record.
+    """
+    # lists aren't hashable
+    schema = Schema(*(
+        tuple(value) if isinstance(value, list) else value
+        for value in schema))
+
+    return _compile_schema(schema, tuple(columns))
+
+
+@lru_cache(maxsize=32)
+def _compile_schema(schema, columns):
+    present = set(columns)
+    used = []
+
+    def locate(column):
+        # missing columns read the empty value at the end of the values
+        if column not in present:
+            return -1
+        elif column not in used:
+            used.append(column)
+
+        return used.index(column)
+
+    name_items = [
+        (field, locate(getattr(schema, attr))) for attr, field in NAME_FIELDS]
+
+    name_pos = [pos for _, pos in name_items]
+    full_name_pos = locate(schema.full_name)
+    company_pos = locate(schema.company)
+    job_title_pos = locate(schema.job_title)
+    email_pos = [pos for pos in map(locate, schema.emails) if pos >= 0]
+    note_pos = locate(schema.note)
+
+    # the entry lists of the phones and addresses in the file
+    multiples = [
+        (key, [pos for pos in map(locate, multiple) if pos >= 0])
+        for key, multiple in [
+            ('gd$phoneNumber', schema.phones),
+            ('gd$postalAddress', schema.addresses)]]
+
+    multiples = [(key, positions) for key, positions in multiples if positions]
+
+    if len(used) > 1:
+        get_values = itemgetter(*used)
+    else:
+        def get_values(record):
+            return tuple(record[column] for column in used)
+
+    def to_entry(record):
+        values = get_values(record) + ('',)
+        full_name = values[full_name_pos] or ' '.join(
+            [values[pos] for pos in name_pos if values[pos]])
+
+        company = values[company_pos] or ''
+        job_title = values[job_title_pos] or ''
+        emails = [values[pos] for pos in email_pos if values[pos]]
+        _id = [full_name, company, job_title, emails[0] if emails else '']
+
+        # a contact without emails keeps an empty one so that its hash
+        # content (see `Contact.hash_content`) stays the same
+        entry = {
+            'id': ' '.join(_id),
+            'title': full_name,
+            'gd$name': {
+                field: {'$t': values[pos]} for field, pos in name_items},
+            'gd$email': [
+                {'address': email} for email in emails] or [{'address': ''}]}
+
+        for key, positions in multiples:
+            entry[key] = [
+                {'$t': values[pos]} for pos in positions if values[pos]]
+
+        if company or job_title:
+            entry['gd$organization'] = [{
+                'gd$orgName': {'$t': company},
+                'gd$orgTitle': {'$t': job_title}, 'primary': 'true'}]
+
+        if values[note_pos]:
+            entry['content'] = {'$t': values[note_pos]}
+
+        return entry
+
+    return to_entry
+
+
+def transform_record(record, schema=LINKEDIN):
+    """Converts a CSV record into a JSON feed entry.
+
+    :param record: A dict of sanitized CSV columns.
+    :param schema: (optional) A :class:`Schema` (default: LinkedIn
+        connections).
+    """
+    return compile_schema(schema, tuple(record))(record)
+
+
+def read_contacts(csv_path, schema=None, **kwargs):
+    """Reads the contacts of a CSV file.
+
+    :param csv_path: The CSV file path.
+    :param schema: (optional) A :class:`Schema`, or the name of one of
+        'linkedin', 'outlook', 'google' or 'vcard' (default: detected from
+        the file's columns).
+    :param kwargs: Keyword arguments passed to each
+        :class:`~gcontact.contact.Contact`.
+
+    :returns: a list of :class:`~gcontact.contact.Contact` objects.
+    """
+    records = io.read_csv(csv_path, encoding='ISO-8859-2', sanitize=True)
+    first = next(records, None)
+    columns = tuple(first or ())
+    schema = schema or detect_schema(columns)
+    schema = SCHEMAS[schema] if isinstance(schema, str) else schema
+    to_entry = compile_schema(schema, columns)
+    kwargs['updated'] = p.getmtime(csv_path)
+    records = chain([first], records) if first else []
+    hashed = pr.hash(map(to_entry, records), ['id'])
+    return [Contact(None, None, **{**kwargs, **h}) for h in hashed]
@@ -0,0 +1,617 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.dedupe
+~~~~~~~~~~~~~~
+
+This module contains a NumPy backed engine for finding duplicate contacts.
+
+"""
+
+import re
+import itertools as it
+
+from collections import defaultdict, namedtuple
+from os import cpu_count
+
+from .lazy import lazy_import
+
+# imported when duplicates are first searched for
+np = lazy_import('numpy')
+shared_memory = lazy_import('multiprocessing.shared_memory')
+
+DEF_HASHBITS = 64
+MAX_HASHBITS = 64
+BLOCK_KINDS = ('email', 'phone', 'im', 'name')
+MIN_PHONE_DIGITS = 7
+PHONE_DIGITS = 10
+NON_DIGIT_RE = re.compile(r'\D')
+NON_WORD_RE = re.compile(r'[^\w\s]', re.UNICODE)
+
+Features = namedtuple('Features', ['emails', 'phones', 'ims', 'names'])
+MergePlan = namedtuple('MergePlan', ['survivor', 'fields', 'deletes'])
+Change = namedtuple('Change', ['contact', 'fields', 'incoming'])
+
+# http://graphics.stanford.edu/~seander/bithacks.html#CountBitsSetParallel
+M1 = 0x5555555555555555
+M2 = 0x3333333333333333
+M4 = 0x0f0f0f0f0f0f0f0f
+H01 = 0x0101010101010101
+
+
+def fingerprints(simhashes):
+    """Packs the hash values of simhashes into a `uint64` array.
+
+    >>> from changanya.simhash import Simhash
+    >>> fingerprints([Simhash('foo bar')]).dtype
+    dtype('uint64')
+    """
+    return np.fromiter((s.hash for s in simhashes), dtype=np.uint64)
+
+
+def popcount(values):
+    """Counts the set bits of each item in a `uint64` array.
+
+    >>> popcount(np.array([0, 1, 3, 2 ** 64 - 1], dtype=np.uint64)).tolist()
+    [0, 1, 2, 64]
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+
+    m1, m2, m4, h01 = (np.uint64(mask) for mask in (M1, M2, M4, H01))
+    values = values - ((values >> np.uint64(1)) & m1)
+    values = (values & m2) + ((values >> np.uint64(2)) & m2)
+    values = (values + (values >> np.uint64(4))) & m4
+    return (values * h01) >> np.uint64(56)
+
+
+def get_blocks(hashbits=DEF_HASHBITS, bits=3):
+    """Splits a fingerprint into `bits + 1` contiguous (shift, mask) blocks.
+
+    By the pigeonhole principle, two fingerprints within `bits` of each other
+    are identical in at least one of the blocks.
+
+    >>> get_blocks(8, 1)
+    [(0, 15), (4, 15)]
+    """
+    if hashbits > MAX_HASHBITS:
+        raise ValueError('hashbits must not exceed %i' % MAX_HASHBITS)
+
+    num_blocks = bits + 1
+
+    if num_blocks > hashbits:
+        raise ValueError('bits must be less than %i' % hashbits)
+
+    offsets = [hashbits * i // num_blocks for i in range(num_blocks + 1)]
+    widths = [end - start for start, end in zip(offsets, offsets[1:])]
+    return [(start, 2 ** width - 1) for start, width in zip(offsets, widths)]
+
+
+def iter_block_candidates(values, shift, mask, key_range=None):
+    """Yields index pairs of fingerprints sharing the same block.
+
+    Fingerprints are sorted by block key so that equal keys are adjacent.
+    Each round compares every item to the one `distance` positions ahead,
+    so the work done is proportional to the number of candidate pairs.
+
+    :param key_range: (optional) A (low, high) tuple restricting the search
+        to block keys in the half-open range [low, high).
+    """
+    keys = (values >> np.uint64(shift)) & np.uint64(mask)
+    positions = np.arange(len(values))
+
+    if key_range:
+        low, high = key_range
+        positions = np.flatnonzero((keys >= low) & (keys < high))
+        keys = keys[positions]
+
+    sorter = np.argsort(keys, kind='stable')
+    order, sorted_keys = positions[sorter], keys[sorter]
+    active = np.arange(len(order))
+    distance = 1
+
+    while active.size:
+        active = active[active + distance < len(order)]
+        active = active[sorted_keys[active] == sorted_keys[active + distance]]
+
+        if active.size:
+            yield order[active], order[active + distance]
+
+        distance += 1
+
+
+def find_block_pairs(values, shift, mask, bits=3, key_range=None):
+    """Finds the pairs of fingerprints sharing a block within `bits`.
+
+    :returns: an (n, 2) array of index pairs `(i, j)` with `i < j`. The
+        pairs may contain duplicates.
+    """
+    found = [np.empty((0, 2), dtype=np.int64)]
+
+    for left, right in iter_block_candidates(values, shift, mask, key_range):
+        close = popcount(values[left] ^ values[right]) <= bits
+        pairs = np.stack([left[close], right[close]], axis=1)
+        found.append(np.sort(pairs, axis=1))
+
+    return np.concatenate(found).astype(np.int64)
+
+
+def find_pairs(values, bits=3, hashbits=DEF_HASHBITS):
+    """Finds all pairs of fingerprints within `bits` of each other.
+
+    :param values: A `uint64` array of fingerprints.
+    :param bits: The maximum hamming distance of a duplicate.
+    :param hashbits: The number of significant bits in each fingerprint.
+
+    :returns: an (n, 2) array of index pairs `(i, j)` with `i < j`.
+
+    >>> values = np.array([0b1111, 0b0111, 0b1000], dtype=np.uint64)
+    >>> find_pairs(values, bits=1, hashbits=4).tolist()
+    [[0, 1]]
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    blocks = get_blocks(hashbits, bits)
+    found = [find_block_pairs(values, *block, bits=bits) for block in blocks]
+    return np.unique(np.concatenate(found), axis=0)
+
+
+def _find_shared_pairs(name, size, shift, mask, bits, key_range):
+    # Runs in a worker process. The fingerprints are read from shared memory
+    # so only the (small) pair arrays are pickled.
+    shm = shared_memory.SharedMemory(name=name)
+    values = None
+
+    try:
+        values = np.ndarray((size,), dtype=np.uint64, buffer=shm.buf)
+        return find_block_pairs(values, shift, mask, bits, key_range)
+    finally:
+        del values
+        shm.close()
+
+
+def get_tasks(hashbits=DEF_HASHBITS, bits=3, splits=1):
+    """Partitions the blocks into (shift, mask, key_range) tasks.
+
+    Each block's key space is split into `splits` contiguous ranges. Since
+    candidates must share a block key, the ranges can be searched
+    independently.
+
+    >>> get_tasks(8, 1, 2)[:2]
+    [(0, 15, (0, 8)), (0, 15, (8, 16))]
+    """
+    tasks = []
+
+    for shift, mask in get_blocks(hashbits, bits):
+        num_keys = mask + 1
+        bounds = [num_keys * i // splits for i in range(splits + 1)]
+
+        for low, high in zip(bounds, bounds[1:]):
+            if high > low:
+                tasks.append((shift, mask, (low, high)))
+
+    return tasks
+
+
+def find_pairs_parallel(values, bits=3, hashbits=DEF_HASHBITS, workers=None):
+    """Finds all pairs of fingerprints within `bits` using a process pool.
+
+    The fingerprints are copied once into shared memory and each worker
+    searches a share of the block key ranges.
+
+    :param values: A `uint64` array of fingerprints.
+    :param bits: The maximum hamming distance of a duplicate.
+    :param hashbits: The number of significant bits in each fingerprint.
+    :param workers: (optional) The number of worker processes (default:
+        the number of CPUs).
+
+    :returns: an (n, 2) array of index pairs `(i, j)` with `i < j`.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    values = np.asarray(values, dtype=np.uint64)
+    workers = workers or cpu_count()
+    splits = -(-workers // (bits + 1))
+    shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    shared = np.ndarray(values.shape, dtype=np.uint64, buffer=shm.buf)
+    shared[:] = values
+    tasks = get_tasks(hashbits, bits, splits)
+
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(
+                    _find_shared_pairs, shm.name, len(values), shift, mask,
+                    bits, key_range)
+                for shift, mask, key_range in tasks]
+
+            found = [future.result() for future in futures]
+    finally:
+        del shared
+        shm.close()
+        shm.unlink()
+
+    return np.unique(np.concatenate(found), axis=0)
+
+
+class UnionFind(object):
+    """A disjoint set forest with path compression and union by size.
+
+    >>> forest = UnionFind(4)
+    >>> forest.union(0, 1)
+    >>> forest.find(1) == forest.find(0)
+    True
+    """
+    def __init__(self, size):
+        self.parents = list(range(size))
+        self.sizes = [1] * size
+
+    def find(self, item):
+        root = item
+
+        while self.parents[root] != root:
+            root = self.parents[root]
+
+        while self.parents[item] != root:
+            self.parents[item], item = root, self.parents[item]
+
+        return root
+
+    def union(self, item, other):
+        root, other_root = self.find(item), self.find(other)
+
+        if root != other_root:
+            if self.sizes[root] < self.sizes[other_root]:
+                root, other_root = other_root, root
+
+            self.parents[other_root] = root
+            self.sizes[root] += self.sizes[other_root]
+
+
+def find_clusters(pairs, size):
+    """Merges duplicate pairs into connected clusters.
+
+    :param pairs: An iterable of (i, j, ...) index pairs.
+    :param size: The number of items.
+
+    :returns: a list of clusters (sorted lists of indices), each with at
+        least two items.
+
+    >>> find_clusters([(0, 1), (3, 4), (1, 2)], 5)
+    [[0, 1, 2], [3, 4]]
+    """
+    forest = UnionFind(size)
+    [forest.union(pair[0], pair[1]) for pair in pairs]
+    clusters = defaultdict(list)
+
+    for item in range(size):
+        clusters[forest.find(item)].append(item)
+
+    return sorted(c for c in clusters.values() if len(c) > 1)
+
+
+def find_matches(values, value, bits=3):
+    """Finds the fingerprints within `bits` of a given fingerprint.
+
+    :param values: A `uint64` array of fingerprints.
+    :param value: The fingerprint to look up.
+    :param bits: The maximum hamming distance of a duplicate.
+
+    :returns: an array of indices into `values`.
+
+    >>> values = np.array([0b1111, 0b0111, 0b1000], dtype=np.uint64)
+    >>> find_matches(values, 0b1110, bits=1).tolist()
+    [0]
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    distances = popcount(values ^ np.uint64(value))
+    return np.flatnonzero(distances <= bits)
+
+
+def normalize_email(email):
+    """Normalizes an email address for exact matching.
+
+    >>> normalize_email(' Reuben@Gmail.com ')
+    'reuben@gmail.com'
+    """
+    return (email or '').strip().lower()
+
+
+def normalize_phone(phone):
+    """Normalizes a phone number to its trailing (national) digits.
+
+    >>> normalize_phone('+1 (555) 123-4567')
+    '5551234567'
+    >>> normalize_phone('123')
+    ''
+    """
+    digits = NON_DIGIT_RE.sub('', phone or '')
+    return digits[-PHONE_DIGITS:] if len(digits) >= MIN_PHONE_DIGITS else ''
+
+
+def normalize_im(address):
+    """Normalizes an IM address for exact matching.
+
+    >>> normalize_im('Reubano ')
+    'reubano'
+    """
+    return (address or '').strip().lower()
+
+
+def name_tokens(name):
+    """Splits a name into a sorted tuple of lowercase tokens.
+
+    >>> name_tokens('Cummings, Reuben')
+    ('cummings', 'reuben')
+    """
+    return tuple(sorted(NON_WORD_RE.sub(' ', (name or '').lower()).split()))
+
+
+def get_features(contact):
+    """Computes the normalized feature record of a contact.
+
+    :param contact: A :class:`~gcontact.Contact`.
+
+    :returns: a :class:`Features` record.
+    """
+    phones = (phone.get('$t') for phone in contact.phone)
+    ims = (im.get('address') for im in contact.im)
+
+    return Features(
+        frozenset(filter(None, map(normalize_email, contact.emails))),
+        frozenset(filter(None, map(normalize_phone, phones))),
+        frozenset(filter(None, map(normalize_im, ims))),
+        name_tokens(contact.title))
+
+
+def get_block_keys(record):
+    """Yields the (kind, key) blocking keys of a feature record."""
+    for kind in ('email', 'phone', 'im'):
+        for key in getattr(record, '%ss' % kind):
+            yield (kind, key)
+
+    if record.names:
+        yield ('name', ' '.join(record.names))
+
+
+def compare(record, other):
+    """Lists the kinds of features two records have in common.
+
+    These are the same fields `Contact.__eq__` compares.
+
+    >>> record = Features(frozenset(['a@b.c']), frozenset(), frozenset(), ())
+    >>> compare(record, record)
+    ('email',)
+    """
+    reasons = tuple(
+        kind for kind in ('email', 'phone', 'im')
+        if getattr(record, '%ss' % kind) & getattr(other, '%ss' % kind))
+
+    if record.names and record.names == other.names:
+        reasons += ('name',)
+
+    return reasons
+
+
+def is_dupe(reasons):
+    """Determines whether match reasons make a duplicate.
+
+    A shared name alone is not enough.
+
+    >>> is_dupe(('name',))
+    False
+    >>> is_dupe(('name', 'simhash'))
+    True
+    """
+    return bool(set(reasons).difference(['name']))
+
+
+def compare_pairs(records, values, pairs, bits=3):
+    """Scores candidate pairs using precomputed feature records.
+
+    :param records: A list of :class:`Features` records.
+    :param values: A `uint64` array of fingerprints.
+    :param pairs: An (n, 2) array of candidate index pairs.
+    :param bits: The maximum hamming distance of a simhash match.
+
+    :returns: a list of (i, j, reasons) for the pairs that are duplicates.
+    """
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    values = np.asarray(values, dtype=np.uint64)
+    xor = values[pairs[:, 0]] ^ values[pairs[:, 1]]
+    close = popcount(xor) <= bits
+    found = []
+
+    for (i, j), near in zip(pairs.tolist(), close.tolist()):
+        reasons = compare(records[i], records[j])
+        reasons += ('simhash',) if near else ()
+
+        if is_dupe(reasons):
+            found.append((i, j, reasons))
+
+    return found
+
+
+def compare_to(record, value, records, values, positions, bits=3):
+    """Scores a single feature record against a list of records.
+
+    :param record: The :class:`Features` record to look up.
+    :param value: The fingerprint of the record to look up.
+    :param records: A list of :class:`Features` records.
+    :param values: A `uint64` array of fingerprints.
+    :param positions: The candidate positions in `records`.
+    :param bits: The maximum hamming distance of a simhash match.
+
+    :returns: a list of (position, reasons) for the duplicates.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    values = np.asarray(values, dtype=np.uint64)
+    close = popcount(values[positions] ^ np.uint64(value)) <= bits
+    found = []
+
+    for pos, near in zip(positions.tolist(), close.tolist()):
+        reasons = compare(record, records[pos])
+        reasons += ('simhash',) if near else ()
+
+        if is_dupe(reasons):
+            found.append((pos, reasons))
+
+    return found
+
+
+class BlockingIndex(object):
+    """An exact match index of feature records keyed by their blocking keys.
+
+    :param records: An iterable of :class:`Features` records to index.
+    :param max_block: (optional) Blocks with more records than this are
+        ignored when generating candidates, e.g., a very common name.
+
+    >>> index = BlockingIndex(book.features)
+    >>> index.candidate_pairs()
+    """
+    def __init__(self, records, max_block=None, **kwargs):
+        self.kinds = set(kwargs.get('kinds', BLOCK_KINDS))
+        self.max_block = max_block
+        self.blocks = defaultdict(list)
+        self.size = 0
+        [self.add(record) for record in records]
+
+    def add(self, record):
+        """Adds a record to the index and returns its position."""
+        pos = self.size
+
+        for key in get_block_keys(record):
+            if key[0] in self.kinds:
+                self.blocks[key].append(pos)
+
+        self.size += 1
+        return pos
+
+    def query(self, record):
+        """Finds the indexed records sharing a block with `record`.
+
+        :returns: a dict mapping positions to the set of matching kinds.
+        """
+        matches = defaultdict(set)
+
+        for key in get_block_keys(record):
+            block = self.blocks.get(key, [])
+
+            if self.max_block and len(block) > self.max_block:
+                continue
+
+            for pos in block:
+                matches[pos].add(key[0])
+
+        return matches
+
+    def candidates(self):
+        """Yields the (i, j, kind) candidate pairs within each block."""
+        for key, block in self.blocks.items():
+            if self.max_block and len(block) > self.max_block:
+                continue
+
+            for i, j in it.combinations(block, 2):
+                yield (i, j, key[0])
+
+    def candidate_pairs(self):
+        """Lists the unique candidate pairs within all blocks.
+
+        :returns: an (n, 2) array of index pairs `(i, j)` with `i < j`.
+        """
+        pairs = [(i, j) for i, j, _ in self.candidates()]
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        return np.unique(pairs, axis=0)
+
+
+def _get_text(item, key):
+    return (item.get(key) or {}).get('$t') or ''
+
+
+# The contact fields a merge unions, and how to tell their items apart
+MERGE_KEYS = {
+    '_email': lambda item: normalize_email(item.get('address')),
+    'phone': lambda item: normalize_phone(item.get('$t')),
+    'im': lambda item: normalize_im(item.get('address')),
+    '_organization': lambda item: (
+        _get_text(item, 'gd$orgName').lower(),
+        _get_text(item, 'gd$orgTitle').lower()),
+    'address': lambda item: (
+        item.get('$t') or _get_text(item, 'gd$formattedAddress')).lower(),
+    'groups': lambda item: item,
+    'props': lambda item: item.get('name')}
+
+
+def get_richness(contact):
+    """Counts the number of field items a contact has."""
+    return sum(len(getattr(contact, field)) for field in MERGE_KEYS)
+
+
+def union_fields(contact, others):
+    """Unions the fields of a contact with the (non primary) items of others.
+
+    :param contact: The :class:`~gcontact.Contact` to merge into.
+    :param others: An iterable of :class:`~gcontact.Contact` objects.
+
+    :returns: a dict mapping the fields that change to their new items.
+    """
+    fields = {}
+    others = list(others)
+
+    for field, keyfunc in MERGE_KEYS.items():
+        items = list(getattr(contact, field))
+        seen = set(map(keyfunc, items))
+
+        for other in others:
+            for item in getattr(other, field):
+                key = keyfunc(item)
+
+                if key and key not in seen:
+                    seen.add(key)
+
+                    if hasattr(item, 'keys'):
+                        item = dict(item)
+                        item.pop('primary', None)
+
+                    items.append(item)
+
+        if len(items) > len(getattr(contact, field)):
+            fields[field] = items
+
+    return fields
+
+
+def plan_merge(cluster):
+    """Plans how to merge a cluster of duplicate contacts into one.
+
+    The contact with the most field items survives. Its fields are unioned
+    with the (non primary) items of the other contacts, which are deleted.
+
+    :param cluster: A list of duplicate :class:`~gcontact.Contact` objects.
+
+    :returns: a :class:`MergePlan`. Its `fields` only contains the fields
+        that change.
+    """
+    survivor = max(cluster, key=get_richness)
+    deletes = [contact for contact in cluster if contact is not survivor]
+    return MergePlan(survivor, union_fields(survivor, deletes), deletes)
+
+
+class ChangeSet(namedtuple('ChangeSet', ['new', 'changed', 'unchanged'])):
+    """The result of reconciling incoming contacts against a book.
+
+    :param new: A list of incoming contacts without a match.
+    :param changed: A list of :class:`Change` records, one per matched
+        contact that the incoming contacts add fields to.
+    :param unchanged: A list of (contact, incoming) tuples for the incoming
+        contacts that add nothing to their match.
+    """
+    @property
+    def operations(self):
+        """Lists the batch (operation, contact) tuples of the change set.
+
+        The changed contacts are only updated when they are submitted, see
+        :meth:`~gcontact.Book.commit`.
+        """
+        inserts = [('insert', contact) for contact in self.new]
+        updates = [('update', change.contact) for change in self.changed]
+        return inserts + updates
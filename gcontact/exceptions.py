@@ -25,9 +25,24 @@ class ImportException(gcontactException):
     """An error during import."""
 
 
+class NoValidUrlKeyFound(gcontactException):
+    """No valid key found in URL."""
+
+
 class UnsupportedFormatError(gcontactException):
     pass
 
 
 class RequestError(gcontactException):
-    """Error while sending API request."""
+    """Error while sending API request.
+
+    :param status: (optional) The HTTP status code of the response, if
+        there was one.
+    """
+    def __init__(self, *args, status=None):
+        super().__init__(*args)
+        self.status = status
+
+
+class CacheError(gcontactException):
+    """Trying to read an invalid or corrupt cache file."""
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.export
+~~~~~~~~~~~~~~~
+
+This module contains functions to export contacts to CSV, JSON lines and
+Parquet files.
+
+Each JSON feed entry is flattened into a row with the LinkedIn connections
+columns that :func:`~gcontact.csvimport.transform_record` reads, so an
+exported CSV file can be imported again, plus the contact's id, name,
+phones, addresses and other emails and organizations.
+
+Rows are written in chunks as the entries are read, so exporting a stream
+of entries (see :meth:`~gcontact.Book.iter_entries`) takes constant
+memory. Parquet files (one row group per chunk) require `pyarrow`.
+
+"""
+import csv
+import io
+
+from json import dumps
+from os import path as p
+
+from .cache import atomic_write
+from .contact import parse
+from .exceptions import UnsupportedFormatError
+from .utils import chunk
+
+FIELDS = [
+    'ID', 'Name', 'Title', 'First Name', 'Middle Name', 'Last Name',
+    'Suffix', 'E-mail', 'Company', 'Job Title', 'Phone', 'Address',
+    'Other E-mails', 'Other Phones', 'Other Addresses',
+    'Other Organizations', 'Updated']
+
+# The `gd$name` fields of the name columns
+NAME_FIELDS = {
+    'Title': 'gd$namePrefix', 'First Name': 'gd$givenName',
+    'Middle Name': 'gd$additionalName', 'Last Name': 'gd$familyName',
+    'Suffix': 'gd$nameSuffix'}
+
+# The `gd$structuredPostalAddress` fields of an address, in the order
+# they're written
+ADDRESS_PARTS = [
+    'street', 'pobox', 'neighborhood', 'city', 'region', 'postcode',
+    'country']
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.parquet': 'parquet'}
+SEPARATOR = '; '
+DEF_CHUNK_SIZE = 1024
+
+
+def split_primary(items):
+    """Splits a list of entry items into the primary item and the others.
+
+    >>> split_primary([{'address': 'a'}, {'address': 'b', 'primary': 'true'}])
+    ({'address': 'b', 'primary': 'true'}, [{'address': 'a'}])
+    """
+    pos = next(
+        (i for i, item in enumerate(items) if item.get('primary') == 'true'),
+        0)
+
+    if items:
+        primary, others = items[pos], items[:pos] + items[pos + 1:]
+    else:
+        primary, others = {}, []
+
+    return primary, others
+
+
+def get_address(item):
+    """Formats a postal address, or a structured one from its parts if it
+    isn't formatted.
+
+    >>> get_address({'gd$street': {'$t': '1 Main St'}, 'gd$city': {
+    ...     '$t': 'Springfield'}})
+    '1 Main St, Springfield'
+    """
+    formatted = item.get('gd$formattedAddress') or item.get('$t')
+
+    if not formatted:
+        parts = (parse(item.get('gd$%s' % part, '')) for part in ADDRESS_PARTS)
+        formatted = ', '.join(part for part in parts if part)
+
+    return parse(formatted)
+
+
+def get_organization(item):
+    """Formats an organization the same way as
+    :attr:`~gcontact.Contact.organization`.
+
+    >>> get_organization({'gd$orgName': {'$t': 'Nerevu'}, 'gd$orgTitle': {
+    ...     '$t': 'CEO'}})
+    'CEO at Nerevu'
+    """
+    org = parse(item.get('gd$orgName', ''))
+    title = parse(item.get('gd$orgTitle', ''))
+    return ' at '.join(x for x in [title, org] if x)
+
+
+def flatten_entry(entry):
+    """Flattens a JSON feed entry into an export row.
+
+    >>> entry = {
+    ...     'id': {'$t': 'http://www.google.com/m8/feeds/a/b'},
+    ...     'title': {'$t': 'Reuben Cummings'},
+    ...     'gd$name': {'gd$familyName': {'$t': 'Cummings'}}}
+    >>> row = flatten_entry(entry)
+    >>> row['ID'], row['Name'], row['Last Name']
+    ('b', 'Reuben Cummings', 'Cummings')
+    """
+    name = entry.get('gd$name', {})
+    org, orgs = split_primary(entry.get('gd$organization', []))
+    email, emails = split_primary(entry.get('gd$email', []))
+    phone, phones = split_primary(entry.get('gd$phoneNumber', []))
+    addresses = entry.get('gd$postalAddress', []) + entry.get(
+        'gd$structuredPostalAddress', [])
+
+    address, addresses = split_primary(addresses)
+
+    row = {
+        'ID': parse(entry['id']).split('/')[-1],
+        'Name': parse(entry.get('title', '')),
+        'E-mail': email.get('address', ''),
+        'Company': parse(org.get('gd$orgName', '')),
+        'Job Title': parse(org.get('gd$orgTitle', '')),
+        'Phone': phone.get('$t', ''),
+        'Address': get_address(address),
+        'Other E-mails': SEPARATOR.join(e['address'] for e in emails),
+        'Other Phones': SEPARATOR.join(n['$t'] for n in phones),
+        'Other Addresses': SEPARATOR.join(map(get_address, addresses)),
+        'Other Organizations': SEPARATOR.join(map(get_organization, orgs)),
+        'Updated': parse(entry.get('updated', ''))}
+
+    for column, field in NAME_FIELDS.items():
+        row[column] = parse(name.get(field, ''))
+
+    return row
+
+
+def get_format(path, fmt=None):
+    fmt = fmt or FORMATS.get(p.splitext(path)[1])
+
+    if fmt not in FORMATS.values():
+        raise UnsupportedFormatError(fmt or path)
+
+    return fmt
+
+
+def write_csv(f, groups):
+    writer = csv.DictWriter(f, FIELDS)
+    writer.writeheader()
+    count = 0
+
+    for group in groups:
+        writer.writerows(group)
+        count += len(group)
+
+    return count
+
+
+def write_jsonl(f, groups):
+    count = 0
+
+    for group in groups:
+        f.write(''.join('%s\n' % dumps(row) for row in group))
+        count += len(group)
+
+    return count
+
+
+def write_parquet(f, groups):
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise UnsupportedFormatError('The parquet format requires `pyarrow`')
+
+    schema = pyarrow.schema([(field, pyarrow.string()) for field in FIELDS])
+    count = 0
+
+    with pyarrow.parquet.ParquetWriter(f, schema) as writer:
+        for group in groups:
+            writer.write_table(pyarrow.Table.from_pylist(group, schema=schema))
+            count += len(group)
+
+    return count
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl}
+
+
+def write(path, entries, fmt=None, chunk_size=DEF_CHUNK_SIZE):
+    """Exports JSON feed entries to a file.
+
+    The file is replaced once all the entries are written.
+
+    :param path: The file path.
+    :param entries: An iterable of JSON feed entries.
+    :param fmt: (optional) One of 'csv', 'jsonl' or 'parquet' (default:
+        based on the extension of `path`).
+    :param chunk_size: (optional) The number of rows to write at a time
+        (default: 1024).
+
+    :raises gcontact.exceptions.UnsupportedFormatError: if the format is
+        unknown or its dependency isn't installed.
+
+    :returns: the number of rows written.
+
+    >>> write('contacts.csv', book.iter_entries())  # doctest: +SKIP
+    """
+    fmt = get_format(path, fmt)
+    groups = chunk(map(flatten_entry, entries), chunk_size)
+
+    with atomic_write(path) as f:
+        if fmt == 'parquet':
+            count = write_parquet(f, groups)
+        else:
+            newline = '' if fmt == 'csv' else None
+            text = io.TextIOWrapper(f, encoding='utf-8', newline=newline)
+            count = WRITERS[fmt](text, groups)
+            text.flush()
+            text.detach()
+
+    return count
@@ -8,29 +8,143 @@ This module contains a class for working with http sessions.
 
 """
 
-from urllib.parse import urlencode
+from collections import namedtuple
+from time import perf_counter, sleep
+from urllib.parse import urlencode, urlparse
+
+from .exceptions import RequestError
+from .lazy import lazy_import
+
+# imported when the first request is sent
+requests = lazy_import('requests')
 
-import requests
-from exceptions import RequestError
-from meza import process as pr
 DEF_HEADERS = {'Content-Type': 'application/json'}
+RETRY_CODES = {408, 429, 500, 502, 503, 504}
+EVENTS = ('before_request', 'after_response', 'on_retry', 'on_error')
+
+RequestEvent = namedtuple('RequestEvent', [
+    'method', 'url', 'kind', 'attempt', 'status', 'seconds', 'bytes_out',
+    'bytes_in', 'error'])
+
+
+def get_kind(url):
+    """Gets the kind of Contacts API endpoint a url points to.
+
+    >>> get_kind('https://www.google.com/m8/feeds/contacts/me/full/batch')
+    'batch'
+    >>> get_kind('https://www.google.com/m8/feeds/contacts/me/full?alt=json')
+    'feed'
+    >>> get_kind('https://www.google.com/m8/feeds/contacts/me/full/4a1e')
+    'single'
+    """
+    path = urlparse(url).path.rstrip('/')
+
+    if path.endswith('/batch'):
+        kind = 'batch'
+    elif path.endswith('/full') or path.endswith('/base'):
+        kind = 'feed'
+    else:
+        kind = 'single'
+
+    return kind
+
+
+class ByteCounter(object):
+    """Counts the bytes of a body as it is sent."""
+    def __init__(self, data):
+        self.data, self.count = data, 0
+
+        if isinstance(data, str):
+            self.count = len(data.encode('utf-8'))
+        elif isinstance(data, bytes):
+            self.count = len(data)
+        elif data is not None:
+            self.data = self.iter_chunks(data)
+
+    def iter_chunks(self, chunks):
+        for chunk in chunks:
+            self.count += len(chunk)
+            yield chunk
 
 
 class HTTPSession(object):
     """Handles HTTP activity while keeping headers persisting across requests.
 
        :param headers: A dict with initial headers.
+       :param hooks: (optional) A dict mapping an event to a function, or a
+           list of functions, called with a :class:`RequestEvent`.
+
+           before_request
+               before each attempt is sent (`status` and `seconds` are None)
+           after_response
+               after each response is received, whatever its status
+           on_retry
+               after a failed attempt that will be resent
+           on_error
+               after a request finally fails
+
+       :param retries: (optional) The number of times to resend a request
+           that failed with a transient error (default: 0).
+       :param backoff: (optional) The number of seconds to wait before
+           resending, multiplied by the attempt number (default: 1).
+
+       >>> session = HTTPSession(hooks={'after_response': print})
     """
 
-    def __init__(self, headers=None):
-        self.headers = pr.merge([DEF_HEADERS, headers or {}])
-        self.requests_session = requests.Session()
+    def __init__(self, headers=None, hooks=None, **kwargs):
+        self.headers = {**DEF_HEADERS, **(headers or {})}
+        self._requests_session = None
+        self.hooks = {event: [] for event in EVENTS}
+        self.retries = kwargs.get('retries', 0)
+        self.backoff = kwargs.get('backoff', 1)
+
+        for event, funcs in (hooks or {}).items():
+            for func in (funcs if isinstance(funcs, list) else [funcs]):
+                self.add_hook(event, func)
+
+    @property
+    def requests_session(self):
+        if self._requests_session is None:
+            self._requests_session = requests.Session()
+
+        return self._requests_session
+
+    @requests_session.setter
+    def requests_session(self, value):
+        self._requests_session = value
+
+    def add_hook(self, event, func):
+        if event not in self.hooks:
+            raise ValueError('Unknown event %s' % event)
+
+        self.hooks[event].append(func)
+
+    def remove_hook(self, event, func):
+        self.hooks[event].remove(func)
+
+    def emit(self, event, *args, **kwargs):
+        funcs = self.hooks[event]
+
+        if funcs:
+            request_event = RequestEvent(*args, **kwargs)
+
+            for func in funcs:
+                func(request_event)
 
     def request(self, method, url, **kwargs):
-        if kwargs.get('data'):
+        """Sends a request.
+
+        :param data: (optional) A dict to form encode, a str or bytes body,
+            or an iterator of bytes. An iterator is sent as a chunked upload
+            without reading it into memory first, so it can only be sent
+            once, and so is never resent.
+        :param kind: (optional) The kind of endpoint reported to the hooks
+            (default: guessed from the url, see :func:`get_kind`).
+        """
+        if hasattr(kwargs.get('data'), 'keys'):
             data = urlencode(kwargs['data'])
         else:
-            data = None
+            data = kwargs.get('data')
 
         if kwargs.get('headers'):
             headers = kwargs['headers']
@@ -38,7 +152,7 @@ class HTTPSession(object):
             if not headers.get('Content-Type'):
                 headers['Content-Type'] = 'application/x-www-form-urlencoded'
 
-            combined = pr.merge([self.headers, headers])
+            combined = {**self.headers, **headers}
             request_headers = {
                 k: v for k, v in combined.items() if v is not None}
         else:
@@ -49,14 +163,61 @@ class HTTPSession(object):
         except AttributeError:
             raise RequestError('HTTP method %s is not supported' % method)
 
-        extra = {'data': data, 'headers': request_headers}
-        rkwargs = pr.merge([kwargs, extra])
-        r = func(url, **rkwargs)
-
-        if not r.ok:
-            raise RequestError("{0}: {1}".format(r.status_code, r.reason))
-
-        return r
+        kind = kwargs.pop('kind', None)
+        hooked = any(self.hooks.values())
+
+        if hooked and not kind:
+            kind = get_kind(url)
+
+        resendable = data is None or isinstance(data, (str, bytes))
+        retries = self.retries if resendable else 0
+        attempt = 0
+
+        while True:
+            attempt += 1
+            counter = ByteCounter(data) if hooked else None
+            body = counter.data if hooked else data
+            extra = {'data': body, 'headers': request_headers}
+            rkwargs = {**kwargs, **extra}
+            args = (method, url, kind, attempt)
+
+            if hooked:
+                self.emit('before_request', *args, None, None, None, 0, None)
+
+            start = perf_counter()
+
+            try:
+                r = func(url, **rkwargs)
+            except requests.RequestException as e:
+                r, status, error = None, None, e
+            else:
+                status = r.status_code
+                error = None if r.ok else RequestError(
+                    "{0}: {1}".format(r.status_code, r.reason),
+                    status=r.status_code)
+
+            if hooked:
+                seconds = perf_counter() - start
+                bytes_in = len(r.content) if r is not None else 0
+                values = (status, seconds, counter.count, bytes_in, error)
+
+                if r is not None:
+                    self.emit('after_response', *args, *values)
+
+            transient = r is None or status in RETRY_CODES
+
+            if error and transient and attempt <= retries:
+                if hooked:
+                    self.emit('on_retry', *args, *values)
+
+                sleep(self.backoff * attempt)
+            elif error:
+                if hooked:
+                    self.emit('on_error', *args, *values)
+
+                raise error
+            else:
+                return r
 
     def get(self, url, params=None, **kwargs):
         return self.request('GET', url, params=params, **kwargs)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.journal
+~~~~~~~~~~~~~~~~
+
+This module contains a write-ahead journal of contact mutations.
+
+Each planned operation is appended to the journal (and synced to disk)
+before it is submitted, and each server acknowledgment is appended as soon
+as it arrives. A job that is restarted after a crash can then read the
+journal and resubmit only the operations that were never acknowledged.
+
+The journal is a JSON lines file with one record per line, e.g.,
+
+    {"type": "plan", "key": "insert:0cc9...", "op": "insert", "entry": {...}}
+    {"type": "ack", "key": "insert:0cc9...", "code": 201, "id": "...", ...}
+
+"""
+from collections import OrderedDict
+from json import dumps, loads
+from os import fsync
+
+from .atom import SUCCESS_CODES
+
+
+def get_key(operation, contact):
+    """Identifies an operation on a contact.
+
+    The key is computed before the operation is submitted since an insert
+    changes the contact's id.
+
+    >>> get_key('delete', contact)  # doctest: +SKIP
+    'delete:0cc9cd4dd26c5137b675a0d819cb9ab0'
+    """
+    return '%s:%s' % (operation, contact.short_id)
+
+
+class Journal(object):
+    """An append-only log of planned contact operations and their results.
+
+    :param path: The journal file path. An existing journal is read and
+        appended to.
+
+    >>> journal = Journal('import.journal')
+    >>> book.commit(changeset, journal=journal)
+    >>> # after a crash...
+    >>> book.resume(Journal('import.journal'))
+    """
+    def __init__(self, path):
+        self.path = path
+        self.planned = OrderedDict()
+        self.acked = {}
+
+        try:
+            with open(path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+
+        for line in lines:
+            try:
+                record = loads(line)
+            except ValueError:
+                # the last record of a crashed job may be partially written
+                continue
+
+            if record['type'] == 'plan':
+                self.planned[record['key']] = record
+            elif record['type'] == 'ack':
+                self.acked[record['key']] = record
+
+        self.file = open(path, 'a')
+
+        if lines and not lines[-1].endswith('\n'):
+            # a crash left the last record partially written, so end its line
+            # or the next record would be appended to it
+            self.file.write('\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.planned)
+
+    def _write(self, records):
+        self.file.writelines('%s\n' % dumps(record) for record in records)
+        self.file.flush()
+        fsync(self.file.fileno())
+
+    def is_done(self, key):
+        """Returns True if the operation was successfully acknowledged."""
+        return self.acked.get(key, {}).get('code') in SUCCESS_CODES
+
+    @property
+    def pending(self):
+        """The planned operations that weren't successfully acknowledged.
+
+        :returns: a list of (key, operation, entry) tuples in planned order.
+        """
+        return [
+            (key, record['op'], record['entry'])
+            for key, record in self.planned.items() if not self.is_done(key)]
+
+    @property
+    def complete(self):
+        return not self.pending
+
+    def plan(self, operations):
+        """Records operations before they are submitted.
+
+        Operations that are already done are left out, and operations that
+        are already planned aren't recorded again.
+
+        :param operations: An iterable of (operation, contact) tuples.
+
+        :returns: a list of (key, operation, contact) tuples of the operations
+            that still need to be submitted.
+        """
+        todo, records = [], []
+
+        for operation, contact in operations:
+            key = get_key(operation, contact)
+
+            if self.is_done(key):
+                continue
+
+            todo.append((key, operation, contact))
+
+            if key not in self.planned:
+                record = {
+                    'type': 'plan', 'key': key, 'op': operation,
+                    'entry': contact.entry}
+
+                self.planned[key] = record
+                records.append(record)
+
+        self._write(records)
+        return todo
+
+    def ack(self, key, result):
+        """Records the server's result of an operation.
+
+        :param key: The operation key, see :meth:`plan`.
+        :param result: A :class:`~gcontact.atom.BatchResult`.
+        """
+        record = {
+            'type': 'ack', 'key': key, 'code': result.code,
+            'reason': result.reason, 'id': result.id, 'etag': result.etag}
+
+        self.acked[key] = record
+        self._write([record])
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.lazy
+~~~~~~~~~~~~~
+
+This module contains a function to import modules when first used.
+
+"""
+import sys
+
+from importlib import util
+
+
+def lazy_import(name):
+    """Imports a module whose code only runs when an attribute is accessed.
+
+    Its parent packages are imported right away, so they should be light.
+
+    >>> json = lazy_import('json')
+    >>> json.dumps([1])
+    '[1]'
+    """
+    try:
+        return sys.modules[name]
+    except KeyError:
+        spec = util.find_spec(name)
+
+    if spec is None:
+        raise ImportError('No module named %s' % name, name=name)
+
+    loader = util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
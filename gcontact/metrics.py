@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.metrics
+~~~~~~~~~~~~~~~~
+
+This module contains an in-memory aggregator of request metrics.
+
+Attach it to a session to record the latency, size and outcome of each
+request, grouped by the kind of endpoint (feed, batch or single contact).
+
+>>> metrics = Metrics()
+>>> metrics.attach(book.session)
+>>> book.contacts
+>>> metrics.summary()['feed']['p50']
+
+"""
+import threading
+
+from collections import defaultdict
+
+from .lazy import lazy_import
+
+np = lazy_import('numpy')
+
+DEF_PERCENTILES = (50, 90, 99)
+COUNTERS = ('requests', 'errors', 'retries', 'bytes_out', 'bytes_in')
+
+
+class Metrics(object):
+    """Aggregates the :class:`~gcontact.httpsession.RequestEvent` objects
+    of one or more sessions.
+
+    :param percentiles: (optional) The latency percentiles to report
+        (default: (50, 90, 99)).
+    """
+    def __init__(self, percentiles=DEF_PERCENTILES):
+        self.percentiles = percentiles
+        self.lock = threading.Lock()
+        self.clear()
+
+    def attach(self, session):
+        """Adds the aggregator's hooks to a
+        :class:`~gcontact.httpsession.HTTPSession`."""
+        session.add_hook('after_response', self.after_response)
+        session.add_hook('on_retry', self.on_retry)
+        session.add_hook('on_error', self.on_error)
+
+    def detach(self, session):
+        session.remove_hook('after_response', self.after_response)
+        session.remove_hook('on_retry', self.on_retry)
+        session.remove_hook('on_error', self.on_error)
+
+    def clear(self):
+        with self.lock:
+            self.latencies = defaultdict(list)
+            self.counters = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+            self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def after_response(self, event):
+        with self.lock:
+            counters = self.counters[event.kind]
+            counters['requests'] += 1
+            counters['bytes_out'] += event.bytes_out
+            counters['bytes_in'] += event.bytes_in
+            self.latencies[event.kind].append(event.seconds)
+            self.statuses[event.kind][event.status] += 1
+
+    def on_retry(self, event):
+        with self.lock:
+            self.counters[event.kind]['retries'] += 1
+
+            if event.status is None:
+                self.counters[event.kind]['requests'] += 1
+
+    def on_error(self, event):
+        with self.lock:
+            self.counters[event.kind]['errors'] += 1
+
+            if event.status is None:
+                self.counters[event.kind]['requests'] += 1
+
+    def summary(self):
+        """Summarizes the requests recorded so far.
+
+        :returns: a dict mapping each endpoint kind to a dict of its request,
+            error, retry and byte counts, its status code counts, and its
+            mean, max and percentile (e.g., `p99`) latencies in seconds.
+        """
+        summary = {}
+
+        with self.lock:
+            for kind, counters in self.counters.items():
+                latencies = np.array(self.latencies[kind] or [0.0])
+                values = np.percentile(latencies, self.percentiles)
+                summary[kind] = dict(
+                    counters, statuses=dict(self.statuses[kind]),
+                    mean=float(latencies.mean()), max=float(latencies.max()),
+                    **{'p%g' % q: float(v)
+                       for q, v in zip(self.percentiles, values)})
+
+        return summary
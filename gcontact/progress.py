@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.progress
+~~~~~~~~~~~~~~~~~
+
+This module contains progress reporting for long running book operations.
+
+A :class:`~gcontact.Book` given a `progress` function calls it with a
+:class:`Progress` as it fetches feed pages, dedupes, and submits
+operations.
+
+>>> book = Book('path/to/keyfile.json', progress=print, progress_interval=1)
+>>> book.commit(changeset)
+Progress(task='submit', done=100, total=2000, errors=0, ...)
+
+"""
+from collections import namedtuple
+from time import perf_counter
+
+Progress = namedtuple('Progress', [
+    'task', 'done', 'total', 'errors', 'bytes', 'elapsed', 'rate', 'eta',
+    'message'])
+
+
+def format_progress(progress):
+    """Formats a progress report as one line.
+
+    >>> format_progress(Progress('fetch', 50, 200, 0, 2048, 1, 50, 3, None))
+    'fetch: 50/200 (25%), 50.0/s, 2.0 KiB, 0 errors, 3s left'
+    """
+    if progress.message:
+        return '%s: %s' % (progress.task, progress.message)
+
+    if progress.total:
+        percent = 100 * progress.done // progress.total
+        done = '%i/%i (%i%%)' % (progress.done, progress.total, percent)
+    else:
+        done = str(progress.done)
+
+    parts = [done, '%.1f/s' % progress.rate]
+
+    if progress.bytes:
+        parts.append('%.1f KiB' % (progress.bytes / 1024))
+
+    parts.append('%i errors' % progress.errors)
+
+    if progress.eta is not None:
+        parts.append('%is left' % progress.eta)
+
+    return '%s: %s' % (progress.task, ', '.join(parts))
+
+
+class NullReporter(object):
+    """A reporter that ignores updates."""
+    def update(self, done=1, errors=0, nbytes=0):
+        pass
+
+    def note(self, message):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_REPORTER = NullReporter()
+
+
+class ProgressReporter(NullReporter):
+    """Counts a task's progress and reports it to a function.
+
+    Updates only cost a few additions and a clock read, so they can be made
+    per item. Reports are made at most once per `interval`.
+
+    :param task: The task's name.
+    :param func: A function called with a :class:`Progress`.
+    :param total: (optional) The number of items expected.
+    :param interval: (optional) The least number of seconds between reports
+        (default: 0, report every update).
+    :param timer: (optional) A function returning the current time in
+        seconds (default: :func:`time.perf_counter`).
+    """
+    def __init__(self, task, func, total=None, **kwargs):
+        self.task = task
+        self.func = func
+        self.total = total
+        self.interval = kwargs.get('interval', 0)
+        self.timer = kwargs.get('timer', perf_counter)
+        self.done = self.errors = self.bytes = 0
+        self.start = self.last = self.timer()
+
+    def progress(self, message=None):
+        elapsed = self.timer() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+
+        if self.total is None or not rate:
+            eta = None
+        else:
+            eta = max(self.total - self.done, 0) / rate
+
+        args = (self.done, self.total, self.errors, self.bytes, elapsed)
+        return Progress(self.task, *args, rate, eta, message)
+
+    def update(self, done=1, errors=0, nbytes=0):
+        """Adds to the counts, and reports them if `interval` has passed.
+
+        :param done: (optional) The number of items processed (default: 1).
+        :param errors: (optional) The number of them that failed.
+        :param nbytes: (optional) The number of bytes transferred.
+        """
+        self.done += done
+        self.errors += errors
+        self.bytes += nbytes
+        now = self.timer()
+
+        if now - self.last >= self.interval:
+            self.last = now
+            self.func(self.progress())
+
+    def note(self, message):
+        """Reports a message along with the current counts."""
+        self.func(self.progress(message))
+
+    def finish(self):
+        """Reports the final counts."""
+        self.func(self.progress())
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.store
+~~~~~~~~~~~~~~
+
+This module contains a contact store that processes can share.
+
+The store is a SQLite database in WAL mode, so any number of processes can
+read it while one of them writes. It holds each account's decoded contact
+entries along with indexes of their normalized emails, phones, IM
+addresses and names, and their simhash blocks. A worker can then query a
+contact by id, name, email or simhash without loading the whole book.
+
+>>> store = ContactStore('contacts.db')
+>>> store.save('reubano@gmail.com', book.contacts)
+>>> store.find_by_email('reubano@gmail.com', 'Reuben@Gmail.com')
+
+"""
+import sqlite3
+
+from json import dumps, loads
+from time import time
+
+from . import dedupe as dd
+from .cache import strip_entry
+
+DEF_TIMEOUT = 30
+DEF_BITS = 3
+SIGN_BIT = 2 ** 63
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS accounts (
+        account TEXT PRIMARY KEY, etag TEXT, updated REAL);
+    CREATE TABLE IF NOT EXISTS contacts (
+        account TEXT, id TEXT, pos INTEGER, title TEXT, simhash INTEGER,
+        entry TEXT, PRIMARY KEY (account, id));
+    CREATE TABLE IF NOT EXISTS keys (
+        account TEXT, kind TEXT, key TEXT, id TEXT);
+    CREATE INDEX IF NOT EXISTS keys_idx ON keys (account, kind, key);
+    CREATE TABLE IF NOT EXISTS blocks (
+        account TEXT, block INTEGER, key INTEGER, id TEXT);
+    CREATE INDEX IF NOT EXISTS blocks_idx ON blocks (account, block, key);
+'''
+
+
+def to_signed(value):
+    """Converts an unsigned 64 bit int into the signed int SQLite stores.
+
+    >>> to_signed(2 ** 64 - 1)
+    -1
+    """
+    value = int(value)
+    return value - 2 * SIGN_BIT if value >= SIGN_BIT else value
+
+
+def to_unsigned(value):
+    """
+    >>> to_unsigned(-1) == 2 ** 64 - 1
+    True
+    """
+    return value + 2 * SIGN_BIT if value < 0 else value
+
+
+class ContactStore(object):
+    """A SQLite backed store of each account's contacts.
+
+    :param path: The database file path.
+    :param hashbits: (optional) The size of the contacts' simhashes
+        (default: 64).
+    :param bits: (optional) The largest number of differing simhash bits
+        :meth:`find_by_simhash` uses its index for (default: 3).
+    :param timeout: (optional) The number of seconds to wait for another
+        process's write to finish (default: 30).
+    """
+    def __init__(self, path, **kwargs):
+        self.path = path
+        self.hashbits = kwargs.get('hashbits', dd.DEF_HASHBITS)
+        self.bits = kwargs.get('bits', DEF_BITS)
+        self.blocks = dd.get_blocks(self.hashbits, self.bits)
+        timeout = kwargs.get('timeout', DEF_TIMEOUT)
+        self.conn = sqlite3.connect(path, timeout=timeout)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_blocks(self, value):
+        return [(value >> shift) & mask for shift, mask in self.blocks]
+
+    def save(self, account, contacts, etag=None):
+        """Replaces an account's contacts in a single transaction.
+
+        :param account: The account's email address.
+        :param contacts: An iterable of :class:`~gcontact.Contact` objects.
+        :param etag: (optional) The etag of the account's feed.
+
+        :returns: the number of contacts saved.
+        """
+        rows, keys, blocks = [], [], []
+
+        for pos, contact in enumerate(contacts):
+            _id, value = contact.short_id, int(contact.simhash.hash)
+            entry = dumps(strip_entry(contact.entry))
+            rows.append(
+                (account, _id, pos, contact.title, to_signed(value), entry))
+
+            keys.extend(
+                (account, kind, key, _id)
+                for kind, key in dd.get_block_keys(contact.features))
+
+            blocks.extend(
+                (account, block, key, _id)
+                for block, key in enumerate(self.get_blocks(value)))
+
+        with self.conn:
+            for table in ('contacts', 'keys', 'blocks'):
+                sql = 'DELETE FROM %s WHERE account = ?' % table
+                self.conn.execute(sql, (account,))
+
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO contacts VALUES (?, ?, ?, ?, ?, ?)',
+                rows)
+
+            self.conn.executemany(
+                'INSERT INTO keys VALUES (?, ?, ?, ?)', keys)
+            self.conn.executemany(
+                'INSERT INTO blocks VALUES (?, ?, ?, ?)', blocks)
+            self.conn.execute(
+                'INSERT OR REPLACE INTO accounts VALUES (?, ?, ?)',
+                (account, etag, time()))
+
+        return len(rows)
+
+    def has(self, account):
+        """Returns True if the account's contacts have been saved."""
+        sql = 'SELECT 1 FROM accounts WHERE account = ?'
+        return bool(self.conn.execute(sql, (account,)).fetchone())
+
+    def count(self, account):
+        sql = 'SELECT COUNT(*) FROM contacts WHERE account = ?'
+        return self.conn.execute(sql, (account,)).fetchone()[0]
+
+    def etag(self, account):
+        sql = 'SELECT etag FROM accounts WHERE account = ?'
+        row = self.conn.execute(sql, (account,)).fetchone()
+        return row[0] if row else None
+
+    def entries(self, account):
+        """Yields an account's entries in the order they were saved."""
+        sql = 'SELECT entry FROM contacts WHERE account = ? ORDER BY pos'
+
+        for (entry,) in self.conn.execute(sql, (account,)):
+            yield loads(entry)
+
+    def get(self, account, _id):
+        """Gets an entry by the contact's short id, or None."""
+        sql = 'SELECT entry FROM contacts WHERE account = ? AND id = ?'
+        row = self.conn.execute(sql, (account, _id)).fetchone()
+        return loads(row[0]) if row else None
+
+    def find_by_key(self, account, kind, key):
+        """Finds entries by a normalized blocking key.
+
+        :param kind: One of 'email', 'phone', 'im' or 'name'.
+        :param key: The normalized key, see
+            :func:`~gcontact.dedupe.get_block_keys`.
+        """
+        sql = (
+            'SELECT DISTINCT c.entry FROM keys k JOIN contacts c '
+            'ON c.account = k.account AND c.id = k.id '
+            'WHERE k.account = ? AND k.kind = ? AND k.key = ? ORDER BY c.pos')
+
+        rows = self.conn.execute(sql, (account, kind, key))
+        return [loads(entry) for (entry,) in rows]
+
+    def find_by_email(self, account, email):
+        key = dd.normalize_email(email)
+        return self.find_by_key(account, 'email', key) if key else []
+
+    def find_by_phone(self, account, phone):
+        key = dd.normalize_phone(phone)
+        return self.find_by_key(account, 'phone', key) if key else []
+
+    def find_by_im(self, account, address):
+        key = dd.normalize_im(address)
+        return self.find_by_key(account, 'im', key) if key else []
+
+    def find_by_name(self, account, name):
+        key = ' '.join(dd.name_tokens(name))
+        return self.find_by_key(account, 'name', key) if key else []
+
+    def find_by_simhash(self, account, value, bits=None):
+        """Finds the entries whose simhash is within `bits` of `value`.
+
+        When `bits` is at most the store's `bits`, only the contacts that
+        share a simhash block with `value` are compared (see
+        :func:`~gcontact.dedupe.get_blocks`), otherwise all are.
+
+        :param value: A simhash value, e.g., `contact.simhash.hash`.
+        :param bits: (optional) The largest number of differing bits
+            (default: the store's `bits`).
+
+        :returns: a list of (distance, entry) tuples sorted by distance.
+        """
+        bits = self.bits if bits is None else bits
+        value = int(value)
+
+        if bits <= self.bits:
+            where = ' OR '.join(
+                '(b.block = %i AND b.key = %i)' % (block, key)
+                for block, key in enumerate(self.get_blocks(value)))
+
+            sql = (
+                'SELECT DISTINCT c.simhash, c.entry, c.pos FROM blocks b '
+                'JOIN contacts c ON c.account = b.account AND c.id = b.id '
+                'WHERE b.account = ? AND (%s)' % where)
+        else:
+            sql = 'SELECT simhash, entry, pos FROM contacts WHERE account = ?'
+
+        found = []
+
+        for simhash, entry, pos in self.conn.execute(sql, (account,)):
+            distance = bin(to_unsigned(simhash) ^ value).count('1')
+
+            if distance <= bits:
+                found.append((distance, pos, entry))
+
+        return [(dist, loads(entry)) for dist, _, entry in sorted(found)]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""
+gcontact.tracing
+~~~~~~~~~~~~~~~~
+
+This module contains timers for the phases of a book's work.
+
+A :class:`~gcontact.Book` given a tracer times its cache loads, JSON
+decoding, contact construction, simhash computation, index builds and
+dedupe in named spans. Without one, spans cost a method call.
+
+>>> tracer = Tracer()
+>>> book = Book('path/to/keyfile.json', tracer=tracer)
+>>> book.dedupe(blocking=True)
+>>> print(tracer.report())
+
+A :class:`Profiler` also runs cProfile and tracemalloc, and writes a report
+when it stops. Set the `GCONTACT_PROFILE` environment variable to a
+directory to profile every book of a process, writing the report when the
+process exits.
+
+"""
+import atexit
+import os
+import threading
+
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager, nullcontext
+from datetime import datetime as dt
+from os import path as p
+from time import perf_counter
+
+NULL_SPAN = nullcontext()
+DEF_TOP = 25
+PROFILE_ENV = 'GCONTACT_PROFILE'
+
+Span = namedtuple('Span', ['name', 'parent', 'start', 'seconds'])
+
+
+class Tracer(object):
+    """Records timed spans.
+
+    Spans can be nested and opened from any thread.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.spans = []
+
+    @contextmanager
+    def span(self, name):
+        stack = self.local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            seconds = perf_counter() - start
+            stack.pop()
+
+            with self.lock:
+                self.spans.append(Span(name, parent, start, seconds))
+
+    def clear(self):
+        with self.lock:
+            self.spans = []
+
+    def summary(self):
+        """Summarizes the spans by name.
+
+        :returns: a dict mapping each span name to a dict of its count and
+            its total, mean and max seconds.
+        """
+        by_name = defaultdict(list)
+
+        with self.lock:
+            for span in self.spans:
+                by_name[span.name].append(span.seconds)
+
+        return {
+            name: {
+                'count': len(seconds), 'total': sum(seconds),
+                'mean': sum(seconds) / len(seconds), 'max': max(seconds)}
+            for name, seconds in by_name.items()}
+
+    def report(self):
+        """Formats the summary as a table, slowest phase first."""
+        rows = sorted(
+            self.summary().items(), key=lambda item: -item[1]['total'])
+
+        lines = ['%-16s %8s %12s %12s %12s' % (
+            'span', 'count', 'total (s)', 'mean (s)', 'max (s)')]
+
+        for name, stats in rows:
+            lines.append('%-16s %8i %12.6f %12.6f %12.6f' % (
+                name, stats['count'], stats['total'], stats['mean'],
+                stats['max']))
+
+        return '\n'.join(lines)
+
+
+class Profiler(Tracer):
+    """A tracer that also profiles with cProfile and tracemalloc.
+
+    cProfile only sees the thread the profiler was started in.
+
+    :param report_dir: The directory to write reports to.
+    :param cprofile: (optional) Profile function calls (default: True).
+    :param memory: (optional) Trace memory allocations (default: True).
+    :param top: (optional) The number of functions and allocation sites to
+        report (default: 25).
+
+    >>> with Profiler('reports') as profiler:
+    ...     book = Book('path/to/keyfile.json', tracer=profiler)
+    ...     book.dedupe(blocking=True)
+    >>> profiler.path
+    'reports/gcontact-20170101T000000-1234.txt'
+    """
+    def __init__(self, report_dir, **kwargs):
+        super(Profiler, self).__init__()
+        self.report_dir = report_dir
+        self.cprofile = kwargs.get('cprofile', True)
+        self.memory = kwargs.get('memory', True)
+        self.top = kwargs.get('top', DEF_TOP)
+        self.profile = None
+        self.snapshot = None
+        self.peak = None
+        self.path = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        import cProfile
+        import tracemalloc
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        if self.cprofile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self):
+        """Stops profiling and writes the report.
+
+        :returns: the report's path.
+        """
+        import tracemalloc
+
+        if self.profile:
+            self.profile.disable()
+
+        if self.memory and tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        os.makedirs(self.report_dir, exist_ok=True)
+        stamp = dt.now().strftime('%Y%m%dT%H%M%S')
+        name = 'gcontact-%s-%i' % (stamp, os.getpid())
+        self.path = p.join(self.report_dir, '%s.txt' % name)
+
+        if self.profile:
+            self.profile.dump_stats(p.join(self.report_dir, '%s.prof' % name))
+
+        with open(self.path, 'w') as f:
+            f.write(self.report())
+
+        return self.path
+
+    def report(self):
+        import io
+        import pstats
+
+        sections = ['Spans', super(Profiler, self).report()]
+
+        if self.profile:
+            stream = io.StringIO()
+            stats = pstats.Stats(self.profile, stream=stream)
+            stats.sort_stats('cumulative').print_stats(self.top)
+            sections += ['Functions', stream.getvalue().strip()]
+
+        if self.snapshot:
+            stats = self.snapshot.statistics('lineno')[:self.top]
+            lines = ['peak: %.1f MiB' % (self.peak / 2 ** 20)]
+            lines += [str(stat) for stat in stats]
+            sections += ['Allocations', '\n'.join(lines)]
+
+        return '\n\n'.join(sections) + '\n'
+
+
+_env_profiler = None
+
+
+def from_env():
+    """Gets the process's profiler if `GCONTACT_PROFILE` is set.
+
+    The profiler is started on the first call, and writes its report to the
+    `GCONTACT_PROFILE` directory when the process exits.
+
+    :returns: a :class:`Profiler`, or None.
+    """
+    global _env_profiler
+    report_dir = os.getenv(PROFILE_ENV)
+
+    if report_dir and _env_profiler is None:
+        _env_profiler = Profiler(report_dir)
+        _env_profiler.start()
+        atexit.register(_env_profiler.stop)
+
+    return _env_profiler if report_dir else None
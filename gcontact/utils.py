@@ -10,7 +10,9 @@ This module contains utility functions.
 
 import re
 
-from exceptions import NoValidUrlKeyFound
+from itertools import islice
+
+from .exceptions import NoValidUrlKeyFound
 
 URL_KEY_V1_RE = re.compile(r'key=([^&#]+)')
 URL_KEY_V2_RE = re.compile(r'/contacts/d/([a-zA-Z0-9-_]+)')
@@ -23,6 +25,20 @@ def finditem(func, seq):
     return next((item for item in seq if func(item)))
 
 
+def chunk(iterable, size):
+    """Splits an iterable into lists of (at most) `size` items.
+
+    >>> list(chunk(range(5), 2))
+    [[0, 1], [2, 3], [4]]
+    """
+    iterator = iter(iterable)
+    group = list(islice(iterator, size))
+
+    while group:
+        yield group
+        group = list(islice(iterator, size))
+
+
 def extract_id_from_url(url):
     m2 = URL_KEY_V2_RE.search(url)
     if m2:
@@ -44,7 +44,9 @@ setup(
     author_email='fuss.here@gmail.com',
     url='https://github.com/burnash/gcontact',
     keywords=['contacts', 'google-contacts'],
-    install_requires=['requests>=2.2.1'],
+    install_requires=['requests>=2.2.1', 'numpy'],
+    extras_require={'zstd': ['zstandard'], 'parquet': ['pyarrow']},
+    entry_points={'console_scripts': ['gcontact = gcontact.cli:main']},
     classifiers=[
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""
+tests.helpers
+~~~~~~~~~~~~~
+
+Helpers shared by the tests and benchmarks.
+
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from json import dumps
+from unittest import mock
+
+import gcontact
+
+
+def make_book(**kwargs):
+    """Creates a book without looking up credentials.
+
+    :param kwargs: Keyword arguments passed to :class:`~gcontact.Book`.
+    """
+    with mock.patch('gcontact.book.get_credentials', return_value=None):
+        return gcontact.Book(None, **kwargs)
+
+
+def mock_feed(book, entries):
+    """Answers the feed requests of a book with a mock session."""
+    response = {'feed': {'entry': entries}}
+    book.session.get.return_value.json.return_value = response
+    book.session.get.return_value.content = dumps(response).encode()
+    return book
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Runs each test in a new temporary directory, so the books' caches
+    don't touch the working directory."""
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
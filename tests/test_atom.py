@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from xml.etree.ElementTree import tostring, fromstring
+
+import mock
+
+import gcontact
+from gcontact import atom
+
+I18N_STR = 'Iñtërnâtiônàlizætiøn'
+BASE_URL = 'http://www.google.com/m8/feeds/contacts/me/base'
+
+
+def make_entry(key='a', title='Jane "JD" Doe & Co <jd>'):
+    return {
+        'id': {'$t': '%s/%s' % (BASE_URL, key)},
+        'updated': {'$t': '2017-01-01T00:00:00.000Z'},
+        'title': {'$t': title},
+        'content': {'$t': 'Met at PyCon\n%s' % I18N_STR, 'type': 'text'},
+        'gd$etag': '"Rn4zeTVSLit7I2A9XR5WGUkJQQw."',
+        'gd$name': {
+            'gd$givenName': {'$t': 'Jane'},
+            'gd$familyName': {'$t': 'Doe'},
+            'gd$additionalName': {'$t': ''}},
+        'gd$organization': [
+            {
+                'rel': atom.goog_ns('work'), 'primary': 'true',
+                'gd$orgName': {'$t': 'Doe & Co'},
+                'gd$orgTitle': {'$t': 'CEO'}},
+            {'rel': atom.goog_ns('other')}],
+        'gd$email': [
+            {'address': 'jane@doe.com', 'primary': 'true', 'rel': 'a"b'},
+            {'address': ''}],
+        'gd$im': [{'address': 'jdoe', 'protocol': atom.goog_ns('SKYPE')}],
+        'gd$phoneNumber': [
+            {'$t': '+1 555-123-4567', 'rel': atom.goog_ns('mobile')}],
+        'gd$postalAddress': [{'$t': '1 Main St\nTown', 'rel': 'home'}],
+        'gd$structuredPostalAddress': [
+            {
+                'rel': atom.goog_ns('work'),
+                'gd$city': {'$t': I18N_STR},
+                'gd$street': {'$t': '2 Side St'},
+                'gd$formattedAddress': {'$t': '2 Side St\n%s' % I18N_STR}}],
+        'gd$extendedProperty': [{'name': 'source', 'value': 'linkedin'}],
+        'gContact$groupMembershipInfo': [
+            {'href': 'http://group/1', 'deleted': 'false'},
+            {'href': 'http://group/2', 'deleted': 'true'}]}
+
+
+class AtomTest(unittest.TestCase):
+    def setUp(self):
+        self.contact = gcontact.Contact(None, None, **make_entry())
+
+    def test_new_entry(self):
+        expected = tostring(self.contact.newxml)
+        self.assertEqual(atom.to_bytes(atom.new_entry(self.contact)), expected)
+
+    def test_update_entry(self):
+        expected = tostring(self.contact.upxml)
+        result = atom.to_bytes(atom.update_entry(self.contact))
+        self.assertEqual(result, expected)
+
+    def test_batch_entry(self):
+        for operation in ('insert', 'update', 'delete'):
+            expected = tostring(self.contact.batchxml(operation, 'id1'))
+            entry = atom.batch_entry(self.contact, operation, 'id1')
+            self.assertEqual(atom.to_bytes(entry), expected)
+
+    def test_batch_feed(self):
+        contacts = [
+            gcontact.Contact(None, None, **make_entry(key, I18N_STR))
+            for key in ('a', 'b')]
+
+        operations = [('update', contacts[0]), ('delete', contacts[1])]
+        entries = (contact.batchxml(op) for op, contact in operations)
+        expected = tostring(gcontact.batch_feed(entries))
+        self.assertEqual(atom.batch_feed(operations), expected)
+
+    def test_parses(self):
+        entry = fromstring(atom.to_bytes(atom.update_entry(self.contact)))
+        name = entry.find('{%s}name/{%s}fullName' % ((atom.GOOGLE_NS,) * 2))
+        self.assertEqual(name.text, self.contact.title)
+
+
+class StreamingTest(unittest.TestCase):
+    def setUp(self):
+        self.operations = [
+            ('update', gcontact.Contact(None, None, **make_entry(str(i))))
+            for i in range(20)]
+
+    def test_iter_batch_feed(self):
+        chunks = list(atom.iter_batch_feed(self.operations, chunk_size=4096))
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(all(len(chunk) < 8192 for chunk in chunks))
+        body = b''.join(chunks)
+        self.assertEqual(body, atom.batch_feed(self.operations))
+        self.assertEqual(len(fromstring(body)), 20)
+
+    def test_chunked_upload(self):
+        session = gcontact.HTTPSession()
+        session.requests_session = mock.Mock()
+        data = atom.iter_batch_feed(self.operations)
+        session.post('http://example.com', data=data)
+        kwargs = session.requests_session.post.call_args[1]
+        self.assertIs(kwargs['data'], data)
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+
+from json import loads
+from os import path as p
+from xml.etree.ElementTree import fromstring
+
+import mock
+
+import gcontact
+from gcontact import dedupe as dd
+from tests import helpers
+from tests.test_dedupe import make_contact
+
+BATCH_NS = '{%s}' % gcontact.BATCH_NS
+ATOM_NS = '{%s}' % gcontact.ATOM_NS
+RESPONSE_ENTRY = (
+    '<entry gd:etag="etag-%(batch_id)s"><id>%(id)s</id>'
+    '<batch:id>%(batch_id)s</batch:id>'
+    '<batch:status code="%(code)s" reason="%(reason)s" /></entry>')
+
+
+def get_operations(feed):
+    return [e.find(BATCH_NS + 'operation').get('type') for e in feed]
+
+
+class BatchSession(object):
+    """Answers batch requests the way the Contacts API does.
+
+    :param failures: A dict mapping batch ids to the number of times the
+        operation should fail with a 503 before succeeding.
+    :param errors: A list of HTTP status codes that the first requests
+        fail with as a whole.
+    """
+    def __init__(self, failures=None, errors=None):
+        self.failures = dict(failures or {})
+        self.errors = list(errors or [])
+        self.feeds = []
+        self.urls = []
+
+    def add_header(self, *args, **kwargs):
+        pass
+
+    def post(self, url, data=None, headers=None):
+        feed = fromstring(b''.join(data))
+        self.urls.append(url)
+        self.feeds.append(feed)
+
+        if self.errors:
+            status = self.errors.pop(0)
+            raise gcontact.RequestError('%s: Error' % status, status=status)
+        entries = []
+
+        for entry in feed:
+            batch_id = entry.findtext(BATCH_NS + 'id')
+            op = entry.find(BATCH_NS + 'operation').get('type')
+            _id = entry.findtext(ATOM_NS + 'id') or 'new-%s' % batch_id
+
+            if self.failures.get(batch_id):
+                self.failures[batch_id] -= 1
+                code, reason = 503, 'Service Unavailable'
+            elif op == 'insert':
+                code, reason = 201, 'Created'
+            else:
+                code, reason = 200, 'Success'
+
+            entries.append(RESPONSE_ENTRY % {
+                'batch_id': batch_id, 'id': _id, 'code': code,
+                'reason': reason})
+
+        start = gcontact.atom.start_tag(
+            'feed', gcontact.atom.BATCH_NAMESPACES)
+
+        content = '%s%s</feed>' % (start, ''.join(entries))
+
+        return mock.Mock(content=content.encode('utf-8'))
+
+
+def make_book(contacts, session=None, **kwargs):
+    session = session or BatchSession()
+    kwargs.setdefault('use_cache', False)
+
+    book = helpers.make_book(session=session, **kwargs)
+    book._contacts = contacts
+    return book
+
+
+class MergePlanTest(unittest.TestCase):
+    def setUp(self):
+        self.contacts = [
+            make_contact('a', 'Reuben Cummings', ['reuben@gmail.com']),
+            make_contact(
+                'b', 'Reuben Cummings', ['Reuben@Gmail.com', 'r@c.com'],
+                phones=['555-123-4567']),
+            make_contact('c', 'Jane Doe', ims=['jdoe']),
+            make_contact('d', 'J. Doe', ims=['jdoe']),
+            make_contact('e', 'John Smith', ['john@smith.com'])]
+
+        self.contacts[0]._email[0]['primary'] = 'true'
+        self.book = make_book(self.contacts)
+
+    def test_plan_merge(self):
+        plan = dd.plan_merge(self.contacts[:2])
+        self.assertIs(plan.survivor, self.contacts[1])
+        self.assertEqual(plan.deletes, [self.contacts[0]])
+        self.assertEqual(plan.fields, {})
+
+        plan = dd.plan_merge(self.contacts[2:4] + self.contacts[:1])
+        self.assertIs(plan.survivor, self.contacts[2])
+        self.assertEqual(plan.fields, {
+            '_email': [{'address': 'reuben@gmail.com'}]})
+
+    def test_dedupe(self):
+        plans = self.book.dedupe(blocking=True)
+        survivors = [plan.survivor for plan in plans]
+        self.assertEqual(survivors, [self.contacts[1], self.contacts[2]])
+        deletes = [plan.deletes for plan in plans]
+        self.assertEqual(deletes, [[self.contacts[0]], [self.contacts[3]]])
+
+    def test_merge(self):
+        plans = self.book.dedupe(blocking=True, merge=True)
+        self.assertEqual(len(plans), 2)
+        self.assertEqual(len(self.book.session.feeds), 2)
+        self.assertEqual(len(self.book.contacts), 3)
+        self.assertIn('/batch/', self.book.session.urls[0])
+
+        # the dupes are deleted after their survivors are updated
+        operations = list(map(get_operations, self.book.session.feeds))
+        self.assertEqual(operations, [['update', 'update'], ['delete'] * 2])
+
+    def test_merge_failed_update(self):
+        session = BatchSession(failures={'0': 1})
+        book = make_book(self.contacts, session)
+        plans = book.dedupe(blocking=True)
+        submitted = book.merge(plans, retries=0)
+
+        # the first survivor wasn't updated, so its dupe is kept
+        codes = [(op, result.code) for op, _, result in submitted]
+        expected = [('update', 503), ('update', 200), ('delete', 200)]
+        self.assertEqual(codes, expected)
+
+        self.assertEqual(get_operations(session.feeds[1]), ['delete'])
+        ids = [contact.short_id for contact in book.contacts]
+        self.assertEqual(ids, ['a', 'b', 'c', 'e'])
+
+    def test_merge_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        book = make_book(self.contacts, cache_dir=tmpdir)
+        book._write_cache(b'{"feed": {"entry": []}}', [], [])
+        book._write_etag(b'{"feed": {"gd$etag": "W/etag"}}')
+        book.dedupe(blocking=True, merge=True)
+
+        # the merged dupes aren't cached, and the feed etag is stale
+        with open(book.cache_path) as f:
+            entries = loads(f.read())['feed']['entry']
+
+        ids = [entry['id']['$t'].split('/')[-1] for entry in entries]
+        self.assertEqual(ids, ['b', 'c', 'e'])
+        self.assertFalse(p.exists(book.etag_path))
+        self.assertIsNone(book._etag)
+
+
+class ReconcileTest(unittest.TestCase):
+    def setUp(self):
+        self.contacts = [
+            make_contact('a', 'Reuben Cummings', ['reuben@gmail.com']),
+            make_contact('b', 'Jane Doe', ims=['jdoe'])]
+
+        self.book = make_book(list(self.contacts))
+        self.incoming = [
+            make_contact('x', 'Reuben Cummings', ['Reuben@Gmail.com']),
+            make_contact('y', 'Jane Doe', ['jane@doe.com'], ims=['jdoe']),
+            make_contact('z', 'John Smith', ['john@smith.com'])]
+
+    def test_reconcile(self):
+        changeset = self.book.reconcile(self.incoming)
+        self.assertEqual(changeset.new, [self.incoming[2]])
+        self.assertEqual(
+            changeset.unchanged, [(self.contacts[0], self.incoming[0])])
+
+        change = changeset.changed[0]
+        self.assertIs(change.contact, self.contacts[1])
+        self.assertEqual(change.incoming, [self.incoming[1]])
+        self.assertEqual(
+            change.fields, {'_email': [{'address': 'jane@doe.com'}]})
+
+        # nothing is modified until the change set is committed
+        self.assertEqual(list(self.contacts[1].emails), [])
+
+    def test_commit(self):
+        changeset = self.book.reconcile(self.incoming)
+        self.book.commit(changeset)
+        self.assertEqual(list(self.contacts[1].emails), ['jane@doe.com'])
+        self.assertEqual(len(self.book.contacts), 3)
+
+        operations = get_operations(self.book.session.feeds[0])
+        self.assertEqual(operations, ['insert', 'update'])
+        self.assertEqual(self.incoming[2]._id, 'new-0')
+        self.assertEqual(self.contacts[1].etag, 'etag-1')
+
+    def test_commit_store(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        store = p.join(tmpdir, 'contacts.db')
+        self.book = make_book(
+            list(self.contacts), store=store, cache_dir=tmpdir)
+
+        self.book.store.save(self.book.account, self.contacts)
+        self.book.commit(self.book.reconcile(self.incoming))
+
+        # the store has the committed contacts
+        entries = list(self.book.store.entries(self.book.account))
+        self.assertEqual(len(entries), 3)
+        emails = [entry['gd$email'] for entry in entries]
+        self.assertIn([{'address': 'jane@doe.com'}], emails)
+
+
+class SubmitTest(unittest.TestCase):
+    def setUp(self):
+        self.contacts = [
+            make_contact(key, 'Contact %s' % key) for key in 'abcde']
+
+    def test_submit(self):
+        book = make_book(self.contacts)
+        book.batch_size = 2
+        operations = [('update', contact) for contact in self.contacts]
+        results = book.submit(operations, workers=2)
+        self.assertEqual(len(book.session.feeds), 3)
+        self.assertEqual([r[1] for r in results], self.contacts)
+        self.assertEqual([r[2].code for r in results], [200] * 5)
+        self.assertEqual(self.contacts[4].etag, 'etag-4')
+
+    def test_retry(self):
+        session = BatchSession({'1': 1, '3': 2})
+        book = make_book(self.contacts, session)
+        operations = [('delete', contact) for contact in self.contacts]
+        results = book.submit(operations, backoff=0)
+        self.assertEqual([r[2].code for r in results], [200] * 5)
+
+        # only the failed operations are resent
+        batch_ids = [
+            [e.findtext(BATCH_NS + 'id') for e in feed]
+            for feed in session.feeds]
+
+        expected = [['0', '1', '2', '3', '4'], ['1', '3'], ['3']]
+        self.assertEqual(batch_ids, expected)
+
+    def test_retries_exhausted(self):
+        session = BatchSession({'0': 5})
+        book = make_book(self.contacts[:1], session)
+        results = book.submit([('delete', self.contacts[0])], backoff=0)
+        self.assertEqual(results[0][2].code, 503)
+        self.assertEqual(len(session.feeds), gcontact.DEF_RETRIES + 1)
+
+    def test_request_errors(self):
+        session = BatchSession(errors=[503, 400])
+        book = make_book(self.contacts[:1], session)
+        results = book.submit([('delete', self.contacts[0])], backoff=0.01)
+
+        # the 503 is resent, the 400 isn't
+        self.assertEqual(len(session.feeds), 2)
+        self.assertEqual(results[0][2].code, 400)
+        self.assertEqual(results[0][2].reason, '400: Error')
+
+
+class PagingTest(unittest.TestCase):
+    def test_pages(self):
+        contacts = [make_contact(key, 'Contact %s' % key) for key in 'abc']
+        next_url = 'http://localhost/m8/feeds/contacts/me/full/?start-index=3'
+        pages = [
+            {'feed': {
+                'entry': [c.entry for c in contacts[:2]],
+                'link': [{'rel': 'next', 'href': next_url}]}},
+            {'feed': {'entry': [contacts[2].entry], 'link': []}}]
+
+        session = mock.Mock()
+        session.get.return_value.json.side_effect = pages
+        session.get.return_value.content = b'{}'
+        reports = []
+
+        book = helpers.make_book(
+            use_cache=False, cache_resp=False, session=session,
+            api_url='http://localhost/m8/feeds', page_size=2,
+            progress=reports.append)
+
+        # the pages aren't joined into one feed unless it is cached
+        with mock.patch('gcontact.book.dumps') as dumps:
+            titles = [contact.title for contact in book.contacts]
+
+        self.assertFalse(dumps.called)
+        self.assertEqual(titles, ['Contact a', 'Contact b', 'Contact c'])
+        self.assertEqual([report.done for report in reports], [2, 3, 3])
+        self.assertEqual(reports[-1].bytes, 4)
+
+        urls = [args[0][0] for args in session.get.call_args_list]
+        self.assertTrue(urls[0].startswith('http://localhost/m8/feeds/'))
+        self.assertIn('max-results=2', urls[0])
+        self.assertEqual(urls[1], next_url)
+
+    def test_iter_entries(self):
+        next_url = 'http://localhost/m8/feeds/contacts/me/full/?start-index=2'
+        pages = [
+            {'feed': {
+                'entry': [make_contact('a', 'Contact a').entry],
+                'link': [{'rel': 'next', 'href': next_url}]}},
+            {'feed': {'entry': [make_contact('b', 'Contact b').entry]}}]
+
+        session = mock.Mock()
+        session.get.return_value.json.side_effect = pages
+        session.get.return_value.content = b'{}'
+
+        book = helpers.make_book(
+            use_cache=False, cache_resp=False, session=session,
+            api_url='http://localhost/m8/feeds', page_size=1)
+
+        entries = book.iter_entries()
+        self.assertEqual(next(entries)['title'], {'$t': 'Contact a'})
+        self.assertEqual(session.get.call_count, 1)
+        self.assertEqual(next(entries)['title'], {'$t': 'Contact b'})
+        self.assertEqual(list(entries), [])
+        self.assertIsNone(book._contacts)
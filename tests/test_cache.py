@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from copy import deepcopy
+from os import path as p
+
+import mock
+
+import gcontact
+from gcontact import cache
+from gcontact.exceptions import CacheError
+from tests.helpers import TempDirTestCase, make_book, mock_feed
+from tests.test_dedupe import make_contact
+
+
+def make_entries(keys):
+    return [
+        make_contact(key, 'Contact %s' % key, ['%s@example.com' % key]).entry
+        for key in keys]
+
+
+class ContactCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = p.join(self.tmpdir, 'cache.mmap')
+        self.keys = ['d', 'a', 'ccc', 'b2', 'é']
+        self.entries = make_entries(self.keys)
+        cache.write(self.path, self.entries)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_read(self):
+        with cache.ContactCache(self.path) as contacts:
+            self.assertEqual(len(contacts), 5)
+            self.assertEqual(contacts.keys, sorted(self.keys))
+            self.assertEqual(list(contacts), self.entries)
+
+    def test_get(self):
+        with cache.ContactCache(self.path) as contacts:
+            for key, entry in zip(self.keys, self.entries):
+                self.assertIn(key, contacts)
+                self.assertEqual(contacts.get(key), entry)
+
+            self.assertNotIn('b', contacts)
+            self.assertIsNone(contacts.get('zz'))
+
+    def test_empty(self):
+        cache.write(self.path, [])
+
+        with cache.ContactCache(self.path) as contacts:
+            self.assertEqual(len(contacts), 0)
+            self.assertEqual(list(contacts), [])
+            self.assertIsNone(contacts.get('a'))
+
+    def test_atomic_write(self):
+        def write():
+            with cache.atomic_write(self.path) as f:
+                f.write(b'partial')
+                raise RuntimeError('crash')
+
+        self.assertRaises(RuntimeError, write)
+        self.assertEqual(os.listdir(self.tmpdir), ['cache.mmap'])
+
+        with cache.ContactCache(self.path) as contacts:
+            self.assertEqual(len(contacts), 5)
+
+    def test_invalid(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'{"feed": {}}')
+
+        self.assertRaises(CacheError, cache.ContactCache, self.path)
+        open(self.path, 'wb').close()
+        self.assertRaises(CacheError, cache.ContactCache, self.path)
+
+
+class BookCacheTest(TempDirTestCase):
+    def make_book(self, entries=None, **kwargs):
+        book = make_book(session=mock.Mock(), **kwargs)
+        return mock_feed(book, entries or make_entries('abc'))
+
+    def test_mmap_cache(self):
+        book = self.make_book(mmap_cache=True)
+
+        self.assertEqual(len(book.contacts), 3)
+        self.assertTrue(p.exists('cache.mmap'))
+
+        book = self.make_book(mmap_cache=True)
+        self.assertEqual(book.b.title, 'Contact b')
+        self.assertIsNone(book._contacts)
+        self.assertRaises(gcontact.ContactNotFound, getattr, book, 'x')
+
+        titles = [contact.title for contact in book.contacts]
+        self.assertEqual(titles, ['Contact a', 'Contact b', 'Contact c'])
+        self.assertFalse(book.session.get.called)
+
+    def test_compressed_cache(self):
+        book = self.make_book(compress='gzip')
+        self.assertEqual(len(book.contacts), 3)
+        self.assertTrue(p.exists('cache.jsonl.gz'))
+
+        book = self.make_book(compress='gzip')
+        self.assertEqual(book._contacts[1].title, 'Contact b')
+        self.assertFalse(book.session.get.called)
+
+        with open('cache.jsonl.gz', 'wb') as f:
+            f.write(b'corrupt')
+
+        # a corrupt cache is fetched again
+        book = self.make_book(compress='gzip')
+        self.assertEqual(len(book.contacts), 3)
+        self.assertTrue(book.session.get.called)
+
+    def test_etag(self):
+        book = self.make_book()
+        self.assertEqual(len(book.contacts), 3)
+
+        # reading the etag neither fetches nor caches it
+        self.assertIsNone(book.etag)
+        self.assertEqual(book.session.get.call_count, 1)
+        self.assertFalse(p.exists('etag.json'))
+
+        book.etag = 'W/"etag"'
+        self.assertEqual(book.etag, 'W/"etag"')
+
+    def test_round_trip(self):
+        entries = make_entries('ab')
+        entries[0]['gd$postalAddress'] = [{'$t': '1 Main St'}]
+        entries[0]['gd$structuredPostalAddress'] = [
+            {'gd$formattedAddress': {'$t': '2 Side St'}}]
+
+        def get_entries(book):
+            return [
+                {k: v for k, v in contact.entry.items() if k != 'updated'}
+                for contact in book.contacts]
+
+        for kwargs in [{'mmap_cache': True}, {'compress': 'gzip'}]:
+            fetched = get_entries(self.make_book(deepcopy(entries), **kwargs))
+            self.assertEqual(len(fetched[0]['gd$postalAddress']), 2)
+
+            for _ in range(2):
+                book = self.make_book(**kwargs)
+                self.assertEqual(get_entries(book), fetched)
+                self.assertFalse(book.session.get.called)
+
+    def test_cache_dir(self):
+        book = self.make_book(cache_dir='caches', user='jane')
+        self.assertEqual(len(book.contacts), 3)
+        self.assertEqual(
+            book.cache_path, p.join('caches', 'jane@gmail.com', 'cache.json'))
+
+        self.assertTrue(p.exists(book.cache_path))
+        self.assertFalse(p.exists('cache.json'))
+
+        other = self.make_book(cache_dir='caches', user='joe')
+        self.assertIsNone(other._contacts)
+
+    def test_lock(self):
+        book = self.make_book(cache_dir='caches')
+        waiting = self.make_book(cache_dir='caches')
+        thread = threading.Thread(target=lambda: waiting.contacts)
+
+        # the book holding the lock caches the contacts
+        with cache.lock(book.cache_path):
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            content = book.session.get.return_value.content
+            book._write_cache(content, None, None)
+
+        thread.join()
+
+        # the waiting book loaded the cache instead of fetching again
+        self.assertEqual(len(waiting.contacts), 3)
+        self.assertFalse(waiting.session.get.called)
+
+    def test_unsupported(self):
+        kwargs = {'compress': 'bz2'}
+        errors = gcontact.UnsupportedFormatError
+        self.assertRaises(errors, self.make_book, **kwargs)
+
+        with mock.patch('gcontact.cache.zstandard', None):
+            self.assertRaises(CacheError, self.make_book, compress='zstd')
+
+
+class CompressedCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.entries = make_entries('abc')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_strip_entry(self):
+        entry = dict(self.entries[0], link=[{'rel': 'self'}], category=[])
+        self.assertEqual(cache.strip_entry(entry), self.entries[0])
+
+    def test_gzip(self):
+        path = p.join(self.tmpdir, 'cache.jsonl.gz')
+        entries = [dict(e, link=[{'rel': 'self'}]) for e in self.entries]
+        self.assertEqual(cache.write_compressed(path, entries), 3)
+        self.assertEqual(list(cache.read_compressed(path)), self.entries)
+
+    @unittest.skipUnless(cache.zstandard, 'zstandard is not installed')
+    def test_zstd(self):
+        path = p.join(self.tmpdir, 'cache.jsonl.zst')
+        cache.write_compressed(path, self.entries)
+        self.assertEqual(list(cache.read_compressed(path)), self.entries)
+
+    def test_corrupt(self):
+        path = p.join(self.tmpdir, 'cache.jsonl.gz')
+        cache.write_compressed(path, self.entries)
+
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        with open(path, 'wb') as f:
+            f.write(content[:len(content) // 2])
+
+        entries = cache.read_compressed(path)
+        self.assertRaises(CacheError, list, entries)
+        self.assertRaises(CacheError, cache.get_codec, 'cache.jsonl.bz2')
+
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.lru = cache.LRUCache(maxsize=2, ttl=10, timer=lambda: self.now)
+
+    def test_evict(self):
+        self.lru.put('a', 1)
+        self.lru.put('b', 2)
+        self.lru.get('a')
+        self.lru.put('c', 3)
+        self.assertEqual(len(self.lru), 2)
+        self.assertNotIn('b', self.lru)
+        self.assertEqual(self.lru.get('a').value, 1)
+
+    def test_expire(self):
+        self.lru.put('a', 1, etag='e')
+        self.assertTrue(self.lru.is_fresh(self.lru.get('a')))
+        self.now = 10
+        item = self.lru.get('a')
+        self.assertFalse(self.lru.is_fresh(item))
+        self.assertEqual(item.etag, 'e')
+
+
+class FetchTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        lru = cache.LRUCache(ttl=10, timer=lambda: self.now)
+        self.entry = make_entries('a')[0]
+        self.entry['gd$etag'] = '"etag1"'
+
+        self.book = make_book(use_cache=False, session=mock.Mock(), lru=lru)
+
+        self.get = self.book.session.get
+        self.get.return_value.status_code = 200
+        self.get.return_value.json.return_value = {'entry': self.entry}
+
+    def test_fetch(self):
+        contact = self.book.fetch('a')
+        self.assertEqual(contact.title, 'Contact a')
+        self.assertEqual(self.get.call_args[1]['headers'], None)
+
+        # modifying a contact doesn't modify the cache
+        contact.email = 'new@example.com'
+        self.assertEqual(self.book.fetch('a').email, 'a@example.com')
+        self.assertEqual(self.get.call_count, 1)
+
+        self.now = 10
+        self.get.return_value.status_code = 304
+        self.get.return_value.json.side_effect = ValueError
+        self.assertEqual(self.book.fetch('a').title, 'Contact a')
+        self.assertEqual(self.get.call_count, 2)
+        headers = self.get.call_args[1]['headers']
+        self.assertEqual(headers, {'If-None-Match': '"etag1"'})
+
+        # the revalidated contact is fresh again
+        self.book.fetch('a')
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_refresh(self):
+        self.book.fetch('a')
+        entry = dict(self.entry, title={'$t': 'Renamed'})
+        entry['gd$etag'] = '"etag2"'
+        self.get.return_value.json.return_value = {'entry': entry}
+        contact = self.book.fetch('a', refresh=True)
+        self.assertEqual(contact.title, 'Renamed')
+        item = self.book.lru.get((self.book.account, 'a'))
+        self.assertEqual(item.etag, '"etag2"')
+
+    def test_getattr(self):
+        self.assertEqual(self.book.a.title, 'Contact a')
+        self.assertIsNone(self.book._contacts)
+
+        self.get.side_effect = gcontact.RequestError('404: Not Found')
+        self.assertRaises(gcontact.ContactNotFound, getattr, self.book, 'b')
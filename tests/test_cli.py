@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import json
+import shutil
+import tempfile
+import unittest
+
+from os import path as p
+
+import mock
+
+from gcontact import cli
+from gcontact.journal import Journal
+from benchmarks.generate import BookGenerator, write
+from benchmarks.server import serve
+
+
+class CLITest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = p.join(self.tmpdir, 'cache')
+        entries = BookGenerator(seed=1, dupe_rate=0.2).entries(60)
+        self.server = serve(entries)
+        self.patch = mock.patch(
+            'gcontact.book.get_credentials', return_value=None)
+
+        self.patch.start()
+        self.api = self.server.__enter__()
+        self.url = self.api.url
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        self.patch.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def run_cli(self, *args):
+        options = [
+            '--user', 'jane', '--api-url', self.url, '--cache-dir',
+            self.cache_dir, '--page-size', '25']
+
+        cli.main([args[0]] + options + list(args[1:]))
+
+    def test_fetch_and_sync(self):
+        metrics = p.join(self.tmpdir, 'metrics.json')
+        self.run_cli('fetch', '--metrics', metrics)
+        self.assertTrue(p.exists(p.join(self.cache_dir, 'jane@gmail.com')))
+
+        with open(metrics) as f:
+            report = json.load(f)
+
+        self.assertEqual(report['requests']['feed']['requests'], 4)
+        self.assertIn('build', report['spans'])
+
+        with mock.patch('gcontact.book.Book._fetch_contacts') as fetch:
+            self.run_cli('sync')
+
+        self.assertFalse(fetch.called)
+
+    def test_import_and_dedupe(self):
+        path = p.join(self.tmpdir, 'connections.csv')
+        write(path, 10, 'csv', seed=2)
+        self.run_cli('import-csv', path, '--dry-run')
+        self.run_cli('import-csv', path, '--batch-size', '4')
+
+        with mock.patch('gcontact.book.Book.merge') as merge:
+            self.run_cli('dedupe', '--blocking', '--merge')
+
+        self.assertTrue(merge.called)
+
+    def test_export(self):
+        path = p.join(self.tmpdir, 'contacts.jsonl')
+        self.run_cli('export', path, '--cache-format', 'mmap')
+
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 60)
+
+        path = p.join(self.tmpdir, 'contacts.csv')
+        self.run_cli('export', path)
+
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 61)
+
+    def test_merge_then_export(self):
+        self.run_cli('fetch')
+        self.run_cli('dedupe', '--blocking', '--merge')
+        num_entries = len(self.api.entries)
+        self.assertLess(num_entries, 60)
+
+        # the cache was rewritten, and the next sync refetches
+        path = p.join(self.tmpdir, 'contacts.jsonl')
+        self.run_cli('export', path)
+
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), num_entries)
+
+        with mock.patch('gcontact.book.Book._fetch_contacts') as fetch:
+            fetch.return_value = []
+            self.run_cli('sync')
+
+        self.assertTrue(fetch.called)
+
+        # a fresh book works from the server's contacts and etags
+        self.run_cli('sync')
+        csv_path = p.join(self.tmpdir, 'connections.csv')
+        write(csv_path, 10, 'csv', seed=1)
+
+        with mock.patch('gcontact.cli.report_submitted') as report:
+            self.run_cli('import-csv', csv_path)
+
+        codes = [result.code for _, _, result in report.call_args[0][0]]
+        self.assertTrue(all(code in {200, 201} for code in codes))
+
+    def test_resume_journal(self):
+        csv_path = p.join(self.tmpdir, 'connections.csv')
+        journal_path = p.join(self.tmpdir, 'import.journal')
+        write(csv_path, 5, 'csv', seed=2)
+
+        with mock.patch('gcontact.book.Book._submit_journaled') as submit:
+            submit.return_value = []
+            self.run_cli('import-csv', csv_path, '--journal', journal_path)
+
+        with Journal(journal_path) as journal:
+            self.assertEqual(len(journal.pending), 5)
+
+        with mock.patch('gcontact.book.Book.reconcile') as reconcile:
+            self.run_cli('import-csv', csv_path, '--journal', journal_path)
+
+        self.assertFalse(reconcile.called)
+
+        with Journal(journal_path) as journal:
+            self.assertTrue(journal.complete)
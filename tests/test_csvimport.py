@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+
+from os import path as p
+
+import mock
+
+from gcontact import csvimport
+from gcontact.book import Book
+
+CSV = '''First Name,Last Name,E-mail,Company,Job Title
+Reuben,Cummings,reuben@example.com,Nerevu,Founder
+Jane,Doe,,Acme,Engineer
+'''
+
+GOOGLE_CSV = '''Name,Given Name,Family Name,Notes,E-mail 1 - Value,\
+E-mail 2 - Value,Phone 1 - Value,Organization 1 - Name,Organization 1 - Title
+,Reuben,Cummings,Met at PyCon,reuben@example.com,reuben@nerevu.com,\
++1 555 0100,,
+Jane Doe,Jane,Doe,,,,,Acme,Engineer
+'''
+
+
+class CSVImportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = p.join(self.tmpdir, 'connections.csv')
+
+        with open(self.path, 'w') as f:
+            f.write(CSV)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_transform_record(self):
+        record = {
+            'first_name': 'Reuben', 'last_name': 'Cummings',
+            'e_mail': 'reuben@example.com', 'company': 'Nerevu'}
+
+        entry = csvimport.transform_record(record)
+        self.assertEqual(entry['title'], 'Reuben Cummings')
+        emails = [{'address': 'reuben@example.com'}]
+        self.assertEqual(entry['gd$email'], emails)
+        org = entry['gd$organization'][0]
+        self.assertEqual(org['gd$orgName'], {'$t': 'Nerevu'})
+
+    def test_read_contacts(self):
+        contacts = csvimport.read_contacts(self.path)
+        titles = [contact.title for contact in contacts]
+        self.assertEqual(titles, ['Reuben Cummings', 'Jane Doe'])
+        self.assertEqual(contacts[0].email, 'reuben@example.com')
+
+        # a contact without emails hashes the same as before schemas
+        self.assertEqual(contacts[1].email, '')
+        self.assertEqual(contacts[1].hash_content, 'jane doe  n/a')
+
+    def test_list_schema(self):
+        schema = csvimport.Schema(
+            given='first_name', family='last_name', emails=['e_mail'])
+
+        contacts = csvimport.read_contacts(self.path, schema=schema)
+        self.assertEqual(contacts[0].email, 'reuben@example.com')
+
+        with mock.patch('gcontact.book.get_credentials', return_value=None):
+            book = Book.from_csv(self.path, schema=schema)
+
+        self.assertEqual(book.contacts[1].title, 'Jane Doe')
+
+    def test_detect_schema(self):
+        columns = ['first_name', 'last_name', 'e_mail', 'company']
+        self.assertEqual(csvimport.detect_schema(columns), 'linkedin')
+        columns = ['first_name', 'e_mail_address', 'mobile_phone', 'notes']
+        self.assertEqual(csvimport.detect_schema(columns), 'outlook')
+        columns = ['fn', 'email', 'tel', 'org']
+        self.assertEqual(csvimport.detect_schema(columns), 'vcard')
+
+    def test_google(self):
+        path = p.join(self.tmpdir, 'google.csv')
+
+        with open(path, 'w') as f:
+            f.write(GOOGLE_CSV)
+
+        contacts = csvimport.read_contacts(path)
+        self.assertEqual(contacts[0].title, 'Reuben Cummings')
+        self.assertEqual(contacts[0].email, 'reuben@example.com')
+        emails = ['reuben@example.com', 'reuben@nerevu.com']
+        self.assertEqual(list(contacts[0].emails), emails)
+        self.assertEqual(contacts[0].phone, [{'$t': '+1 555 0100'}])
+        self.assertEqual(contacts[0].note, 'Met at PyCon')
+        self.assertEqual(contacts[1].title, 'Jane Doe')
+        self.assertEqual(contacts[1].organization, 'Engineer at Acme')
+
+    def test_compile_schema(self):
+        schema = csvimport.Schema(
+            full_name='fn', emails=('email', 'email_2'), note='note')
+
+        to_entry = csvimport.compile_schema(schema, ('fn', 'email_2'))
+        self.assertIs(to_entry, csvimport.compile_schema(
+            schema, ('fn', 'email_2')))
+
+        entry = to_entry({'fn': 'Jane Doe', 'email_2': 'jane@example.com'})
+        self.assertEqual(entry['title'], 'Jane Doe')
+        self.assertEqual(entry['gd$email'], [{'address': 'jane@example.com'}])
+        self.assertNotIn('content', entry)
+        self.assertNotIn('gd$organization', entry)
+
+        # schemas with lists are compiled the same as with tuples
+        schema = schema._replace(emails=['email', 'email_2'])
+        self.assertIs(to_entry, csvimport.compile_schema(
+            schema, ['fn', 'email_2']))
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+import itertools
+import unittest
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from changanya.simhash import Simhash
+
+import gcontact
+from gcontact import dedupe as dd
+
+
+def brute_force_pairs(values, bits):
+    pairs = itertools.combinations(range(len(values)), 2)
+    return [
+        [i, j] for i, j in pairs
+        if bin(int(values[i]) ^ int(values[j])).count('1') <= bits]
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_fingerprints(self):
+        simhashes = [Simhash('Reuben Cummings'), Simhash('reuben@gmail.com')]
+        values = dd.fingerprints(simhashes)
+        self.assertEqual(values.dtype, np.uint64)
+        self.assertEqual(values.tolist(), [s.hash for s in simhashes])
+
+    def test_popcount(self):
+        values = np.array([0, 1, 0xff, 2 ** 63, 2 ** 64 - 1], dtype=np.uint64)
+        self.assertEqual(dd.popcount(values).tolist(), [0, 1, 8, 1, 64])
+
+    def test_get_blocks(self):
+        blocks = dd.get_blocks(64, 3)
+        self.assertEqual(len(blocks), 4)
+        self.assertEqual(sum(bin(mask).count('1') for _, mask in blocks), 64)
+        self.assertRaises(ValueError, dd.get_blocks, 128, 3)
+        self.assertRaises(ValueError, dd.get_blocks, 4, 4)
+
+
+class FindPairsTest(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(0)
+        base = random.randint(0, 2 ** 63, size=200, dtype=np.uint64)
+        shifts = random.randint(0, 64, size=200).astype(np.uint64)
+        flips = np.uint64(1) << shifts
+        self.values = np.concatenate([base, base ^ flips, base[:5]])
+
+    def test_find_pairs(self):
+        for bits in (0, 1, 3):
+            pairs = dd.find_pairs(self.values, bits=bits)
+            expected = brute_force_pairs(self.values, bits)
+            self.assertEqual(pairs.tolist(), expected)
+
+    def test_find_pairs_hashbits(self):
+        values = self.values & np.uint64(0xffff)
+        pairs = dd.find_pairs(values, bits=2, hashbits=16)
+        self.assertEqual(pairs.tolist(), brute_force_pairs(values, 2))
+
+    def test_find_pairs_empty(self):
+        pairs = dd.find_pairs(np.array([], dtype=np.uint64))
+        self.assertEqual(pairs.shape, (0, 2))
+
+    def test_find_matches(self):
+        matches = dd.find_matches(self.values, self.values[0], bits=1)
+        expected = [0, 200, 400]
+        self.assertEqual(matches.tolist(), expected)
+
+
+BASE_URL = 'http://www.google.com/m8/feeds/contacts/me/base'
+
+
+def make_contact(key, title, emails=(), phones=(), ims=()):
+    entry = {
+        'id': {'$t': '%s/%s' % (BASE_URL, key)},
+        'updated': {'$t': '2017-01-01T00:00:00.000Z'},
+        'title': {'$t': title},
+        'gd$email': [{'address': email} for email in emails],
+        'gd$phoneNumber': [{'$t': phone} for phone in phones],
+        'gd$im': [{'address': im} for im in ims]}
+
+    return gcontact.Contact(None, None, **entry)
+
+
+class FeaturesTest(unittest.TestCase):
+    def test_get_features(self):
+        contact = make_contact(
+            'a', 'Reuben Cummings', ['Reuben@Gmail.com', ''],
+            phones=['+1 (555) 123-4567'], ims=[' Reubano'])
+
+        expected = dd.Features(
+            frozenset(['reuben@gmail.com']), frozenset(['5551234567']),
+            frozenset(['reubano']), ('cummings', 'reuben'))
+
+        self.assertEqual(contact.features, expected)
+
+    def test_compare(self):
+        contact = make_contact('a', 'Jane Doe', ['jane@doe.com'], ims=['jd'])
+        other = make_contact('b', 'Doe, Jane', ['JANE@doe.com'], ims=['x'])
+        reasons = dd.compare(contact.features, other.features)
+        self.assertEqual(reasons, ('email', 'name'))
+
+    def test_eq(self):
+        contact = make_contact('a', 'Jane Doe', phones=['555-123-4567'])
+        same_phone = make_contact('b', 'J Doe', phones=['(555) 123 4567'])
+        same_name = make_contact('c', 'Jane Doe')
+        self.assertEqual(contact, same_phone)
+        self.assertNotEqual(contact, same_name)
+
+
+class BlockingIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.contacts = [
+            make_contact('a', 'Reuben Cummings', ['Reuben@Gmail.com']),
+            make_contact('b', 'R. Cummings', [' reuben@gmail.com']),
+            make_contact('c', 'Jane Doe', phones=['+1 (555) 123-4567']),
+            make_contact('d', 'Janet Doe', phones=['555.123.4567']),
+            make_contact('e', 'Doe, Jane', ims=['jdoe']),
+            make_contact('f', 'John Smith', ims=['JDoe'])]
+
+        self.records = [contact.features for contact in self.contacts]
+        self.index = dd.BlockingIndex(self.records)
+
+    def test_block_keys(self):
+        keys = set(dd.get_block_keys(self.records[2]))
+        expected = {('phone', '5551234567'), ('name', 'doe jane')}
+        self.assertEqual(keys, expected)
+
+    def test_candidates(self):
+        candidates = set(self.index.candidates())
+        expected = {
+            (0, 1, 'email'), (2, 3, 'phone'), (2, 4, 'name'), (4, 5, 'im')}
+
+        self.assertEqual(candidates, expected)
+        pairs = self.index.candidate_pairs().tolist()
+        self.assertEqual(pairs, [[0, 1], [2, 3], [2, 4], [4, 5]])
+
+    def test_max_block(self):
+        index = dd.BlockingIndex(self.records, max_block=1)
+        self.assertEqual(list(index.candidates()), [])
+
+    def test_query(self):
+        contact = make_contact('g', 'Jane Doe', ims=['jdoe'])
+        matches = self.index.query(contact.features)
+        self.assertEqual(matches, {2: {'name'}, 4: {'name', 'im'}, 5: {'im'}})
+
+    def test_compare_pairs(self):
+        values = np.zeros(6, dtype=np.uint64)
+        values[4] = np.uint64(2 ** 64 - 1)
+        pairs = self.index.candidate_pairs()
+        found = dd.compare_pairs(self.records, values, pairs, bits=3)
+        expected = [
+            (0, 1, ('email', 'simhash')), (2, 3, ('phone', 'simhash')),
+            (4, 5, ('im',))]
+
+        self.assertEqual(found, expected)
+
+    def test_compare_to(self):
+        values = np.zeros(6, dtype=np.uint64)
+        values[2] = np.uint64(2 ** 64 - 1)
+        record = make_contact('g', 'Jane Doe', ims=['jdoe']).features
+        found = dd.compare_to(record, 0, self.records, values, [2, 4, 5])
+        expected = [(4, ('im', 'name', 'simhash')), (5, ('im', 'simhash'))]
+        self.assertEqual(found, expected)
+
+
+class ParallelTest(unittest.TestCase):
+    def test_get_tasks(self):
+        tasks = dd.get_tasks(64, 3, splits=3)
+        self.assertEqual(len(tasks), 12)
+        ranges = [key_range for _, _, key_range in tasks[:3]]
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], 2 ** 16)
+
+    def test_find_pairs_parallel(self):
+        random = np.random.RandomState(1)
+        base = random.randint(0, 2 ** 63, size=500, dtype=np.uint64)
+        values = np.concatenate([base, base[:50] ^ np.uint64(0b101)])
+        pairs = dd.find_pairs_parallel(values, bits=3, workers=2)
+        self.assertEqual(pairs.tolist(), dd.find_pairs(values, 3).tolist())
+
+    def test_find_shared_pairs_attach_error(self):
+        shm = shared_memory.SharedMemory(create=True, size=8)
+
+        try:
+            # the buffer is too small for 2 fingerprints
+            with self.assertRaises(TypeError):
+                dd._find_shared_pairs(shm.name, 2, 0, 15, 3, (0, 16))
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def test_find_clusters(self):
+        pairs = [(0, 1, ('email',)), (5, 6, ('im',)), (1, 4, ('phone',))]
+        clusters = dd.find_clusters(pairs, 7)
+        self.assertEqual(clusters, [[0, 1, 4], [5, 6]])
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+
+from importlib import util
+from os import path as p
+
+import mock
+
+from gcontact import csvimport, export
+from gcontact.exceptions import UnsupportedFormatError
+from tests.helpers import make_book, mock_feed
+from tests.test_dedupe import make_contact
+
+UPDATED = '2017-01-01T00:00:00.000Z'
+
+
+def make_entries():
+    contact = make_contact(
+        'a', 'Reuben Cummings', ['reuben@gmail.com', 'reuben@nerevu.com'],
+        ['+1 555 0100'])
+
+    contact.name = {
+        'gd$givenName': {'$t': 'Reuben'}, 'gd$familyName': {'$t': 'Cummings'}}
+
+    contact.organization = 'Nerevu'
+    contact._organization.append({
+        'gd$orgName': {'$t': 'Acme'}, 'gd$orgTitle': {'$t': 'Engineer'}})
+
+    contact.address = [
+        {'gd$formattedAddress': {'$t': '1 Main St'}, 'primary': 'true'}]
+
+    return [contact.entry, make_contact('b', 'Jane Doe').entry]
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.entries = make_entries()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_flatten_entry(self):
+        row = export.flatten_entry(self.entries[0])
+        self.assertEqual(row['ID'], 'a')
+        self.assertEqual(row['First Name'], 'Reuben')
+        self.assertEqual(row['E-mail'], 'reuben@gmail.com')
+        self.assertEqual(row['Other E-mails'], 'reuben@nerevu.com')
+        self.assertEqual(row['Phone'], '+1 555 0100')
+        self.assertEqual(row['Company'], 'Nerevu')
+        self.assertEqual(row['Other Organizations'], 'Engineer at Acme')
+        self.assertEqual(row['Address'], '1 Main St')
+        self.assertEqual(set(row), set(export.FIELDS))
+
+    def test_structured_address(self):
+        street, city = {'$t': '1 Main St'}, {'$t': 'Springfield'}
+        entry = dict(self.entries[1], **{'gd$structuredPostalAddress': [
+            {'gd$street': street, 'gd$city': city},
+            {'gd$formattedAddress': {'$t': '2 Side St'}}]})
+
+        row = export.flatten_entry(entry)
+        self.assertEqual(row['Address'], '1 Main St, Springfield')
+        self.assertEqual(row['Other Addresses'], '2 Side St')
+
+    def test_updated(self):
+        entry = dict(self.entries[1], updated={'$t': UPDATED})
+        book = make_book(
+            use_cache=False, cache_resp=False, session=mock.Mock())
+
+        mock_feed(book, [entry])
+        self.assertEqual(len(book.contacts), 1)
+
+        # loaded contacts export the server's updated time
+        path = p.join(self.tmpdir, 'contacts.jsonl')
+        book.export(path)
+
+        with open(path) as f:
+            self.assertEqual(json.loads(f.readline())['Updated'], UPDATED)
+
+    def test_csv(self):
+        path = p.join(self.tmpdir, 'contacts.csv')
+        count = export.write(path, iter(self.entries), chunk_size=1)
+        self.assertEqual(count, 2)
+
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+
+        self.assertEqual([row['Name'] for row in rows], [
+            'Reuben Cummings', 'Jane Doe'])
+
+        contacts = csvimport.read_contacts(path)
+        self.assertEqual(contacts[0].title, 'Reuben Cummings')
+        self.assertEqual(contacts[0].email, 'reuben@gmail.com')
+        self.assertEqual(contacts[0].organization, 'Nerevu')
+
+    def test_jsonl(self):
+        path = p.join(self.tmpdir, 'contacts.out')
+        export.write(path, self.entries, fmt='jsonl')
+
+        with open(path) as f:
+            rows = [json.loads(line) for line in f]
+
+        self.assertEqual(rows[1]['ID'], 'b')
+
+    def test_unsupported(self):
+        path = p.join(self.tmpdir, 'contacts.xls')
+
+        with self.assertRaises(UnsupportedFormatError):
+            export.write(path, self.entries)
+
+    @unittest.skipUnless(util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet(self):
+        from pyarrow import parquet
+
+        path = p.join(self.tmpdir, 'contacts.parquet')
+        self.assertEqual(export.write(path, self.entries, chunk_size=1), 2)
+        self.assertEqual(parquet.ParquetFile(path).num_row_groups, 2)
+
+        rows = parquet.read_table(path).to_pylist()
+        self.assertEqual(rows, list(map(export.flatten_entry, self.entries)))
+
+    @unittest.skipIf(util.find_spec('pyarrow'), 'pyarrow is installed')
+    def test_parquet_requires_pyarrow(self):
+        path = p.join(self.tmpdir, 'contacts.parquet')
+
+        with self.assertRaises(UnsupportedFormatError):
+            export.write(path, self.entries)
+
+        self.assertFalse(p.exists(path))
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from unittest import mock
+
+import requests
+
+from gcontact import atom
+from gcontact.exceptions import RequestError
+from gcontact.httpsession import HTTPSession
+from gcontact.metrics import Metrics
+
+FEED_URL = 'https://www.google.com/m8/feeds/contacts/me/full?alt=json'
+BATCH_URL = 'https://www.google.com/m8/feeds/contacts/me/full/batch'
+
+
+class FakeResponse(object):
+    def __init__(self, status_code=200, content=b'{}'):
+        self.status_code = status_code
+        self.content = content
+        self.ok = status_code < 400
+        self.reason = 'Reason'
+
+
+class HooksTest(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        hooks = {
+            event: lambda e, event=event: self.events.append((event, e))
+            for event in ('before_request', 'after_response', 'on_retry',
+                          'on_error')}
+
+        self.session = HTTPSession(hooks=hooks, retries=2, backoff=0)
+        self.session.requests_session = mock.Mock()
+
+    def test_response(self):
+        get = self.session.requests_session.get
+        get.return_value = FakeResponse(content=b'12345')
+        self.session.get(FEED_URL)
+        names = [name for name, _ in self.events]
+        self.assertEqual(names, ['before_request', 'after_response'])
+        event = self.events[-1][1]
+        self.assertEqual(event.kind, 'feed')
+        self.assertEqual(event.status, 200)
+        self.assertEqual(event.bytes_in, 5)
+        self.assertGreaterEqual(event.seconds, 0)
+
+    def test_retry(self):
+        post = self.session.requests_session.post
+        post.side_effect = [FakeResponse(503), FakeResponse(201)]
+        self.session.post(BATCH_URL, data='abc')
+        names = [name for name, _ in self.events]
+        self.assertEqual(names.count('on_retry'), 1)
+        self.assertEqual(self.events[-1][1].attempt, 2)
+        self.assertEqual(self.events[-1][1].bytes_out, 3)
+        self.assertEqual(self.events[-1][1].kind, 'batch')
+
+    def test_error(self):
+        get = self.session.requests_session.get
+        get.side_effect = [FakeResponse(404)]
+
+        with self.assertRaises(RequestError):
+            self.session.get(FEED_URL.replace('full?', 'full/abc?'))
+
+        name, event = self.events[-1]
+        self.assertEqual(name, 'on_error')
+        self.assertEqual(event.kind, 'single')
+        self.assertIsInstance(event.error, RequestError)
+
+    def test_connection_error(self):
+        get = self.session.requests_session.get
+        get.side_effect = requests.ConnectionError('refused')
+
+        with self.assertRaises(requests.ConnectionError):
+            self.session.get(FEED_URL)
+
+        names = [name for name, _ in self.events]
+        self.assertEqual(names.count('before_request'), 3)
+        self.assertEqual(names.count('on_retry'), 2)
+        self.assertEqual(names[-1], 'on_error')
+
+    def test_streamed_upload(self):
+        post = self.session.requests_session.post
+        post.side_effect = lambda url, data, **kwargs: (
+            b''.join(data), FakeResponse(503))[1]
+
+        chunks = iter([b'ab', b'cde'])
+
+        with self.assertRaises(RequestError):
+            self.session.post(BATCH_URL, data=chunks)
+
+        # an iterator can't be resent
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(self.events[-1][1].bytes_out, 5)
+
+
+class MetricsTest(unittest.TestCase):
+    def test_summary(self):
+        session = HTTPSession()
+        session.requests_session = mock.Mock()
+        session.requests_session.get.return_value = FakeResponse(content=b'x')
+        session.requests_session.post.return_value = FakeResponse(500)
+        metrics = Metrics()
+        metrics.attach(session)
+
+        for _ in range(10):
+            session.get(FEED_URL)
+
+        with self.assertRaises(RequestError):
+            session.post(BATCH_URL, data=atom.to_bytes('<feed/>'))
+
+        summary = metrics.summary()
+        self.assertEqual(summary['feed']['requests'], 10)
+        self.assertEqual(summary['feed']['bytes_in'], 10)
+        self.assertEqual(summary['feed']['statuses'], {200: 10})
+        self.assertLessEqual(summary['feed']['p50'], summary['feed']['p99'])
+        self.assertEqual(summary['batch']['errors'], 1)
+        self.assertEqual(summary['batch']['requests'], 1)
+
+        metrics.detach(session)
+        session.get(FEED_URL)
+        self.assertEqual(metrics.summary()['feed']['requests'], 10)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+
+from json import loads
+from os import path as p
+
+import gcontact
+from gcontact import dedupe as dd
+from gcontact.journal import Journal, get_key
+from tests.test_book import BatchSession, make_book
+from tests.test_dedupe import make_contact
+
+
+class CrashingSession(BatchSession):
+    """Fails for good after answering `limit` batch requests."""
+    def __init__(self, limit):
+        super(CrashingSession, self).__init__()
+        self.limit = limit
+
+    def post(self, url, data=None, headers=None):
+        if len(self.feeds) == self.limit:
+            raise RuntimeError('crash')
+
+        return super(CrashingSession, self).post(url, data, headers)
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = p.join(self.tmpdir, 'import.journal')
+        self.contacts = [
+            make_contact(key, 'Contact %s' % key, ['%s@example.com' % key])
+            for key in 'abcd']
+
+        self.changeset = dd.ChangeSet(self.contacts, [], [])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_entry(self):
+        contact = self.contacts[0]
+        contact.note = 'a note'
+        entry = contact.entry
+        copy = gcontact.Contact(None, None, **entry)
+
+        # setting a field bumps `updated`
+        del entry['updated']
+        copy_entry = copy.entry
+        del copy_entry['updated']
+        self.assertEqual(copy_entry, entry)
+        self.assertEqual(copy.note, 'a note')
+
+    def test_plan_and_ack(self):
+        operations = [('insert', contact) for contact in self.contacts]
+
+        with Journal(self.path) as journal:
+            todo = journal.plan(operations)
+            self.assertEqual(len(todo), 4)
+            result = gcontact.atom.BatchResult('0', 201, 'Created', 'x', 'e')
+            journal.ack(todo[0][0], result)
+
+        with open(self.path, 'a') as f:
+            f.write('{"type": "ack", "key": ')
+
+        with Journal(self.path) as journal:
+            self.assertEqual(len(journal), 4)
+            self.assertEqual(len(journal.pending), 3)
+            self.assertFalse(journal.complete)
+
+            # replanning skips the done operations and isn't re-recorded
+            todo = journal.plan(operations)
+            self.assertEqual([t[2] for t in todo], self.contacts[1:])
+
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 6)
+
+    def test_torn_record(self):
+        operations = [('insert', contact) for contact in self.contacts[:2]]
+        result = gcontact.atom.BatchResult('0', 201, 'Created', 'x', 'e')
+
+        with Journal(self.path) as journal:
+            todo = journal.plan(operations)
+
+        with open(self.path, 'a') as f:
+            f.write('{"type": "ack", "key": ')
+
+        with Journal(self.path) as journal:
+            journal.ack(todo[0][0], result)
+
+        # the ack after the torn record is read back
+        with Journal(self.path) as journal:
+            self.assertTrue(journal.is_done(todo[0][0]))
+            self.assertEqual(len(journal.pending), 1)
+
+    def test_resume(self):
+        keys = [get_key('insert', contact) for contact in self.contacts]
+        book = make_book([], CrashingSession(2))
+        book.batch_size = 1
+
+        with Journal(self.path) as journal:
+            kwargs = {'journal': journal, 'workers': 1, 'backoff': 0}
+            commit = book.commit
+            self.assertRaises(RuntimeError, commit, self.changeset, **kwargs)
+
+        session = BatchSession()
+        book = make_book([], session)
+
+        with Journal(self.path) as journal:
+            self.assertEqual(len(journal.pending), 2)
+            submitted = book.resume(journal)
+            self.assertTrue(journal.complete)
+
+        # only the unacknowledged operations are resent
+        self.assertEqual(len(session.feeds), 1)
+        self.assertEqual(len(submitted), 2)
+        titles = [contact.title for contact in book.contacts]
+        self.assertEqual(titles, ['Contact c', 'Contact d'])
+
+        with Journal(self.path) as journal:
+            self.assertEqual(sorted(journal.acked), sorted(keys))
+            self.assertTrue(journal.complete)
+
+    def test_resume_cache(self):
+        with Journal(self.path) as journal:
+            journal.plan(('insert', contact) for contact in self.contacts[:2])
+
+        book = make_book([], cache_dir=self.tmpdir)
+        book._write_cache(b'{"feed": {"entry": []}}', [], [])
+
+        with Journal(self.path) as journal:
+            book.resume(journal)
+
+        # the cached contacts include the resumed inserts
+        with open(book.cache_path) as f:
+            entries = loads(f.read())['feed']['entry']
+
+        titles = [entry['title']['$t'] for entry in entries]
+        self.assertEqual(titles, ['Contact a', 'Contact b'])
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+import unittest
+
+from gcontact.lazy import lazy_import
+
+SCRIPT = '''
+import sys
+import gcontact
+heavy = {'httplib2', 'oauth2client', 'changanya', 'meza', 'requests', 'numpy'}
+print(sorted({
+    name.split('.')[0] for name, module in sys.modules.items()
+    if name.split('.')[0] in heavy and '.' in name and
+    type(module).__name__ != '_LazyModule'}))
+'''
+
+SUBMODULE_SCRIPT = '''
+import sys
+import gcontact.cache
+print('gcontact.book' in sys.modules)
+'''
+
+ATTRIBUTE_SCRIPT = '''
+import sys
+import gcontact
+gcontact.cache.ContactCache
+print('gcontact.book' in sys.modules)
+'''
+
+
+class LazyImportTest(unittest.TestCase):
+    def test_lazy_import(self):
+        module = lazy_import('json')
+        self.assertEqual(module.dumps([1]), '[1]')
+
+    def test_missing(self):
+        with self.assertRaises(ImportError):
+            lazy_import('gcontact_missing_module')
+
+    def test_import_is_light(self):
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT])
+        self.assertEqual(output.decode().strip(), '[]')
+
+    def test_submodule_is_light(self):
+        output = subprocess.check_output(
+            [sys.executable, '-c', SUBMODULE_SCRIPT])
+
+        self.assertEqual(output.decode().strip(), 'False')
+
+    def test_submodule_attribute(self):
+        output = subprocess.check_output(
+            [sys.executable, '-c', ATTRIBUTE_SCRIPT])
+
+        self.assertEqual(output.decode().strip(), 'False')
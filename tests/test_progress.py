@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from gcontact.progress import ProgressReporter, format_progress
+from tests.test_book import BatchSession, make_book
+from tests.test_dedupe import make_contact
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ProgressReporterTest(unittest.TestCase):
+    def setUp(self):
+        self.reports = []
+        self.timer = FakeTimer()
+
+    def test_rate_and_eta(self):
+        reporter = ProgressReporter(
+            'import', self.reports.append, 100, timer=self.timer)
+
+        self.timer.now = 2
+        reporter.update(10, errors=1, nbytes=512)
+        report = self.reports[-1]
+        counts = (report.done, report.errors, report.bytes)
+        self.assertEqual(counts, (10, 1, 512))
+        self.assertEqual(report.rate, 5)
+        self.assertEqual(report.eta, 18)
+        self.assertIn('10/100 (10%)', format_progress(report))
+
+    def test_interval(self):
+        reporter = ProgressReporter(
+            'import', self.reports.append, interval=1, timer=self.timer)
+
+        for _ in range(10):
+            self.timer.now += 0.25
+            reporter.update()
+
+        reporter.finish()
+        self.assertEqual([r.done for r in self.reports], [4, 8, 10])
+        self.assertIsNone(self.reports[-1].eta)
+
+    def test_note(self):
+        reporter = ProgressReporter('import', self.reports.append)
+        reporter.note('no dupes')
+        self.assertEqual(format_progress(self.reports[-1]), 'import: no dupes')
+
+
+class BookProgressTest(unittest.TestCase):
+    def setUp(self):
+        self.contacts = [
+            make_contact('a', 'Reuben Cummings', ['reuben@gmail.com']),
+            make_contact('b', 'Reuben Cummings', ['Reuben@Gmail.com']),
+            make_contact('c', 'Jane Doe', ['jane@example.com'])]
+
+        self.reports = []
+
+    def test_submit(self):
+        book = make_book(self.contacts, BatchSession({'1': 5}))
+        book.progress = self.reports.append
+        operations = [('update', contact) for contact in self.contacts]
+        book.submit(operations, backoff=0, retries=1)
+        report = self.reports[-1]
+        self.assertEqual(report.task, 'submit')
+        self.assertEqual((report.done, report.total, report.errors), (3, 3, 1))
+
+    def test_dedupe(self):
+        book = make_book(self.contacts)
+        book.progress = self.reports.append
+        book.dedupe(blocking=True)
+        report = self.reports[-1]
+        self.assertEqual((report.task, report.done, report.total), (
+            'dedupe', 1, 1))
+
+    def test_disabled(self):
+        book = make_book(self.contacts)
+        self.assertEqual(len(book.dedupe(blocking=True)), 1)
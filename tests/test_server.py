@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+
+from benchmarks.generate import BookGenerator
+from benchmarks.server import serve
+from tests.helpers import TempDirTestCase, make_book
+from tests.test_dedupe import make_contact
+
+
+def make_entry():
+    entry = make_contact(
+        'a', 'Reuben Cummings', ['reuben@gmail.com'], ['+1 555 0100'],
+        ['reubano']).entry
+
+    entry['gd$name'] = {
+        'gd$fullName': {'$t': 'Reuben Cummings'},
+        'gd$givenName': {'$t': 'Reuben'}, 'gd$familyName': {'$t': 'Cummings'}}
+
+    entry['gd$organization'] = [{
+        'rel': 'work', 'primary': 'true', 'gd$orgName': {'$t': 'Nerevu'},
+        'gd$orgTitle': {'$t': 'Founder'}}]
+
+    entry['gd$postalAddress'] = [{'rel': 'home', '$t': '1 Main St'}]
+    entry['gContact$groupMembershipInfo'] = [
+        {'href': 'http://example.com/groups/1', 'deleted': 'false'}]
+
+    entry['content'] = {'$t': 'Met at PyCon'}
+    return entry
+
+
+class ServerTest(unittest.TestCase):
+    def make_book(self, server):
+        return make_book(api_url=server.url, use_cache=False, cache_resp=False)
+
+    def test_batch_round_trip(self):
+        def get_entry(contact):
+            ignored = {'id', 'updated', 'gd$etag'}
+            return {k: v for k, v in contact.entry.items() if k not in ignored}
+
+        with serve([make_entry()]) as server:
+            book = self.make_book(server)
+            contact = book.contacts[0]
+            expected = get_entry(contact)
+            operations = [('update', contact), ('insert', contact)]
+            results = book.submit(operations)
+            self.assertEqual([r.code for _, _, r in results], [200, 201])
+
+            contacts = self.make_book(server).contacts
+            self.assertEqual(len(contacts), 2)
+
+            for contact in contacts:
+                self.assertEqual(get_entry(contact), expected)
+                self.assertTrue(contact.updated)
+
+
+class SyncTest(TempDirTestCase):
+    def test_incremental_sync(self):
+        entries = BookGenerator(seed=1).entries(10)
+
+        with serve(entries) as server:
+            book = make_book(api_url=server.url, cache_dir='cache')
+            self.assertTrue(book.sync())
+            self.assertFalse(book.sync())
+
+            other = make_book(
+                api_url=server.url, use_cache=False, cache_resp=False)
+
+            contacts = other.contacts
+            contacts[0].title = 'Renamed'
+            operations = [
+                ('update', contacts[0]), ('delete', contacts[1]),
+                ('insert', make_contact('x', 'New Contact'))]
+
+            other.submit(operations)
+
+            # only the changes are fetched, and merged into the cache
+            with mock.patch.object(book, '_fetch_contacts') as fetch:
+                self.assertTrue(book.sync())
+
+            self.assertFalse(fetch.called)
+            url = server.url
+            requests = server.stats['requests']
+
+            for book in [book, make_book(api_url=url, cache_dir='cache')]:
+                titles = [contact.title for contact in book.contacts]
+                self.assertEqual(len(titles), 10)
+                self.assertEqual(titles[0], 'Renamed')
+                self.assertEqual(titles[-1], 'New Contact')
+                ids = [contact.short_id for contact in book.contacts]
+                self.assertNotIn(contacts[1].short_id, ids)
+
+            self.assertFalse(book.sync())
+            self.assertEqual(server.stats['requests'], requests + 1)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from os import path as p
+
+import mock
+
+from gcontact.store import ContactStore
+from tests.helpers import TempDirTestCase, make_book, mock_feed
+from tests.test_dedupe import make_contact
+
+ACCOUNT = 'jane@gmail.com'
+
+
+class ContactStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = p.join(self.tmpdir, 'contacts.db')
+        self.store = ContactStore(self.path)
+        self.contacts = [
+            make_contact('a', 'Reuben Cummings', ['Reuben@Gmail.com']),
+            make_contact('b', 'Jane Doe', phones=['+1 (555) 123-4567']),
+            make_contact('c', 'Doe, Jane', ims=['jdoe']),
+            make_contact('d', 'John Smith', ['john@smith.com'])]
+
+        self.store.save(ACCOUNT, self.contacts, etag='"etag"')
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def titles(self, entries):
+        return [entry['title']['$t'] for entry in entries]
+
+    def test_save(self):
+        self.assertTrue(self.store.has(ACCOUNT))
+        self.assertFalse(self.store.has('joe@gmail.com'))
+        self.assertEqual(self.store.count(ACCOUNT), 4)
+        self.assertEqual(self.store.etag(ACCOUNT), '"etag"')
+        titles = [contact.title for contact in self.contacts]
+        self.assertEqual(self.titles(self.store.entries(ACCOUNT)), titles)
+
+        # saving again replaces the account's contacts
+        self.store.save(ACCOUNT, self.contacts[:1])
+        self.assertEqual(self.store.count(ACCOUNT), 1)
+        self.assertEqual(self.store.find_by_name(ACCOUNT, 'jane doe'), [])
+
+    def test_find(self):
+        entry = self.store.get(ACCOUNT, 'b')
+        self.assertEqual(entry['title']['$t'], 'Jane Doe')
+        self.assertIsNone(self.store.get(ACCOUNT, 'x'))
+
+        found = self.store.find_by_email(ACCOUNT, ' reuben@gmail.COM')
+        self.assertEqual(self.titles(found), ['Reuben Cummings'])
+        found = self.store.find_by_name(ACCOUNT, 'jane doe')
+        self.assertEqual(self.titles(found), ['Jane Doe', 'Doe, Jane'])
+        found = self.store.find_by_phone(ACCOUNT, '555.123.4567')
+        self.assertEqual(self.titles(found), ['Jane Doe'])
+        self.assertEqual(self.store.find_by_im('joe@gmail.com', 'jdoe'), [])
+
+    def test_find_by_simhash(self):
+        value = self.contacts[3].simhash.hash
+        found = self.store.find_by_simhash(ACCOUNT, value)
+        self.assertEqual(found[0][0], 0)
+        self.assertEqual(self.titles(e for _, e in found)[0], 'John Smith')
+
+        # a full scan finds the same within the indexed distance
+        scanned = self.store.find_by_simhash(ACCOUNT, value, bits=64)
+        self.assertEqual([(d, e) for d, e in scanned if d <= 3], found)
+        self.assertEqual(len(scanned), 4)
+
+        flipped = self.store.find_by_simhash(ACCOUNT, value ^ 0b111)
+        self.assertEqual(flipped[0][0], 3)
+
+    def test_shared(self):
+        with ContactStore(self.path) as other:
+            self.assertEqual(other.count(ACCOUNT), 4)
+
+
+class BookStoreTest(TempDirTestCase):
+    def setUp(self):
+        super(BookStoreTest, self).setUp()
+        self.path = p.join(self.tmpdir, 'contacts.db')
+        contacts = [make_contact(key, 'Contact %s' % key) for key in 'abc']
+        self.entries = [contact.entry for contact in contacts]
+
+    def make_book(self):
+        book = make_book(store=self.path, session=mock.Mock(), user='jane')
+        return mock_feed(book, self.entries)
+
+    def test_store(self):
+        book = self.make_book()
+        self.assertEqual(len(book.contacts), 3)
+        self.assertEqual(book.store.count(ACCOUNT), 3)
+
+        book = self.make_book()
+        self.assertEqual(book._contacts[2].title, 'Contact c')
+        self.assertFalse(book.session.get.called)
+        self.assertFalse(p.exists('cache.json'))
+
+    def test_sync_etag(self):
+        book = self.make_book()
+        response = {'feed': {'gd$etag': 'W/"etag-1"', 'entry': self.entries}}
+        book.session.get.return_value.json.return_value = response
+        self.assertTrue(book.sync())
+        self.assertEqual(book.store.etag(ACCOUNT), 'W/"etag-1"')
+
+        # a new book compares the store's etag with the feed's
+        os.remove('etag.json')
+        book = self.make_book()
+        book.session.get.return_value.json.return_value = response
+        self.assertFalse(book.sync())
+        self.assertEqual(book.session.get.call_count, 1)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import unittest
+
+from os import path as p
+from unittest import mock
+
+from gcontact import tracing
+from gcontact.tracing import Profiler, Tracer
+from tests.test_book import make_book
+from tests.test_dedupe import make_contact
+
+
+class TracerTest(unittest.TestCase):
+    def test_nested_spans(self):
+        tracer = Tracer()
+
+        with tracer.span('outer'):
+            with tracer.span('inner'):
+                pass
+
+            with tracer.span('inner'):
+                pass
+
+        inner, _, outer = tracer.spans
+        self.assertEqual(inner.parent, 'outer')
+        self.assertIsNone(outer.parent)
+        self.assertGreaterEqual(outer.seconds, inner.seconds)
+
+        summary = tracer.summary()
+        self.assertEqual(summary['inner']['count'], 2)
+        self.assertEqual(summary['outer']['count'], 1)
+        self.assertIn('inner', tracer.report())
+
+    def test_span_on_error(self):
+        tracer = Tracer()
+
+        with self.assertRaises(ValueError):
+            with tracer.span('failing'):
+                raise ValueError
+
+        self.assertEqual(tracer.summary()['failing']['count'], 1)
+
+
+class BookTracingTest(unittest.TestCase):
+    def setUp(self):
+        self.contacts = [
+            make_contact('a', 'Reuben Cummings', ['reuben@gmail.com']),
+            make_contact('b', 'Reuben Cummings', ['Reuben@Gmail.com']),
+            make_contact('c', 'Jane Doe', ['jane@example.com'])]
+
+    def test_dedupe_spans(self):
+        book = make_book(self.contacts)
+        book.tracer = Tracer()
+        plans = book.dedupe(blocking=True)
+        self.assertEqual(len(plans), 1)
+
+        names = set(book.tracer.summary())
+        expected = {
+            'simhash', 'fingerprints', 'features', 'index', 'pairs',
+            'compare', 'cluster', 'dedupe', 'plan'}
+
+        self.assertEqual(names, expected)
+        parents = {span.name: span.parent for span in book.tracer.spans}
+        self.assertEqual(parents['pairs'], 'dedupe')
+
+    def test_disabled(self):
+        book = make_book(self.contacts)
+        self.assertIsNone(book.tracer)
+        self.assertIs(book.span('dedupe'), tracing.NULL_SPAN)
+        self.assertEqual(len(book.dedupe(blocking=True)), 1)
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_report(self):
+        with Profiler(self.tmpdir) as profiler:
+            with profiler.span('work'):
+                data = [list(range(100)) for _ in range(100)]
+
+        self.assertTrue(data)
+        self.assertTrue(p.exists(profiler.path))
+        self.assertTrue(p.exists(profiler.path.replace('.txt', '.prof')))
+
+        with open(profiler.path) as f:
+            report = f.read()
+
+        for section in ('Spans', 'Functions', 'Allocations', 'work'):
+            self.assertIn(section, report)
+
+    def test_from_env(self):
+        env = {tracing.PROFILE_ENV: self.tmpdir}
+
+        with mock.patch.dict('os.environ', env), \
+                mock.patch.object(tracing, '_env_profiler', None), \
+                mock.patch('atexit.register') as register:
+            profiler = tracing.from_env()
+            self.assertIs(tracing.from_env(), profiler)
+            register.assert_called_once_with(profiler.stop)
+            profiler.stop()
+
+        self.assertTrue(p.exists(profiler.path))
+
+        with mock.patch.dict('os.environ', clear=True):
+            self.assertIsNone(tracing.from_env())